@@ -0,0 +1,223 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+import pyaudio
+
+SAMPLE_RATE = 44100
+# Small enough for talk-back to feel immediate, large enough not to underrun on a loaded lab PC
+FRAMES_PER_BUFFER = 256
+
+
+def make_click(rate=SAMPLE_RATE, duration=0.001, amplitude=16000):
+    """Builds the click played by the latency self-test.
+
+    Args:
+        rate (int): The sample rate.
+        duration (float): The length of the click in seconds.
+        amplitude (int): The amplitude of the click, in 16-bit sample units.
+
+    Returns:
+        np.ndarray: The int16 samples of the click.
+    """
+    return np.full(max(int(rate * duration), 1), amplitude, dtype=np.int16)
+
+
+class LoopbackStandIn:
+    """Stands in for a sound card whose output is wired back to its input.
+
+    It opens streams like pyaudio.PyAudio, but every stream feeds what its callback plays back to
+    its input after `delay` seconds plus one buffer each way, the buffering of a duplex stream, so
+    the latency self-test runs without audio hardware. Streams run as fast as they can unless
+    `realtime` is set.
+    """
+
+    def __init__(self, delay=0.0, realtime=False):
+        """Initializes the LoopbackStandIn class.
+
+        Args:
+            delay (float): The delay between output and input, e.g. of the sound travelling from a
+                speaker to a microphone, in seconds.
+            realtime (bool): Whether callbacks are paced at the buffer duration.
+        """
+        self.delay = delay
+        self.realtime = realtime
+
+    def open(self, format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=False, output=False,
+             frames_per_buffer=FRAMES_PER_BUFFER, stream_callback=None, start=True, **kwargs):
+        """Opens a duplex callback stream looped back onto itself, see pyaudio.PyAudio.open."""
+        if not (input and output and stream_callback is not None):
+            raise IOError("the loopback stand-in only opens duplex callback streams")
+        latency = int(self.delay * rate) + 2 * frames_per_buffer
+        stream = LoopbackStream(rate, channels, frames_per_buffer, stream_callback, latency, self.realtime)
+        if start:
+            stream.start_stream()
+        return stream
+
+    def terminate(self):
+        """Releases nothing, like pyaudio.PyAudio.terminate once every stream is closed."""
+
+
+class LoopbackStream:
+    """A callback stream opened by LoopbackStandIn."""
+
+    def __init__(self, rate, channels, frames_per_buffer, callback, latency, realtime):
+        """Initializes the LoopbackStream class.
+
+        Args:
+            rate (int): The sample rate.
+            channels (int): The number of channels.
+            frames_per_buffer (int): The number of frames of each callback.
+            callback (callable): The stream callback, see pyaudio.PyAudio.open.
+            latency (int): The number of frames between output and input.
+            realtime (bool): Whether callbacks are paced at the buffer duration.
+        """
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.callback = callback
+        self.latency = latency
+        self.realtime = realtime
+        # What was played and is not back on the input yet, 16-bit samples
+        self._line = bytearray(2 * channels * latency)
+        self._thread = None
+        self._active = False
+
+    def _run(self):
+        """Runs in the stream thread: calls the callback until it completes or the stream stops."""
+        buffer_size = 2 * self.channels * self.frames_per_buffer
+        buffer_time = self.frames_per_buffer / self.rate
+        line = self._line
+        deadline = time.perf_counter()
+        while self._active:
+            in_data = bytes(line[:buffer_size])
+            del line[:buffer_size]
+            out_data, flag = self.callback(in_data, self.frames_per_buffer, {}, 0)
+            line += out_data
+            if flag != pyaudio.paContinue:
+                break
+            if self.realtime:
+                deadline += buffer_time
+                time.sleep(max(deadline - time.perf_counter(), 0.0))
+        self._active = False
+
+    def start_stream(self):
+        """Starts calling the callback."""
+        if self._thread is not None:
+            return
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop_stream(self):
+        """Stops calling the callback."""
+        self._active = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_active(self):
+        """Returns whether the callback is still being called."""
+        return self._active
+
+    def get_input_latency(self):
+        """Returns the input latency of the stand-in, one buffer, in seconds."""
+        return self.frames_per_buffer / self.rate
+
+    def get_output_latency(self):
+        """Returns the output latency of the stand-in, one buffer plus the delay, in seconds."""
+        return (self.latency - self.frames_per_buffer) / self.rate
+
+    def close(self):
+        """Closes the stream."""
+        self.stop_stream()
+
+
+def measure_loopback_latency(audio, rate=SAMPLE_RATE, frames_per_buffer=FRAMES_PER_BUFFER, duration=0.5,
+                             click_at=0.1, input_device=None, output_device=None, timeout=5.0):
+    """Plays a click and measures how long it takes to come back through a loopback.
+
+    A duplex callback stream, like the talk-back stream of MicrophoneRecorder, plays the click and
+    records its input; the latency is the time between the click and the first input sample over
+    half the loudest one. On a station the loopback is a cable from the output to the input, or the
+    speaker in front of the microphone; a LoopbackStandIn measures the buffering alone.
+
+    Args:
+        audio (pyaudio.PyAudio): The audio interface, or a LoopbackStandIn.
+        rate (int): The sample rate.
+        frames_per_buffer (int): The number of frames of each callback.
+        duration (float): The length of the recording in seconds, which must cover the latency.
+        click_at (float): The time the click is played at, in seconds from the start.
+        input_device (int): The index of the input device, the default one when None.
+        output_device (int): The index of the output device, the default one when None.
+        timeout (float): The maximum number of seconds to wait for the recording.
+
+    Returns:
+        dict: The measured round trip latency in ms, or None if the click was not heard, the latency
+            reported by the stream in ms and the number of frames per buffer.
+    """
+    total = int(duration * rate)
+    click = make_click(rate)
+    click_start = int(click_at * rate)
+    played = np.zeros(total + frames_per_buffer, dtype=np.int16)
+    played[click_start:click_start + len(click)] = click
+    recorded = np.zeros(total + frames_per_buffer, dtype=np.int16)
+    position = [0]
+
+    def callback(in_data, frame_count, time_info, status):
+        start = position[0]
+        if start >= total:
+            return b"\0\0" * frame_count, pyaudio.paComplete
+        samples = np.frombuffer(in_data, dtype=np.int16)[:frame_count]
+        recorded[start:start + len(samples)] = samples
+        position[0] = start + frame_count
+        return played[start:start + frame_count].tobytes(), pyaudio.paContinue
+
+    stream = audio.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True, output=True,
+                        frames_per_buffer=frames_per_buffer, input_device_index=input_device,
+                        output_device_index=output_device, stream_callback=callback, start=False)
+    try:
+        reported_ms = 1000.0 * (stream.get_input_latency() + stream.get_output_latency())
+        stream.start_stream()
+        deadline = time.perf_counter() + timeout
+        while stream.is_active() and position[0] < total and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        stream.stop_stream()
+    finally:
+        stream.close()
+
+    heard = np.abs(recorded[click_start:total].astype(np.int32))
+    latency_ms = None
+    if heard.size and heard.max() > 0:
+        onset = int(np.argmax(heard > heard.max() // 2))
+        latency_ms = 1000.0 * onset / rate
+    return {"latency_ms": latency_ms, "reported_ms": reported_ms, "frames_per_buffer": frames_per_buffer}
+
+
+def main(argv=None):
+    """Command line entry point of the talk-back latency self-test."""
+    parser = argparse.ArgumentParser(description="Measure the talk-back round trip latency of this station.")
+    parser.add_argument("--buffers", type=int, nargs="+", default=[128, 256, 512, 1024],
+                        help="The frames per buffer to measure")
+    parser.add_argument("--rate", type=int, default=SAMPLE_RATE, help="The sample rate")
+    parser.add_argument("--input-device", type=int, default=None, help="The index of the input device")
+    parser.add_argument("--output-device", type=int, default=None, help="The index of the output device")
+    parser.add_argument("--stand-in", type=float, default=None, metavar="DELAY_MS",
+                        help="Measure a loopback stand-in with this delay instead of the sound card")
+    args = parser.parse_args(argv)
+
+    audio = pyaudio.PyAudio() if args.stand_in is None else LoopbackStandIn(args.stand_in / 1000.0)
+    try:
+        for frames_per_buffer in args.buffers:
+            result = measure_loopback_latency(audio, args.rate, frames_per_buffer, input_device=args.input_device,
+                                              output_device=args.output_device)
+            measured = "not heard" if result["latency_ms"] is None else f"{result['latency_ms']:.1f} ms"
+            print(f"{frames_per_buffer} frames per buffer: round trip {measured}, "
+                  f"reported {result['reported_ms']:.1f} ms")
+    finally:
+        audio.terminate()
+
+
+if __name__ == '__main__':
+    main()
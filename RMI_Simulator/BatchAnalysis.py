@@ -0,0 +1,218 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import cv2
+
+from RMI_Simulator.Estimators import ESTIMATORS, create_estimator
+from RMI_Simulator.Motion import FRAME_HEIGHT, FRAME_WIDTH, FlowWorkspace, ZoneGrid
+from RMI_Simulator.MovementEvents import EpisodeSegmenter
+from RMI_Simulator.Recorder import read_frame_times, session_video_start
+from RMI_Simulator.database import build_test_document
+
+DEFAULT_FPS = 30.0
+
+
+def session_start(path, duration):
+    """Finds when a recorded session started.
+
+    Args:
+        path (str): The path of the video file.
+        duration (float): The length of the video in seconds.
+
+    Returns:
+        datetime: The start of the session in UTC, from the file name session_video_path gives
+            recordings, else from the file time, which is when the recording ended.
+    """
+    started = session_video_start(path)
+    if started is not None:
+        # The name carries the local time of the recording station
+        return started.astimezone(timezone.utc)
+    ended = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+    return ended - timedelta(seconds=duration)
+
+
+def analyse_video(path, estimator="farneback", analysis_scale=1.0, threshold=None, max_frames=None,
+                  zone_grid=(3, 3), off_ratio=0.5, min_gap=0.5):
+    """Runs motion detection over a recorded session video as fast as the CPU allows.
+
+    Frames are resized and preprocessed exactly like the live capture, but are not paced to the
+    video frame rate. They are dated by the capture times the recorder kept with the video, or by
+    their position at the video frame rate for videos without them.
+
+    Args:
+        path (str): The path of the video file.
+        estimator (str): The name of the motion detection engine, see Estimators.ESTIMATORS.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        threshold (float): The movement threshold, or None for the engine default.
+        max_frames (int): The maximum number of frames to analyse, or None for the whole video.
+        zone_grid (tuple): The (rows, cols) of the grid movements are broken down into.
+        off_ratio (float): The fraction of the threshold that keeps a movement episode going.
+        min_gap (float): The number of seconds below that level that end a movement episode.
+
+    Returns:
+        Tuple[list, dict]: The per-frame movement trace and the session summary, a movement data
+            document as stored by MovementData.save_test_data.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"cannot open video {path!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    estimator = create_estimator(estimator, FlowWorkspace(analysis_scale))
+    zones = ZoneGrid(*zone_grid)
+    if threshold is None:
+        threshold = estimator.default_threshold
+    frame_times = read_frame_times(path)
+    if frame_times:
+        offsets = [(captured_ns - frame_times[0]) / 1e9 for captured_ns in frame_times]
+        duration = offsets[-1]
+    else:
+        offsets = []
+        duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    started = session_start(path, duration)
+
+    trace = []
+    episodes = EpisodeSegmenter(off_ratio, min_gap, zone_shape=zone_grid)
+    # Frames are dated from the session start
+    episodes.frames.start_time = started
+    prev_gray = None
+    start = time.perf_counter()
+    try:
+        while max_frames is None or len(trace) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape[:2] != (FRAME_HEIGHT, FRAME_WIDTH):
+                frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+            gray = estimator.workspace.preprocess(frame)
+            movement_detected, movement_value, frame_zones = False, 0.0, None
+            if prev_gray is not None:
+                movement_detected, movement_value = estimator.estimate(prev_gray, gray, threshold)
+                # Like the live path, every analysed frame is broken down per zone, moving or not
+                if estimator.motion_map is not None:
+                    frame_zones = zones.reduce(estimator.motion_map, estimator.motion_map_scale)
+            prev_gray = gray
+
+            time_s = offsets[len(trace)] if len(trace) < len(offsets) else len(trace) / fps
+            trace.append({
+                "frame": len(trace),
+                "time_s": time_s,
+                "movement_value": float(movement_value),
+                "movement_detected": bool(movement_detected),
+            })
+            episodes.append(movement_value, threshold, frame_zones,
+                            episodes.frames.start_ns + int(time_s * 1e9))
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - start
+
+    summary = build_test_document(episodes.to_documents(), None, None, None, timestamp=started)
+    summary.update({
+        "source": os.path.abspath(path),
+        "estimator": estimator.name,
+        "analysis_scale": analysis_scale,
+        "threshold": threshold,
+        "frames": len(trace),
+        "fps": fps,
+        "analysis_fps": len(trace) / elapsed if elapsed else 0.0,
+    })
+    return trace, summary
+
+
+def write_trace(trace, path):
+    """Writes a per-frame movement trace as CSV.
+
+    Args:
+        trace (list): The trace returned by analyse_video.
+        path (str): The path of the CSV file.
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["frame", "time_s", "movement_value", "movement_detected"])
+        writer.writeheader()
+        writer.writerows(trace)
+
+
+def write_summary(summary, path):
+    """Writes a session summary as JSON.
+
+    Args:
+        summary (dict): The summary returned by analyse_video.
+        path (str): The path of the JSON file.
+    """
+    with open(path, "w") as file:
+        json.dump(summary, file, indent=2, default=str)
+
+
+def analyse_to_files(path, output_dir, estimator="farneback", analysis_scale=1.0, threshold=None):
+    """Analyses one video and writes its trace and summary next to each other.
+
+    Args:
+        path (str): The path of the video file.
+        output_dir (str): The directory the results are written to.
+        estimator (str): The name of the motion detection engine.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        threshold (float): The movement threshold, or None for the engine default.
+
+    Returns:
+        dict: The session summary.
+    """
+    trace, summary = analyse_video(path, estimator, analysis_scale, threshold)
+    name = os.path.splitext(os.path.basename(path))[0]
+    write_trace(trace, os.path.join(output_dir, f"{name}.trace.csv"))
+    write_summary(summary, os.path.join(output_dir, f"{name}.movement_data.json"))
+    return summary
+
+
+def _init_worker():
+    """Keeps each worker process on one OpenCV thread, the pool provides the parallelism."""
+    cv2.setNumThreads(1)
+
+
+def run_batch(paths, output_dir, workers=1, estimator="farneback", analysis_scale=1.0, threshold=None):
+    """Analyses several videos, one file per worker process.
+
+    Args:
+        paths (list): The paths of the video files.
+        output_dir (str): The directory the results are written to.
+        workers (int): The number of worker processes, 1 to analyse in this process.
+        estimator (str): The name of the motion detection engine.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        threshold (float): The movement threshold, or None for the engine default.
+
+    Returns:
+        list: The session summary of every video, in the order of `paths`.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if workers <= 1 or len(paths) <= 1:
+        return [analyse_to_files(path, output_dir, estimator, analysis_scale, threshold) for path in paths]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(min(workers, len(paths)), mp_context=context, initializer=_init_worker) as pool:
+        futures = [pool.submit(analyse_to_files, path, output_dir, estimator, analysis_scale, threshold)
+                   for path in paths]
+        return [future.result() for future in futures]
+
+
+def main(argv=None):
+    """Command line entry point of the batch re-analysis."""
+    parser = argparse.ArgumentParser(description="Re-analyse recorded session videos without the simulator.")
+    parser.add_argument("videos", nargs="+", help="Recorded session videos")
+    parser.add_argument("--output", default=".", help="The directory traces and summaries are written to")
+    parser.add_argument("--engine", choices=sorted(ESTIMATORS), default="farneback")
+    parser.add_argument("--scale", type=float, default=1.0, help="The analysis scale")
+    parser.add_argument("--threshold", type=float, default=None, help="The movement threshold")
+    parser.add_argument("--workers", type=int, default=1, help="The number of worker processes")
+    args = parser.parse_args(argv)
+
+    for summary in run_batch(args.videos, args.output, args.workers, args.engine, args.scale, args.threshold):
+        print(f"{summary['source']}: {summary['frames']} frames at {summary['analysis_fps']:.1f} fps, "
+              f"{summary['movement_amount']} movements, result {summary['test_result']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QLabel, QWidget
+
+from RMI_Simulator.Estimators import ESTIMATORS
+from RMI_Simulator.FrameSources import FrameSource, SyntheticSource, VideoFileSource, WebcamSource
+from RMI_Simulator.Scheduling import (THREAD_PRIORITIES, available_cpus, describe_scheduling, set_cpu_affinity,
+                                      set_opencv_threads)
+
+
+class StampedSource(FrameSource):
+    """Wraps a frame source and remembers when each frame was read.
+
+    Frames are identified by the array object itself, so the source must deliver frames at the
+    capture size for CaptureThread to pass them on unchanged.
+    """
+
+    def __init__(self, source):
+        """Initializes the StampedSource class.
+
+        Args:
+            source (FrameSource): The wrapped source.
+        """
+        self.source = source
+        self.fps = source.fps
+        self.stamps = {}
+        self.read_count = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Opens the wrapped source."""
+        self.source.open()
+        self.fps = self.source.fps
+
+    def read(self):
+        """Reads a frame from the wrapped source and stamps it."""
+        ret, frame = self.source.read()
+        if not ret:
+            self.exhausted = True
+            return ret, frame
+        with self._lock:
+            self.stamps[id(frame)] = time.perf_counter()
+            self.read_count += 1
+        return ret, frame
+
+    def pop_stamp(self, frame):
+        """Returns and forgets the time a frame was read, or None if it was not stamped."""
+        with self._lock:
+            return self.stamps.pop(id(frame), None)
+
+    def release(self):
+        """Releases the wrapped source."""
+        self.source.release()
+
+
+class BenchmarkHost(QWidget):
+    """Stands in for MainWindow with the attributes OpticalFlowApp uses on its parent widget."""
+
+    def __init__(self):
+        """Initializes the BenchmarkHost class."""
+        super().__init__()
+        self.threshold = None
+        self.collect_movement_data = False
+        self.movement_count = 0
+        self.viewfinder = QLabel(self)
+        self.movement_detected_result_label = QLabel(self)
+        self.movement_value_label = QLabel(self)
+
+
+def benchmark_pipeline(source, estimator="farneback", analysis_scale=1.0, workers=0, timeout=60.0, scheduling=None,
+                       target_fps=None, noise_floor=None):
+    """Runs the whole capture, motion detection and display chain over a frame source.
+
+    The source must run dry, e.g. a SyntheticSource with a number of frames or a video file without
+    looping. Latency is measured from the moment a frame is read to the moment it is displayed.
+    Only the frames the viewfinder paints count as displayed, not those its repaint throttle leaves out.
+
+    Args:
+        source (FrameSource): The source frames are captured from.
+        estimator (str): The name of the motion detection engine.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        workers (int): The number of worker processes, or 0 to run motion detection in its thread.
+        timeout (float): The maximum number of seconds the benchmark runs for.
+        scheduling (dict): Settings passed to OpticalFlowApp.apply_scheduling once the threads are
+            running. The OpenCV thread count and CPU affinity are restored afterwards.
+        target_fps (float): The analysis rate the quality governor holds, or None to run ungoverned
+            at `analysis_scale`.
+        noise_floor (float): The noise floor of the static frame pre-filter, or None to analyse
+            every frame.
+
+    Returns:
+        dict: The number of frames captured, displayed and processed but not painted, the capture
+            and display rates in frames per second, the hand-off counters, the p50, p95 and maximum latencies in ms and the
+            jitter, the standard deviation of the time between displayed frames, in ms, the
+            quality level the governor ended at, if any, the number of frames skipped as static and
+            the CPU time the process used, in seconds.
+    """
+    from RMI_Simulator.MRI_Test import OpticalFlowApp
+
+    app = QApplication.instance() or QApplication(["benchmark"])
+    stamped = StampedSource(source)
+    host = BenchmarkHost()
+    latencies = []
+    displayed_at = []
+    # The number of repaints of the viewfinder so far, and of frames it left out to keep to the screen rate
+    painted = [0, 0]
+
+    def frame_displayed(frame, movement_detected, movement_value):
+        now = time.perf_counter()
+        stamp = stamped.pop_stamp(frame)
+        renderer = flow_app.viewfinder_renderer
+        if renderer is None or renderer.rendered_count == painted[0]:
+            painted[1] += 1
+            return
+        painted[0] = renderer.rendered_count
+        displayed_at.append(now)
+        if stamp is not None:
+            latencies.append(now - stamp)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    flow_app = OpticalFlowApp(host, host, analysis_scale, estimator=estimator, workers=workers, source=stamped)
+    # Connected after display_frame, so the stamp is taken once the frame has been displayed
+    flow_app.process_thread.processed_frame_signal.connect(frame_displayed)
+    previous = flow_app.apply_scheduling(**scheduling) if scheduling else {}
+    flow_app.set_governor(target_fps)
+    flow_app.set_static_filter(noise_floor)
+    deadline = start + timeout
+    idle_since = None
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        if stamped.exhausted:
+            # The last frames are still in flight until nothing is displayed for a while
+            count = len(displayed_at) + painted[1]
+            if idle_since is None or idle_since[0] != count:
+                idle_since = (count, time.perf_counter())
+            elif time.perf_counter() - idle_since[1] > 0.5:
+                break
+        time.sleep(0.001)
+    elapsed = (idle_since[1] if idle_since else time.perf_counter()) - start
+    cpu_s = time.process_time() - cpu_start
+    stats = flow_app.frame_stats()
+    flow_app.close()
+    host.close()
+    if previous.get("opencv_threads") is not None:
+        set_opencv_threads(previous["opencv_threads"])
+    if previous.get("cpus") is not None:
+        set_cpu_affinity(previous["cpus"])
+
+    latencies_ms = np.array(latencies) * 1000.0
+    intervals_ms = np.diff(displayed_at) * 1000.0
+    return {
+        "captured": stamped.read_count,
+        "displayed": len(displayed_at),
+        "throttled": painted[1],
+        "capture_fps": stamped.read_count / elapsed if elapsed else 0.0,
+        "display_fps": len(displayed_at) / elapsed if elapsed else 0.0,
+        "superseded": stats["superseded"],
+        "dropped": stats["dropped"] + stats.get("workers", {}).get("dropped", 0),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)) if latencies else 0.0,
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)) if latencies else 0.0,
+        "latency_max_ms": float(latencies_ms.max()) if latencies else 0.0,
+        "jitter_ms": float(intervals_ms.std()) if len(intervals_ms) > 1 else 0.0,
+        "quality_level": flow_app.governor.level if flow_app.governor is not None else None,
+        "skipped": stats["static"]["skipped"] if "static" in stats else 0,
+        "cpu_s": cpu_s,
+    }
+
+
+def scheduling_grid(opencv_threads=(1, None), priorities=("normal", "time_critical"), affinities=(None,)):
+    """Builds the scheduling settings a sweep goes through.
+
+    Args:
+        opencv_threads (tuple): The OpenCV thread counts, None for the OpenCV default.
+        priorities (tuple): The priorities given to both the capture and processing threads.
+        affinities (tuple): The CPU sets, None for every available CPU.
+
+    Returns:
+        list: One settings dict per combination, see OpticalFlowApp.apply_scheduling.
+    """
+    return [{"opencv_threads": threads, "capture_priority": priority, "process_priority": priority, "cpus": cpus}
+            for threads, priority, cpus in itertools.product(opencv_threads, priorities, affinities)]
+
+
+def sweep_scheduling(make_source, grid, estimator="farneback", analysis_scale=1.0, workers=0, timeout=60.0):
+    """Benchmarks the pipeline once per scheduling configuration, on the same input.
+
+    Args:
+        make_source (callable): Returns a new frame source for each run, e.g. a SyntheticSource with
+            a number of frames.
+        grid (list): The scheduling settings to benchmark, see scheduling_grid.
+        estimator (str): The name of the motion detection engine.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        workers (int): The number of worker processes, or 0 to run motion detection in its thread.
+        timeout (float): The maximum number of seconds each run lasts.
+
+    Returns:
+        list: The (settings, result) pair of every configuration, in the order of the grid.
+    """
+    results = []
+    for settings in grid:
+        result = benchmark_pipeline(make_source(), estimator, analysis_scale, workers, timeout, settings)
+        print(f"{describe_scheduling(settings)}: {result['display_fps']:.1f} fps, "
+              f"jitter {result['jitter_ms']:.1f} ms, p95 latency {result['latency_p95_ms']:.1f} ms")
+        results.append((settings, result))
+    return results
+
+
+def print_benchmark(result):
+    """Prints the benchmark results.
+
+    Args:
+        result (dict): The results returned by benchmark_pipeline.
+    """
+    print(f"captured {result['captured']} frames at {result['capture_fps']:.1f} fps, "
+          f"displayed {result['displayed']} at {result['display_fps']:.1f} fps "
+          f"({result['throttled']} processed but not painted, {result['superseded']} superseded, "
+          f"{result['dropped']} dropped)")
+    print(f"latency p50 {result['latency_p50_ms']:.1f} ms, p95 {result['latency_p95_ms']:.1f} ms, "
+          f"max {result['latency_max_ms']:.1f} ms, jitter {result['jitter_ms']:.1f} ms")
+    print(f"cpu {result['cpu_s']:.2f} s, {result['skipped']} static frames skipped")
+
+
+def main(argv=None):
+    """Command line entry point of the pipeline benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the capture, motion detection and display chain.")
+    parser.add_argument("--video", help="A recorded video to replay, by default a synthetic source is used")
+    parser.add_argument("--webcam", action="store_true", help="Capture from the default camera")
+    parser.add_argument("--frames", type=int, default=300, help="The number of synthetic frames")
+    parser.add_argument("--fps", type=float, default=30.0, help="The frame rate of the synthetic source")
+    parser.add_argument("--unpaced", action="store_true", help="Deliver frames as fast as they can be read")
+    parser.add_argument("--engine", choices=sorted(ESTIMATORS), default="farneback")
+    parser.add_argument("--scale", type=float, default=1.0, help="The analysis scale")
+    parser.add_argument("--workers", type=int, default=0, help="The number of worker processes")
+    parser.add_argument("--timeout", type=float, default=60.0, help="The maximum duration in seconds")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="Let the quality governor hold this analysis rate")
+    parser.add_argument("--noise", type=float, default=0.0,
+                        help="The standard deviation of the sensor noise added to synthetic frames")
+    parser.add_argument("--prefilter", type=float, nargs="?", const=4.0, default=None, metavar="NOISE_FLOOR",
+                        help="Skip motion detection on static frames, below a noise floor of 4 gray levels by default")
+    parser.add_argument("--cv-threads", type=int, default=None, help="The size of the OpenCV thread pool")
+    parser.add_argument("--priority", choices=list(THREAD_PRIORITIES), default=None,
+                        help="The priority of the capture and processing threads")
+    parser.add_argument("--cpus", default=None, help="A comma separated list of the CPUs to run on")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Benchmark every combination of OpenCV threads, thread priority and CPU affinity")
+    args = parser.parse_args(argv)
+
+    def make_source():
+        if args.webcam:
+            return WebcamSource()
+        if args.video:
+            return VideoFileSource(args.video, realtime=not args.unpaced)
+        # Two seconds of movement in every ten
+        period = int(args.fps * 10)
+        bursts = [(start, start + int(args.fps * 2), 3, 0) for start in range(period // 2, args.frames, period)]
+        return SyntheticSource(fps=args.fps, bursts=bursts, frames=args.frames, realtime=not args.unpaced,
+                               noise=args.noise)
+
+    if args.sweep:
+        cpus = available_cpus()
+        affinities = (None,)
+        if cpus and len(cpus) > 1:
+            # Everything on one core, against the scheduler spreading the threads out
+            affinities = (None, {max(cpus)})
+        grid = scheduling_grid(sorted({1, 2, os.cpu_count() or 1}), affinities=affinities)
+        sweep_scheduling(make_source, grid, args.engine, args.scale, args.workers, args.timeout)
+        return
+
+    scheduling = {"opencv_threads": args.cv_threads, "capture_priority": args.priority,
+                  "process_priority": args.priority,
+                  "cpus": {int(cpu) for cpu in args.cpus.split(",")} if args.cpus else None}
+    print_benchmark(benchmark_pipeline(make_source(), args.engine, args.scale, args.workers, args.timeout, scheduling,
+                                       args.target_fps, args.prefilter))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from RMI_Simulator.Motion import FRAME_HEIGHT, FRAME_WIDTH, FlowWorkspace, check_analysis_scale
+
+DEFAULT_SCALES = (1.0, 0.5, 0.25)
+
+
+def measure_movement_values(frames, analysis_scale=1.0):
+    """Runs motion detection over consecutive frames at one analysis scale.
+
+    Args:
+        frames (list): The BGR frames, in capture order.
+        analysis_scale (float): The scale the frames are downsampled to before motion detection.
+
+    Returns:
+        Tuple[np.ndarray, float]: The movement value of every frame after the first one and the
+            time spent per frame in seconds.
+    """
+    workspace = FlowWorkspace(analysis_scale)
+    values = []
+    prev_gray = None
+    start = time.perf_counter()
+    for frame in frames:
+        gray = workspace.preprocess(frame)
+        if prev_gray is not None:
+            values.append(cv2.mean(workspace.flow_magnitude(prev_gray, gray))[0])
+        prev_gray = gray
+    elapsed = time.perf_counter() - start
+    return np.array(values), elapsed / max(len(frames), 1)
+
+
+def calibrate_analysis_scales(frames, scales=DEFAULT_SCALES, threshold=3):
+    """Compares the movement value error against the speedup of each analysis scale.
+
+    The full resolution run is the reference every other scale is compared to.
+
+    Args:
+        frames (list): The BGR frames, in capture order.
+        scales (tuple): The analysis scales to evaluate.
+        threshold (float): The movement threshold used to compare detection decisions.
+
+    Returns:
+        list: One dict per scale with the time per frame, the speedup, the mean and maximum absolute
+            movement value error and the fraction of frames whose detection decision changed.
+    """
+    frames = list(frames)
+    if len(frames) < 2:
+        raise ValueError("calibration needs at least two frames")
+
+    reference, reference_time = measure_movement_values(frames, 1.0)
+    results = []
+    for scale in scales:
+        scale = check_analysis_scale(scale)
+        if scale == 1.0:
+            values, frame_time = reference, reference_time
+        else:
+            values, frame_time = measure_movement_values(frames, scale)
+        error = np.abs(values - reference)
+        results.append({
+            "analysis_scale": scale,
+            "frame_time_ms": frame_time * 1000.0,
+            "speedup": reference_time / frame_time if frame_time else float("inf"),
+            "mean_abs_error": float(np.mean(error)),
+            "max_abs_error": float(np.max(error)),
+            "decision_mismatch": float(np.mean((values > threshold) != (reference > threshold))),
+        })
+    return results
+
+
+def load_video_frames(path, max_frames=300):
+    """Reads frames from a recorded video, resized like the live capture.
+
+    Args:
+        path (str): The path of the video file.
+        max_frames (int): The maximum number of frames to read.
+
+    Returns:
+        list: The BGR frames.
+    """
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT)))
+    cap.release()
+    return frames
+
+
+def print_calibration(results):
+    """Prints the calibration results as a table.
+
+    Args:
+        results (list): The results returned by calibrate_analysis_scales.
+    """
+    print(f"{'scale':>8} {'ms/frame':>10} {'speedup':>8} {'mean err':>9} {'max err':>9} {'mismatch':>9}")
+    for result in results:
+        print(f"{result['analysis_scale']:>8.3f} {result['frame_time_ms']:>10.2f} {result['speedup']:>7.2f}x "
+              f"{result['mean_abs_error']:>9.3f} {result['max_abs_error']:>9.3f} "
+              f"{result['decision_mismatch'] * 100:>8.1f}%")
+
+
+def main(argv=None):
+    """Command line entry point of the analysis scale calibration."""
+    parser = argparse.ArgumentParser(description="Compare motion detection error and speed per analysis scale.")
+    parser.add_argument("video", help="A recorded session video")
+    parser.add_argument("--frames", type=int, default=300, help="The number of frames to analyse")
+    parser.add_argument("--scales", type=float, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--threshold", type=float, default=3)
+    args = parser.parse_args(argv)
+
+    frames = load_video_frames(args.video, args.frames)
+    print_calibration(calibrate_analysis_scales(frames, args.scales, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import cv2
+import numpy as np
+
+from RMI_Simulator.Motion import FlowWorkspace
+
+
+class MotionEstimator:
+    """Base class of the motion detection engines.
+
+    Every engine works on the preprocessed grayscale images produced by its FlowWorkspace and
+    returns the same (movement_detected, movement_value) contract, so engines can be swapped at
+    runtime. Movement values are engine specific: each engine declares the threshold that
+    suits its own unit.
+
+    Attributes:
+        name (str): The name the engine is registered under.
+        label (str): A human readable name for the engine.
+        unit (str): The unit of the movement value.
+        default_threshold (float): The movement value above which movement is detected.
+        stateful (bool): Whether the engine carries state from one frame to the next, so it must see
+            every frame in order.
+        workspace (FlowWorkspace): The buffers preprocessing and flow run in.
+        motion_map (np.ndarray): The latest per-pixel motion map, or None if the engine has none.
+        motion_map_scale (float): The factor converting motion map values to movement values, so the
+            mean of a region of the map is comparable with the movement value.
+    """
+
+    name = None
+    label = None
+    unit = None
+    default_threshold = 3.0
+    stateful = False
+    motion_map_scale = 1.0
+
+    def __init__(self, workspace=None):
+        """Initializes the MotionEstimator class.
+
+        Args:
+            workspace (FlowWorkspace): The buffers preprocessing and flow run in. A new workspace
+                at full resolution is created when None.
+        """
+        self.workspace = workspace if workspace is not None else FlowWorkspace()
+        self.motion_map = None
+
+    def measure(self, prev_gray, gray):
+        """Measures the movement between two consecutive preprocessed images.
+
+        Args:
+            prev_gray (np.ndarray): The previous preprocessed image.
+            gray (np.ndarray): The current preprocessed image.
+
+        Returns:
+            float: The movement value.
+        """
+        raise NotImplementedError
+
+    def estimate(self, prev_gray, gray, threshold=None):
+        """Detects movement between two consecutive preprocessed images.
+
+        Args:
+            prev_gray (np.ndarray): The previous preprocessed image.
+            gray (np.ndarray): The current preprocessed image.
+            threshold (float): The movement value above which movement is detected, or None for
+                the engine default.
+
+        Returns:
+            Tuple[bool, float]: Whether movement is detected and the movement value.
+        """
+        if threshold is None:
+            threshold = self.default_threshold
+        movement_value = self.measure(prev_gray, gray)
+        return movement_value > threshold, movement_value
+
+    def reset(self):
+        """Forgets any state carried from frame to frame."""
+        self.motion_map = None
+
+
+class FarnebackEstimator(MotionEstimator):
+    """Dense Farneback optical flow; the movement value is the mean flow magnitude in pixels."""
+
+    name = "farneback"
+    label = "Farneback optical flow"
+    unit = "px"
+    default_threshold = 3.0
+
+    def measure(self, prev_gray, gray):
+        """Measures the mean Farneback flow magnitude between two preprocessed images."""
+        self.motion_map = self.workspace.flow_magnitude(prev_gray, gray)
+        return cv2.mean(self.motion_map)[0]
+
+    def reset(self):
+        """Forgets the previous flow field."""
+        super().reset()
+        self.workspace.reset_flow()
+
+
+class DISEstimator(MotionEstimator):
+    """Dense inverse search optical flow; the movement value is the mean flow magnitude in pixels.
+
+    DIS is several times cheaper than Farneback for a comparable flow field.
+    """
+
+    name = "dis"
+    label = "DIS optical flow"
+    unit = "px"
+    default_threshold = 3.0
+
+    def __init__(self, workspace=None, preset=cv2.DISOPTICAL_FLOW_PRESET_FAST):
+        """Initializes the DISEstimator class.
+
+        Args:
+            workspace (FlowWorkspace): The buffers preprocessing and flow run in.
+            preset (int): The DIS preset, one of cv2.DISOPTICAL_FLOW_PRESET_*.
+        """
+        super().__init__(workspace)
+        self.dis = cv2.DISOpticalFlow_create(preset)
+
+    def measure(self, prev_gray, gray):
+        """Measures the mean DIS flow magnitude between two preprocessed images."""
+        self.workspace.fit_flow(gray.shape)
+        self.dis.calc(prev_gray, gray, self.workspace.initial_flow())
+        self.motion_map = self.workspace.magnitude_from_flow()
+        return cv2.mean(self.motion_map)[0]
+
+    def reset(self):
+        """Forgets the previous flow field."""
+        super().reset()
+        self.workspace.reset_flow()
+
+
+class SparseLKEstimator(MotionEstimator):
+    """Pyramidal Lucas-Kanade tracking of corners; the movement value is the mean corner displacement in pixels.
+
+    Corners are only detected again every `redetect_interval` frames or when too many are lost,
+    so most frames only pay for tracking a few hundred points.
+    """
+
+    name = "lk"
+    label = "Sparse Lucas-Kanade"
+    unit = "px"
+    default_threshold = 3.0
+    stateful = True
+
+    def __init__(self, workspace=None, max_corners=200, redetect_interval=15, min_corners=20):
+        """Initializes the SparseLKEstimator class.
+
+        Args:
+            workspace (FlowWorkspace): The buffers preprocessing runs in.
+            max_corners (int): The maximum number of corners tracked.
+            redetect_interval (int): The number of frames between two corner detections.
+            min_corners (int): The number of tracked corners under which corners are detected again.
+        """
+        super().__init__(workspace)
+        self.max_corners = max_corners
+        self.redetect_interval = redetect_interval
+        self.min_corners = min_corners
+        self._points = None
+        self._frames_since_detection = 0
+
+    def measure(self, prev_gray, gray):
+        """Measures the mean displacement of the corners tracked between two preprocessed images."""
+        if (self._points is None or len(self._points) < self.min_corners
+                or self._frames_since_detection >= self.redetect_interval):
+            self._points = cv2.goodFeaturesToTrack(prev_gray, self.max_corners, 0.01, 7)
+            self._frames_since_detection = 0
+        self._frames_since_detection += 1
+        if self._points is None:
+            return 0.0
+
+        points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, self._points, None,
+                                                     winSize=(15, 15), maxLevel=2)
+        tracked = status.ravel() == 1
+        if not tracked.any():
+            self._points = None
+            return 0.0
+        displacement = np.linalg.norm((points[tracked] - self._points[tracked]).reshape(-1, 2), axis=1)
+        self._points = points[tracked].reshape(-1, 1, 2)
+        return float(displacement.mean()) / self.workspace.effective_scale()
+
+    def reset(self):
+        """Forgets the tracked corners."""
+        super().reset()
+        self._points = None
+
+
+class BackgroundSubtractionEstimator(MotionEstimator):
+    """MOG2 background subtraction; the movement value is the percentage of foreground pixels.
+
+    The background model adapts to the scene over `history` frames, so slow lighting changes are
+    not reported as movement.
+    """
+
+    name = "mog2"
+    label = "MOG2 background subtraction"
+    unit = "%"
+    default_threshold = 1.0
+    stateful = True
+    # The foreground mask is 0 or 255
+    motion_map_scale = 100.0 / 255.0
+
+    def __init__(self, workspace=None, history=500, var_threshold=16):
+        """Initializes the BackgroundSubtractionEstimator class.
+
+        Args:
+            workspace (FlowWorkspace): The buffers preprocessing runs in.
+            history (int): The number of frames the background model is learned over.
+            var_threshold (float): The squared Mahalanobis distance above which a pixel is foreground.
+        """
+        super().__init__(workspace)
+        self.history = history
+        self.var_threshold = var_threshold
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history, var_threshold, False)
+        self._mask = None
+
+    def measure(self, prev_gray, gray):
+        """Measures the share of the current image that differs from the background model."""
+        if self._mask is None or self._mask.shape != gray.shape:
+            self._mask = np.empty(gray.shape, dtype=np.uint8)
+        self.subtractor.apply(gray, self._mask)
+        self.motion_map = self._mask
+        return cv2.countNonZero(self._mask) * 100.0 / self._mask.size
+
+    def reset(self):
+        """Starts learning a new background model."""
+        super().reset()
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(self.history, self.var_threshold, False)
+
+
+class FrameDifferenceEstimator(MotionEstimator):
+    """Absolute difference between consecutive images; the movement value is the mean difference in gray levels.
+
+    This is the cheapest engine, suited to slow lab PCs.
+    """
+
+    name = "absdiff"
+    label = "Frame difference"
+    unit = "gray levels"
+    default_threshold = 3.0
+    stateful = False
+
+    def __init__(self, workspace=None):
+        """Initializes the FrameDifferenceEstimator class.
+
+        Args:
+            workspace (FlowWorkspace): The buffers preprocessing runs in.
+        """
+        super().__init__(workspace)
+        self._difference = None
+
+    def measure(self, prev_gray, gray):
+        """Measures the mean absolute difference between two preprocessed images."""
+        if self._difference is None or self._difference.shape != gray.shape:
+            self._difference = np.empty(gray.shape, dtype=np.uint8)
+        cv2.absdiff(prev_gray, gray, self._difference)
+        self.motion_map = self._difference
+        return cv2.mean(self._difference)[0]
+
+
+ESTIMATORS = {
+    estimator.name: estimator
+    for estimator in (FarnebackEstimator, DISEstimator, SparseLKEstimator, BackgroundSubtractionEstimator,
+                      FrameDifferenceEstimator)
+}
+
+
+def create_estimator(name, workspace=None, **kwargs):
+    """Creates a motion estimator by name.
+
+    Args:
+        name (str): The name of the engine, one of ESTIMATORS.
+        workspace (FlowWorkspace): The buffers preprocessing and flow run in.
+        **kwargs: Engine specific settings.
+
+    Returns:
+        MotionEstimator: The new estimator.
+    """
+    try:
+        estimator_class = ESTIMATORS[name]
+    except KeyError:
+        raise ValueError(f"unknown motion estimator {name!r}, expected one of {sorted(ESTIMATORS)}") from None
+    return estimator_class(workspace, **kwargs)
@@ -0,0 +1,283 @@
+import time
+
+import cv2
+import numpy as np
+
+from RMI_Simulator.Motion import FRAME_HEIGHT, FRAME_WIDTH
+
+# The capture size first, then the closest common camera modes
+CAPTURE_PROFILES = ((FRAME_WIDTH, FRAME_HEIGHT), (720, 576), (800, 600), (640, 480))
+
+
+class FrameSource:
+    """Base class of the sources CaptureThread reads frames from.
+
+    A source follows the cv2.VideoCapture reading contract: read() returns a (ret, frame) tuple and
+    every frame is a new BGR array the caller may keep.
+
+    Attributes:
+        fps (float): The nominal frame rate of the source.
+    """
+
+    fps = 30.0
+
+    def open(self):
+        """Opens the source. Called from the capture thread before the first read."""
+
+    def read(self):
+        """Reads the next frame.
+
+        Returns:
+            Tuple[bool, np.ndarray]: Whether a frame was read and the frame, or None.
+        """
+        raise NotImplementedError
+
+    def release(self):
+        """Releases the source. Any read afterwards fails."""
+
+
+class WebcamSource(FrameSource):
+    """A camera opened through cv2.VideoCapture, negotiated to deliver the capture size natively.
+
+    The camera is asked for each capture profile in turn, with the FOURCC and frame rate, until it
+    grants one exactly, so frames do not have to be decoded at a larger size and resized. When it
+    grants none, the first profile is asked for again and the driver picks its closest mode. The
+    mode actually granted is kept in `mode`.
+    """
+
+    def __init__(self, index=0, fps=60, profiles=CAPTURE_PROFILES, fourcc="MJPG"):
+        """Initializes the WebcamSource class.
+
+        Args:
+            index (int): The index of the camera.
+            fps (float): The frame rate requested from the camera.
+            profiles (tuple): The (width, height) resolutions to request, in order of preference.
+            fourcc (str): The four character code of the pixel format to request, or None to keep
+                the driver default.
+        """
+        self.index = index
+        self.fps = fps
+        self.profiles = tuple(profiles)
+        self.fourcc = fourcc
+        self.cap = None
+        self.mode = None
+
+    def open(self):
+        """Opens the camera and negotiates the capture mode."""
+        self.cap = cv2.VideoCapture(self.index)
+        if self.fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        for width, height in self.profiles:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            if self._granted_size() == (width, height):
+                break
+        else:
+            # Not left at the last, smallest profile, which every frame would be upscaled from: the
+            # preferred one is asked for again, for the driver to settle on its closest mode
+            width, height = self.profiles[0]
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            print(f"Camera {self.index} grants none of the capture profiles, asked for {width}x{height}")
+        self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+
+        width, height = self._granted_size()
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.mode = {
+            "width": width,
+            "height": height,
+            "fourcc": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)) if fourcc > 0 else None,
+            "fps": self.cap.get(cv2.CAP_PROP_FPS),
+        }
+        print(f"Camera {self.index} mode: {width}x{height} {self.mode['fourcc']} at {self.mode['fps']:.0f} fps")
+
+    def _granted_size(self):
+        """Returns the (width, height) the camera currently delivers."""
+        return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    def read(self):
+        """Reads the next frame from the camera."""
+        if self.cap is None:
+            return False, None
+        return self.cap.read()
+
+    def release(self):
+        """Releases the camera."""
+        if self.cap is not None:
+            self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """A recorded video file, read at its own frame rate or as fast as possible."""
+
+    def __init__(self, path, realtime=True, loop=False):
+        """Initializes the VideoFileSource class.
+
+        Args:
+            path (str): The path of the video file.
+            realtime (bool): Whether frames are delivered at the frame rate of the video.
+            loop (bool): Whether the video starts over once it has been read to the end.
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.cap = None
+        self._pacer = None
+
+    def open(self):
+        """Opens the video file."""
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise ValueError(f"cannot open video {self.path!r}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or FrameSource.fps
+        self._pacer = FramePacer(self.fps) if self.realtime else None
+
+    def read(self):
+        """Reads the next frame of the video."""
+        if self.cap is None:
+            return False, None
+        if self._pacer is not None:
+            self._pacer.wait()
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        """Closes the video file."""
+        if self.cap is not None:
+            self.cap.release()
+
+
+class SyntheticSource(FrameSource):
+    """A deterministic moving-pattern camera for tests and benchmarks.
+
+    Frames crop a seamlessly tiling random texture. The crop stays still except during scripted
+    motion bursts, in which it moves by a fixed number of pixels per frame, so the frames that
+    contain movement are known in advance. Sensor noise can be added to every frame, so still
+    frames are not identical, like those of a real camera.
+    """
+
+    def __init__(self, width=FRAME_WIDTH, height=FRAME_HEIGHT, fps=30.0, bursts=(), frames=None,
+                 realtime=True, seed=0, noise=0.0):
+        """Initializes the SyntheticSource class.
+
+        Args:
+            width (int): The frame width.
+            height (int): The frame height.
+            fps (float): The frame rate.
+            bursts (tuple): (first_frame, last_frame, dx, dy) motion bursts: every frame from
+                first_frame to last_frame included is shifted by (dx, dy) pixels from the previous one.
+            frames (int): The number of frames before the source runs dry, or None for no end.
+            realtime (bool): Whether frames are delivered at `fps`, or as fast as they can be generated.
+            seed (int): The seed of the texture.
+            noise (float): The standard deviation of the Gaussian noise added to every frame, in gray
+                levels.
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.bursts = tuple(bursts)
+        self.frames = frames
+        self.realtime = realtime
+        self.texture = tiling_texture(width, height, seed)
+        self.noise = noise
+        self._noise = np.empty((height, width, 3), dtype=np.int16) if noise else None
+        self.index = 0
+        self.position = (0, 0)
+        self.released = False
+        self._pacer = None
+
+    def open(self):
+        """Rewinds the source to its first frame."""
+        self.index = 0
+        self.position = (0, 0)
+        self.released = False
+        self._pacer = FramePacer(self.fps) if self.realtime else None
+
+    def displacement(self, index):
+        """Returns the shift of a frame relative to the previous one.
+
+        Args:
+            index (int): The index of the frame.
+
+        Returns:
+            Tuple[int, int]: The (dx, dy) shift in pixels.
+        """
+        for first, last, dx, dy in self.bursts:
+            if first <= index <= last:
+                return dx, dy
+        return 0, 0
+
+    def is_moving(self, index):
+        """Returns whether a frame is shifted relative to the previous one."""
+        return index > 0 and self.displacement(index) != (0, 0)
+
+    def read(self):
+        """Generates the next frame."""
+        if self.released or (self.frames is not None and self.index >= self.frames):
+            return False, None
+        if self._pacer is not None:
+            self._pacer.wait()
+        if self.index > 0:
+            dx, dy = self.displacement(self.index)
+            self.position = ((self.position[0] + dx) % self.width, (self.position[1] + dy) % self.height)
+        x, y = self.position
+        frame = self.texture[y:y + self.height, x:x + self.width]
+        if self._noise is None:
+            frame = frame.copy()
+        else:
+            cv2.randn(self._noise, 0, self.noise)
+            frame = cv2.add(frame, self._noise, dtype=cv2.CV_8U)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        """Stops delivering frames."""
+        self.released = True
+
+
+class FramePacer:
+    """Spaces calls to wait() at a fixed frame rate without drifting."""
+
+    def __init__(self, fps):
+        """Initializes the FramePacer class.
+
+        Args:
+            fps (float): The frame rate.
+        """
+        self.interval = 1.0 / fps
+        self.deadline = None
+
+    def wait(self):
+        """Sleeps until the next frame is due."""
+        now = time.perf_counter()
+        if self.deadline is None or now - self.deadline > self.interval:
+            # First frame, or too late to catch up: restart the schedule
+            self.deadline = now
+        elif self.deadline > now:
+            time.sleep(self.deadline - now)
+        self.deadline += self.interval
+
+
+def tiling_texture(width, height, seed=0):
+    """Builds a blurred random texture that tiles seamlessly, repeated twice in each direction.
+
+    Any width x height crop of the result, at any offset below (width, height), is a valid frame.
+
+    Args:
+        width (int): The width of one tile.
+        height (int): The height of one tile.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        np.ndarray: The BGR texture, of shape (2 * height, 2 * width, 3).
+    """
+    rng = np.random.default_rng(seed)
+    tile = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    margin = 8
+    # Blurring a wrapped copy keeps the edges of the tile continuous
+    wrapped = cv2.copyMakeBorder(tile, margin, margin, margin, margin, cv2.BORDER_WRAP)
+    tile = cv2.GaussianBlur(wrapped, (7, 7), 0)[margin:margin + height, margin:margin + width]
+    return np.tile(tile, (2, 2, 1))
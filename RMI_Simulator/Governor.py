@@ -0,0 +1,136 @@
+from datetime import datetime, timezone
+
+# From the best to the cheapest quality. The Farneback pyramid levels and window size are ignored
+# by the other engines; frames left out by the decimation are shown with the last result, without
+# motion detection.
+QUALITY_LEVELS = (
+    {"analysis_scale": 1.0, "levels": 3, "winsize": 15, "decimation": 1},
+    {"analysis_scale": 1.0, "levels": 2, "winsize": 11, "decimation": 1},
+    {"analysis_scale": 0.5, "levels": 3, "winsize": 9, "decimation": 1},
+    {"analysis_scale": 0.5, "levels": 2, "winsize": 7, "decimation": 1},
+    {"analysis_scale": 0.25, "levels": 2, "winsize": 5, "decimation": 1},
+    {"analysis_scale": 0.25, "levels": 2, "winsize": 5, "decimation": 2},
+    {"analysis_scale": 0.25, "levels": 1, "winsize": 5, "decimation": 3},
+)
+
+
+class QualityGovernor:
+    """Holds a target analysis rate by trading detection quality for processing time.
+
+    The processing time of every analysed frame is measured over windows of `window` frames. A
+    window is cut short once its frames took as long to process as the window lasts at the target
+    rate, so an overloaded pipeline reacts within a second or so. When the mean time of a window
+    exceeds the budget of a frame at the target rate, the governor steps down to the next cheaper
+    quality level; when it stays well below the budget, it steps back up. Each decision needs a
+    whole window measured at the current level, and a better level already measured over budget is
+    only tried again after `retry_windows` windows, so the governor does not oscillate between two
+    levels. Every change is kept in `adjustments`, to be stored with the test.
+
+    Attributes:
+        target_fps (float): The rate frames should be analysed at.
+        level (int): The index of the current quality level.
+        adjustments (list): The quality changes, oldest first.
+    """
+
+    def __init__(self, target_fps=30.0, levels=QUALITY_LEVELS, window=30, headroom=0.5, retry_windows=30,
+                 camera=None):
+        """Initializes the QualityGovernor class.
+
+        Args:
+            target_fps (float): The rate frames should be analysed at.
+            levels (tuple): The quality settings, from the best to the cheapest.
+            window (int): The number of analysed frames each decision is based on.
+            headroom (float): The fraction of the budget below which quality steps back up.
+            retry_windows (int): The number of windows before a level found over budget is tried again.
+            camera (str): The name of the camera, kept in the adjustments.
+        """
+        self.target_fps = target_fps
+        self.levels = tuple(levels)
+        self.window = window
+        self.headroom = headroom
+        self.retry_windows = retry_windows
+        self.camera = camera
+        self.level = 0
+        self.adjustments = []
+        self._frame_index = 0
+        self._seconds = 0.0
+        self._measured = 0
+        self._costs = [None] * len(self.levels)
+        self._windows = 0
+
+    @property
+    def settings(self):
+        """The settings of the current quality level."""
+        return self.levels[self.level]
+
+    @property
+    def budget(self):
+        """The processing time available to each analysed frame, in seconds."""
+        return self.level_budget(self.level)
+
+    def level_budget(self, level):
+        """Returns the processing time available to each analysed frame at a quality level, in seconds."""
+        return self.levels[level]["decimation"] / self.target_fps
+
+    def should_process(self):
+        """Returns whether the next frame is analysed, or shown with the result of the last analysed one.
+
+        Called once per captured frame.
+        """
+        self._frame_index += 1
+        return self._frame_index % self.settings["decimation"] == 0
+
+    def record(self, seconds):
+        """Records the processing time of an analysed frame.
+
+        Args:
+            seconds (float): The processing time of the frame.
+
+        Returns:
+            bool: Whether the quality level changed, in which case the new settings must be applied.
+        """
+        self._seconds += seconds
+        self._measured += 1
+        if self._measured < self.window and self._seconds < self.window / self.target_fps:
+            return False
+        mean = self._seconds / self._measured
+        self._seconds = 0.0
+        self._measured = 0
+        self._costs[self.level] = mean
+        self._windows += 1
+        if mean > self.budget and self.level < len(self.levels) - 1:
+            self._change(self.level + 1, "over budget", mean)
+            return True
+        if mean < self.headroom * self.budget and self.level > 0:
+            better = self.level - 1
+            cost = self._costs[better]
+            if cost is None or cost <= self.level_budget(better) or self._windows >= self.retry_windows:
+                self._change(better, "headroom", mean)
+                return True
+        return False
+
+    def _change(self, level, reason, mean):
+        """Moves to a quality level and logs the change."""
+        self.level = level
+        self._frame_index = 0
+        self._windows = 0
+        self._log(reason, mean)
+        print(f"Quality level {level} ({reason}, {1000.0 * mean:.1f} ms per frame): {self.settings}")
+
+    def _log(self, reason, mean=None):
+        """Appends the current quality level to the adjustments."""
+        adjustment = {
+            "timestamp": datetime.now(timezone.utc),
+            "level": self.level,
+            "reason": reason,
+            "processing_ms": None if mean is None else 1000.0 * mean,
+            **self.settings,
+        }
+        if self.camera is not None:
+            adjustment["camera"] = self.camera
+        self.adjustments.append(adjustment)
+
+    def restart_log(self):
+        """Forgets the adjustments, keeping the current level as the first entry, e.g. at the start of a test."""
+        self.adjustments = []
+        self._log("test start")
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+
+STAGES = ("queue", "process", "display", "total")
+
+
+class LatencyTracker:
+    """Rolling latency percentiles of the capture, processing and display stages.
+
+    Each displayed frame adds one sample per stage to a fixed-size ring, so recording is O(1) and
+    allocation free; percentiles are only computed when asked for.
+
+    The stages are:
+        queue: from capture to the start of processing, i.e. the time spent waiting in the mailbox.
+        process: from the start to the end of processing.
+        display: from the end of processing to the frame being painted in the viewfinder.
+        total: from capture to the frame being painted.
+    """
+
+    def __init__(self, window=1000):
+        """Initializes the LatencyTracker class.
+
+        Args:
+            window (int): The number of most recent frames the percentiles are computed over.
+        """
+        self.window = window
+        self._samples = np.zeros((len(STAGES), window))
+        self._next = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, packet, displayed_at=None):
+        """Records the latencies of a displayed frame.
+
+        Args:
+            packet (FramePacket): The packet of the frame, stamped along the pipeline.
+            displayed_at (float): The time.perf_counter() time the frame was painted, now by default.
+        """
+        if packet.processing_started is None or packet.processing_finished is None:
+            return
+        if displayed_at is None:
+            displayed_at = time.perf_counter()
+        with self._lock:
+            column = self._samples[:, self._next]
+            column[0] = packet.processing_started - packet.captured_at
+            column[1] = packet.processing_finished - packet.processing_started
+            column[2] = displayed_at - packet.processing_finished
+            column[3] = displayed_at - packet.captured_at
+            self._next = (self._next + 1) % self.window
+            self.count += 1
+
+    def percentiles(self):
+        """Returns the latency percentiles of every stage over the rolling window.
+
+        Returns:
+            dict: For every stage, the p50, p95 and p99 latencies in ms.
+        """
+        with self._lock:
+            samples = self._samples[:, :min(self.count, self.window)] * 1000.0
+        if samples.shape[1] == 0:
+            return {stage: {"p50": 0.0, "p95": 0.0, "p99": 0.0} for stage in STAGES}
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99), axis=1)
+        return {stage: {"p50": float(p50[i]), "p95": float(p95[i]), "p99": float(p99[i])}
+                for i, stage in enumerate(STAGES)}
+
+    def reset(self):
+        """Forgets every sample."""
+        with self._lock:
+            self._next = 0
+            self.count = 0
+
+
+def format_latency(stats):
+    """Formats latency statistics as short lines for the debug overlay.
+
+    Args:
+        stats (dict): The statistics returned by OpticalFlowApp.latency_stats.
+
+    Returns:
+        str: The formatted lines.
+    """
+    total = stats["total"]
+    return (f"p50 {total['p50']:.0f} p95 {total['p95']:.0f} p99 {total['p99']:.0f} ms\n"
+            f"proc {stats['process']['p50']:.0f} ms drop {stats['superseded'] + stats['dropped']}")
@@ -1,42 +1,194 @@
-import datetime
+import collections
 import threading
+import time
+from datetime import datetime, timezone
 
 import cv2
 import numpy as np
 import pyaudio
 import pygame
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QEvent, QObject, Qt, QThread, pyqtSignal
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtWidgets import QWidget
 
+from RMI_Simulator.Audio import FRAMES_PER_BUFFER, SAMPLE_RATE, measure_loopback_latency
+from RMI_Simulator.Estimators import create_estimator
+from RMI_Simulator.FrameSources import WebcamSource
+from RMI_Simulator.Governor import QualityGovernor
+from RMI_Simulator.Instrumentation import LatencyTracker, format_latency
+from RMI_Simulator.MovementSignal import AdaptiveThreshold, Smoother, create_smoother
+from RMI_Simulator.MovementEvents import EpisodeSegmenter
+from RMI_Simulator.Motion import (FRAME_HEIGHT, FRAME_WIDTH, FlowWorkspace, FramePacket, StaticFrameFilter, ZoneGrid,
+                                  check_analysis_scale, render_flow_overlay)
+from RMI_Simulator.ROI import HeadTracker, fraction_roi, roi_slices
+from RMI_Simulator.Recorder import SessionRecorder
+from RMI_Simulator.Scheduling import set_cpu_affinity, set_opencv_threads, set_thread_priority
+from RMI_Simulator.Workers import FlowWorkerPool
+
+
+class FrameMailbox:
+    """A bounded, latest-frame-wins hand-off channel between two threads.
+
+    The producer never blocks: when the mailbox is full the oldest pending frame is
+    discarded and counted as superseded. The consumer blocks on a condition variable
+    until a frame arrives or the mailbox is closed.
+    """
+
+    def __init__(self, capacity=1):
+        """Initializes the FrameMailbox class.
+
+        Args:
+            capacity (int): The maximum number of frames waiting to be consumed.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._frames = collections.deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        self.put_count = 0
+        self.superseded_count = 0
+        self.dropped_count = 0
+
+    def put(self, frame):
+        """Hands a frame over to the consumer without blocking.
+
+        Args:
+            frame (np.ndarray): The frame to deliver.
+
+        Returns:
+            bool: True if the frame was queued, False if the mailbox is closed.
+        """
+        with self._condition:
+            if self.closed:
+                self.dropped_count += 1
+                return False
+            if len(self._frames) >= self.capacity:
+                self._frames.popleft()
+                self.superseded_count += 1
+            self._frames.append(frame)
+            self.put_count += 1
+            self._condition.notify()
+            return True
+
+    def get(self, timeout=None):
+        """Waits for the next frame.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            np.ndarray: The oldest pending frame, or None on timeout or once the mailbox is closed.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._frames or self.closed, timeout):
+                return None
+            if not self._frames:
+                return None
+            return self._frames.popleft()
+
+    def close(self):
+        """Closes the mailbox, waking up any waiting consumer.
+
+        Frames still pending are discarded and counted as dropped.
+        """
+        with self._condition:
+            self.closed = True
+            self.dropped_count += len(self._frames)
+            self._frames.clear()
+            self._condition.notify_all()
+
+    def stats(self):
+        """Returns the hand-off counters.
+
+        Returns:
+            dict: The number of frames put, superseded by a newer frame and dropped.
+        """
+        with self._condition:
+            return {
+                "put": self.put_count,
+                "superseded": self.superseded_count,
+                "dropped": self.dropped_count,
+                "pending": len(self._frames),
+            }
+
+
+# The number of frames the delivered frame rate is measured over
+FPS_MEASURE_FRAMES = 60
+
 
 class CaptureThread(QThread):
-    """A thread to capture frames from the default camera at 60 fps."""
+    """A thread to capture frames from a frame source, the default camera at 60 fps by default."""
 
-    capture_signal = pyqtSignal(np.ndarray)
+    def __init__(self, mailbox=None, recorder=None, source=None):
+        """Initializes the CaptureThread class.
 
-    def __init__(self):
-        """Initializes the CaptureThread class."""
+        Args:
+            mailbox (FrameMailbox): The mailbox frames are handed to directly from this thread, as
+                FramePacket. When None, frames are only recorded.
+            recorder (SessionRecorder): The recorder every captured frame is also handed to. It
+                only records while started and never blocks capture.
+            source (FrameSource): The source frames are read from, the default camera when None.
+        """
         super().__init__()
+        self.source = source if source is not None else WebcamSource()
         self.cap = None
         self.running = False
+        self.mailbox = mailbox
+        self.recorder = recorder
+        self.measured_fps = None
 
-    def run(self):
-        """Starts the thread to capture frames from the camera."""
+    def start(self, *args):
+        """Starts the capture thread.
+
+        The running flag is raised before the thread starts so that a stop() issued right after
+        start() is not overridden by the new thread.
+        """
         self.running = True
-        self.cap = cv2.VideoCapture(0)
-        # Set capture rate to 60 fps
-        self.cap.set(cv2.CAP_PROP_FPS, 60)
+        super().start(*args)
+
+    @property
+    def fps(self):
+        """The frame rate the source delivers, as measured once known, else as negotiated."""
+        return self.measured_fps or self.source.fps
+
+    def run(self):
+        """Starts the thread to capture frames from the source.
+
+        The frame rate the source actually delivers is measured over the first frames and logged.
+        """
+        self.source.open()
+        self.cap = self.source
+        frame_count = 0
+        first_frame_time = None
 
         while self.running:
             ret, frame = self.cap.read()
             if ret:
-                frame = cv2.resize(frame, (704, 576))
-                self.capture_signal.emit(frame)
+                if frame_count <= FPS_MEASURE_FRAMES:
+                    if frame_count == 0:
+                        first_frame_time = time.perf_counter()
+                        if frame.shape[:2] != (FRAME_HEIGHT, FRAME_WIDTH):
+                            print(f"Resizing {frame.shape[1]}x{frame.shape[0]} frames to {FRAME_WIDTH}x{FRAME_HEIGHT}")
+                    elif frame_count == FPS_MEASURE_FRAMES:
+                        self.measured_fps = frame_count / (time.perf_counter() - first_frame_time)
+                        print(f"Capture delivering {self.measured_fps:.1f} fps")
+                    frame_count += 1
+                # Only resize when the source could not deliver the capture size natively
+                if frame.shape[:2] != (FRAME_HEIGHT, FRAME_WIDTH):
+                    frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+                packet = FramePacket(frame)
+                if self.mailbox is not None:
+                    self.mailbox.put(packet)
+                if self.recorder is not None:
+                    self.recorder.write(frame, packet.captured_ns)
+            else:
+                # Avoid spinning on a missing or unplugged camera, or an exhausted source
+                self.msleep(10)
 
     def stop(self):
-        """Stops the capture thread and releases the camera."""
+        """Stops the capture thread and releases the source."""
         self.running = False
         if self.cap is not None:
             self.cap.release()
@@ -46,43 +198,108 @@ class ProcessThread(QThread):
     """A thread to process captured frames."""
 
     processed_frame_signal = pyqtSignal(np.ndarray, bool, float)
+    # Emitted just before processed_frame_signal with the stamped FramePacket of the same frame
+    packet_signal = pyqtSignal(object)
 
-    def __init__(self, optical_flow_app):
+    def __init__(self, optical_flow_app, workers=0):
         """Initializes the ProcessThread class.
 
         Args:
             optical_flow_app (OpticalFlowApplication): An instance of the OpticalFlowApplication class
                 for processing the captured frames.
+            workers (int): The number of worker processes motion detection is dispatched to, or 0 to
+                run it in this thread.
         """
         super().__init__()
         self.optical_flow_app = optical_flow_app
-        self.input_frame = None
+        self.mailbox = FrameMailbox()
+        self.workers = workers
+        self.worker_pool = None
+        # The detection, movement value and zone means of the last analysed frame
+        self.last_result = (False, 0.0, None)
         self.running = True  # Add a flag to control the thread
 
-    def input_frame_slot(self, frame):
-        """Receives input frames from the capture thread.
+    def run(self):
+        """Starts the thread to process captured frames.
 
-        Args:
-            frame (np.ndarray): The input frame captured by the camera.
+        The thread sleeps on the mailbox until a frame is available, so it does not use
+        any CPU while the camera is idle.
+        """
+        if self.workers:
+            self.run_with_workers()
+            return
+        while self.running:
+            frame = self.mailbox.get()
+            if frame is not None:
+                self.process_frame(frame)
+
+    def run_with_workers(self):
+        """Dispatches captured frames to worker processes through a shared memory ring.
+
+        A collector thread emits the results in capture order while this thread keeps dispatching.
+        The engine and analysis scale are those in use when the thread starts, engines that keep state
+        between frames run in a single worker, and neither the flow overlay nor the zone breakdown is
+        available in this mode since the motion maps stay in the workers.
         """
-        self.input_frame = frame
+        app = self.optical_flow_app
+        workers = 1 if app.estimator.stateful else self.workers
+        self.worker_pool = FlowWorkerPool(workers, app.estimator.name, app.workspace.analysis_scale)
+        collector = threading.Thread(target=self.collect_results)
+        collector.start()
+        try:
+            while self.running:
+                frame = self.mailbox.get()
+                if frame is None:
+                    continue
+                packet = frame if isinstance(frame, FramePacket) else FramePacket(frame)
+                packet.processing_started = time.perf_counter()
+                threshold = app.threshold or app.estimator.default_threshold
+                self.worker_pool.submit(packet.image, packet, threshold)
+        finally:
+            collector.join()
+            self.worker_pool.close()
 
-    def run(self):
-        """Starts the thread to process captured frames."""
+    def collect_results(self):
+        """Emits the results of the worker processes until the thread is stopped."""
         while self.running:
-            if self.input_frame is not None:
-                self.process_frame(self.input_frame)
-                self.input_frame = None
+            for packet, _, movement_value in self.worker_pool.collect(timeout=0.1):
+                packet.processing_finished = time.perf_counter()
+                movement_detected, movement_value = self.optical_flow_app.filter_movement(movement_value)
+                self.optical_flow_app.update_threshold(movement_value)
+                self.packet_signal.emit(packet)
+                self.processed_frame_signal.emit(packet.image, movement_detected, movement_value)
 
     def process_frame(self, frame):
         """Processes the frame using the provided optical flow application.
 
         Args:
-            frame (np.ndarray): The frame to be processed using optical flow.
+            frame (np.ndarray or FramePacket): The frame to be processed using optical flow.
         """
+        image = frame.image if isinstance(frame, FramePacket) else frame
+        packet = frame if isinstance(frame, FramePacket) else FramePacket(image)
+        packet.processing_started = time.perf_counter()
+
         # Convert frame to 8-bit if needed
-        if frame.dtype == np.float64:
-            frame = np.uint8(frame * 255.0)  # Adjust this based on how your frame data is normalized
+        if image.dtype == np.float64:
+            image = np.uint8(image * 255.0)  # Adjust this based on how your frame data is normalized
+            frame = image
+
+        governor = self.optical_flow_app.governor
+        if governor is not None and not governor.should_process():
+            # Decimated frames are still shown, with the result of the last analysed frame
+            if not self.optical_flow_app.estimator.stateful:
+                # The frame is kept as the reference, so flow stays between consecutive frames; stateful
+                # engines keep the last analysed frame, the one their state was computed on
+                reference = frame if isinstance(frame, FramePacket) else FramePacket(frame)
+                self.optical_flow_app.prev_gray = reference.preprocessed(self.optical_flow_app.workspace)
+                if self.optical_flow_app.static_filter is not None:
+                    # The workspace buffer the filter last saw may now hold another frame
+                    self.optical_flow_app.static_filter.forget_reference()
+            movement_detected, movement_value, packet.zones = self.last_result
+            packet.processing_finished = time.perf_counter()
+            self.packet_signal.emit(packet)
+            self.processed_frame_signal.emit(image, movement_detected, movement_value)
+            return
 
         # Process the frame
         prev_gray, movement_detected, movement_value = self.optical_flow_app.process_optical_flow(
@@ -90,43 +307,601 @@ class ProcessThread(QThread):
         )
 
         # Emit the processed frame signal
-        self.processed_frame_signal.emit(frame, movement_detected, movement_value)
+        zones = self.optical_flow_app.frame_zones
+        packet.zones = None if zones is None else zones.copy()
+        packet.processing_finished = time.perf_counter()
+        self.last_result = (movement_detected, movement_value, packet.zones)
+        self.packet_signal.emit(packet)
+        self.processed_frame_signal.emit(image, movement_detected, movement_value)
 
-        # Update previous gray frame
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        self.optical_flow_app.prev_gray = gray
+        # The preprocessed image of this frame is the reference of the next one
+        self.optical_flow_app.prev_gray = prev_gray
+
+        # Frames skipped as static cost next to nothing and say nothing about the cost of a movement
+        if (governor is not None and not self.optical_flow_app.frame_static
+                and governor.record(packet.processing_finished - packet.processing_started)):
+            self.optical_flow_app.apply_quality(governor.settings)
 
     def stop(self):
         """Stops the processing thread."""
         self.running = False
+        self.mailbox.close()
+
+
+class ViewfinderRenderer:
+    """Renders frames into a viewfinder label at the size of the label.
+
+    Each frame is downscaled in a single cv2.resize straight into a persistent buffer, which a
+    persistent QImage wraps in BGR order, so no full resolution copy or channel swap is made.
+    Repaints are throttled to the refresh rate of the screen.
+    """
+
+    def __init__(self, label, size=(200, 220), refresh_rate=None):
+        """Initializes the ViewfinderRenderer class.
+
+        Args:
+            label (QLabel): The viewfinder label. Its size is fixed once here.
+            size (tuple): The (width, height) of the viewfinder.
+            refresh_rate (float): The maximum number of repaints per second, the refresh rate of the
+                primary screen by default.
+        """
+        self.label = label
+        self.width, self.height = size
+        self.label.setFixedSize(self.width, self.height)
+        self.buffer = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        self.image = QImage(self.buffer.data, self.width, self.height, 3 * self.width, QImage.Format_BGR888)
+        if refresh_rate is None:
+            screen = QApplication.primaryScreen()
+            refresh_rate = screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60.0
+        self.interval = 1.0 / refresh_rate
+        self.last_render = None
+        self.rendered_count = 0
+        self.throttled_count = 0
+
+    def due(self, now):
+        """Returns whether a repaint is due, counting the frames skipped when it is not.
+
+        Args:
+            now (float): The current time.perf_counter() time.
+        """
+        if self.last_render is not None and now - self.last_render < self.interval:
+            self.throttled_count += 1
+            return False
+        self.last_render = now
+        return True
+
+    def render(self, frame, magnitude=None, text=None, roi=None):
+        """Paints a frame into the viewfinder.
+
+        Args:
+            frame (np.ndarray): The BGR frame, at any resolution.
+            magnitude (np.ndarray): A flow magnitude drawn over the frame, or None.
+            text (str): Lines of text drawn over the frame, or None.
+            roi (tuple): The (x, y, width, height) of a region outlined over the frame, in frame
+                pixels, or None.
+        """
+        cv2.resize(frame, (self.width, self.height), dst=self.buffer, interpolation=cv2.INTER_AREA)
+        if magnitude is not None:
+            np.copyto(self.buffer, render_flow_overlay(self.buffer, magnitude))
+        if roi is not None:
+            scale_x = self.width / frame.shape[1]
+            scale_y = self.height / frame.shape[0]
+            x, y, width, height = roi
+            cv2.rectangle(self.buffer, (int(x * scale_x), int(y * scale_y)),
+                          (int((x + width) * scale_x) - 1, int((y + height) * scale_y) - 1), (0, 255, 0), 1)
+        if text:
+            for i, line in enumerate(text.splitlines()):
+                cv2.putText(self.buffer, line, (4, 14 + 14 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.38, (0, 255, 255), 1)
+        self.label.setPixmap(QPixmap.fromImage(self.image))
+        self.rendered_count += 1
+
+
+class RegionEditor(QObject):
+    """Lets the operator draw the analysed region over a viewfinder with the mouse.
+
+    Dragging with the left button draws a new region; a right click goes back to the preset.
+    """
+
+    # The (left, top, width, height) fractions of the frame drawn, or None to go back to the preset
+    region_edited = pyqtSignal(object)
+
+    def __init__(self, label, min_size=0.05):
+        """Initializes the RegionEditor class.
+
+        Args:
+            label (QLabel): The viewfinder label, whose mouse events are filtered.
+            min_size (float): The smallest side of a region, as a fraction of the frame, below which
+                a drag is ignored as a click.
+        """
+        super().__init__(label)
+        self.label = label
+        self.min_size = min_size
+        self.dragged = None
+        self._anchor = None
+        label.installEventFilter(self)
+
+    def _fraction(self, position):
+        """Converts a position in the label to fractions of the frame."""
+        return (min(max(position.x() / max(self.label.width(), 1), 0.0), 1.0),
+                min(max(position.y() / max(self.label.height(), 1), 0.0), 1.0))
+
+    def _region(self, position):
+        """Returns the region between the anchor of the drag and a position."""
+        x, y = self._fraction(position)
+        left, top = min(self._anchor[0], x), min(self._anchor[1], y)
+        return left, top, abs(x - self._anchor[0]), abs(y - self._anchor[1])
+
+    def eventFilter(self, watched, event):
+        """Follows the drags over the viewfinder."""
+        if event.type() == QEvent.MouseButtonPress:
+            if event.button() == Qt.RightButton:
+                self.region_edited.emit(None)
+            elif event.button() == Qt.LeftButton:
+                self._anchor = self._fraction(event.pos())
+                self.dragged = None
+            return True
+        if event.type() == QEvent.MouseMove and self._anchor is not None:
+            self.dragged = self._region(event.pos())
+            return True
+        if event.type() == QEvent.MouseButtonRelease and self._anchor is not None:
+            region = self._region(event.pos())
+            self._anchor = None
+            self.dragged = None
+            if min(region[2], region[3]) >= self.min_size:
+                self.region_edited.emit(region)
+            return True
+        return False
 
 
 class OpticalFlowApp(QWidget):
-    """A widget for an application to process optical flow in real-time."""
+    """A widget for an application to process optical flow in real-time.
+
+    Each OpticalFlowApp is one camera pipeline, with its own capture and processing threads,
+    threshold and movement episodes, so several cameras run side by side without sharing a thread.
+    """
 
-    def __init__(self, parent, parent_widget):
+    def __init__(self, parent, parent_widget, analysis_scale=1.0, warm_start=False, estimator="farneback",
+                 workers=0, source=None, zone_grid=(3, 3), camera=None, viewfinder=None, show_status=True):
         """Initializes the OpticalFlowApp class.
 
         Args:
             parent (QWidget): The parent widget.
             parent_widget (QWidget): The parent widget where this OpticalFlowApp is used.
+            analysis_scale (float): The scale the frames are downsampled to before motion detection,
+                e.g. 0.5 or 0.25. The viewfinder always shows the full resolution frame.
+            warm_start (bool): Whether each flow computation starts from the previous flow field.
+            estimator (str): The name of the motion detection engine, see Estimators.ESTIMATORS.
+            workers (int): The number of worker processes motion detection runs in, or 0 to run it
+                in the processing thread.
+            source (FrameSource): The source frames are captured from, the default camera when None.
+            zone_grid (tuple): The (rows, cols) of the grid the motion map is broken down into.
+            camera (str): The name of the camera, e.g. "head", or None for the only camera.
+            viewfinder (QLabel): The label frames are shown in, the viewfinder of the parent widget
+                when None.
+            show_status (bool): Whether the movement labels and the threshold of the parent widget
+                follow this camera.
         """
         super().__init__(parent)
+        self.camera = camera
+        self.viewfinder_label = viewfinder
+        self.show_status = show_status
         self.parent_widget = parent_widget
         self.prev_gray = None
+        self.workspace = FlowWorkspace(analysis_scale, warm_start)
+        self.estimator = create_estimator(estimator, self.workspace)
+        self.flow_overlay = False
+        self.overlay_magnitude = None
+        self.zone_grid = ZoneGrid(*zone_grid)
+        self.frame_zones = None
+        self.frame_static = False
+        self.test_data = EpisodeSegmenter(zone_shape=zone_grid)
+        self.display_packet = None
+        self.latency = LatencyTracker()
+        self.latency_overlay = False
+        self._latency_text = None
+        self._latency_text_time = 0.0
+        self.viewfinder_renderer = None
+        self._shown_detected = None
         self.viewfinder = QLabel(self)
         self.viewfinder.setGeometry(600, 600, 200, 220)
         self.threshold = None
+        self.adaptive_threshold = None
+        self.smoother = Smoother()
+        self.governor = None
+        self.static_filter = None
+        self.head_tracker = None
+        # The rate and settings head tracking was switched on with, kept while a drawn region replaces it
+        self.head_tracking = None
+        self.roi_region = None
+        self.roi_preset = None
+        self.roi = None
+        self.roi_changes = []
+        self.region_editor = None
+        self.recorder = SessionRecorder()
 
-        self.capture_thread = CaptureThread()
-        self.process_thread = ProcessThread(self)
+        self.process_thread = ProcessThread(self, workers)
+        # Frames go straight from the capture thread to the processing thread, bypassing the GUI event loop
+        self.capture_thread = CaptureThread(self.process_thread.mailbox, self.recorder, source)
 
-        self.capture_thread.capture_signal.connect(self.process_thread.input_frame_slot)
+        self.process_thread.packet_signal.connect(self.receive_packet)
         self.process_thread.processed_frame_signal.connect(self.display_frame)
 
         self.capture_thread.start()
         self.process_thread.start()
 
+    def set_analysis_scale(self, analysis_scale):
+        """Changes the resolution motion detection runs at.
+
+        Args:
+            analysis_scale (float): The scale factor in (0, 1], e.g. 0.5 for half resolution.
+        """
+        self.workspace.analysis_scale = check_analysis_scale(analysis_scale)
+
+    def set_estimator(self, name, **kwargs):
+        """Switches the motion detection engine.
+
+        The new engine shares the preprocessing workspace and starts with its own default threshold.
+        Movement values are not comparable between engines, so any adaptive threshold is dropped.
+
+        Args:
+            name (str): The name of the engine, see Estimators.ESTIMATORS.
+            **kwargs: Engine specific settings.
+        """
+        estimator = create_estimator(name, self.workspace, **kwargs)
+        self.threshold = estimator.default_threshold
+        self.adaptive_threshold = None
+        self.overlay_magnitude = None
+        self.smoother.reset()
+        self.estimator = estimator
+
+    @property
+    def baseline_key(self):
+        """The key the still baseline of this camera, engine and smoothing is stored under.
+
+        Smoothing narrows the spread of the still movement values, so a baseline only holds for the
+        filter it was calibrated with.
+        """
+        parts = [self.estimator.name]
+        if self.smoother.name != Smoother.name:
+            parts.append(self.smoother.name)
+        if self.camera is not None:
+            parts.append(self.camera)
+        return "_".join(parts)
+
+    def start_calibration(self, k, baseline=None, calibration_frames=90):
+        """Switches to an adaptive threshold at baseline + k standard deviations.
+
+        Without a stored baseline, the movement values of the next `calibration_frames` frames form
+        the baseline, during which the participant is expected to lie still and the current
+        threshold stays in use.
+
+        Args:
+            k (float): The number of standard deviations above the baseline movement is detected at.
+            baseline (dict): A baseline stored from an earlier calibration, see AdaptiveThreshold.to_dict.
+            calibration_frames (int): The number of frames of the calibration window.
+        """
+        if baseline is not None:
+            self.adaptive_threshold = AdaptiveThreshold.from_dict(baseline, k)
+            self._apply_threshold(self.adaptive_threshold.threshold)
+        else:
+            self.adaptive_threshold = AdaptiveThreshold(k, calibration_frames,
+                                                        default=self.threshold or self.estimator.default_threshold)
+
+    def apply_scheduling(self, opencv_threads=None, capture_priority=None, process_priority=None, cpus=None):
+        """Controls how the capture and processing threads compete for the CPU.
+
+        Settings left at None are not changed.
+
+        Args:
+            opencv_threads (int): The size of the OpenCV thread pool, see Scheduling.set_opencv_threads.
+            capture_priority (str): The priority of the capture thread, see Scheduling.THREAD_PRIORITIES.
+            process_priority (str): The priority of the processing thread.
+            cpus (iterable): The CPUs the process is restricted to.
+
+        Returns:
+            dict: The previous OpenCV thread count and CPUs, for the settings that were changed.
+        """
+        previous = {}
+        if opencv_threads is not None:
+            previous["opencv_threads"] = set_opencv_threads(opencv_threads)
+        if capture_priority is not None:
+            set_thread_priority(self.capture_thread, capture_priority)
+        if process_priority is not None:
+            set_thread_priority(self.process_thread, process_priority)
+        if cpus is not None:
+            previous["cpus"] = set_cpu_affinity(cpus)
+        return previous
+
+    def set_governor(self, target_fps=None, **kwargs):
+        """Switches the quality-of-service governor on or off.
+
+        The governor trades the analysis scale, the Farneback pyramid and window and the share of
+        frames analysed for processing time, to analyse frames at the target rate. It starts at the
+        best quality. Motion detection in worker processes is not governed.
+
+        Args:
+            target_fps (float): The rate frames should be analysed at, or None to switch the governor off.
+            **kwargs: Settings of the QualityGovernor.
+        """
+        if target_fps is None:
+            self.governor = None
+            return
+        governor = QualityGovernor(target_fps, camera=self.camera, **kwargs)
+        self.apply_quality(governor.settings)
+        self.governor = governor
+
+    def set_static_filter(self, noise_floor=None, **kwargs):
+        """Switches the static frame pre-filter on or off.
+
+        Frames whose difference with the previous one stays below the noise floor are reported as
+        still without running motion detection. The filter is bypassed while the threshold
+        calibrates, which needs the movement values of still frames, and for engines that must see
+        every frame. Motion detection in worker processes is not filtered.
+
+        Args:
+            noise_floor (float): The block difference, in gray levels, below which a frame is static,
+                or None to switch the filter off.
+            **kwargs: Settings of the StaticFrameFilter.
+        """
+        self.static_filter = None if noise_floor is None else StaticFrameFilter(noise_floor, **kwargs)
+
+    def set_head_tracking(self, rate=2.0, **kwargs):
+        """Switches head tracking on or off.
+
+        While the head is tracked, motion detection only runs on the region around it, which saves
+        most of the flow computation and keeps movement in the background or at the edges of the
+        bore out of the movement value. The zones then break the region down instead of the frame.
+        Motion detection in worker processes always runs on the whole frame.
+
+        Args:
+            rate (float): The number of head detections per second, or None to switch tracking off
+                and analyse the whole frame.
+            **kwargs: Settings of the HeadTracker.
+        """
+        self.head_tracking = None if rate is None else (rate, kwargs)
+        self._start_head_tracker()
+
+    def _start_head_tracker(self):
+        """Replaces the head tracker by one with the settings of head_tracking, if it is on."""
+        if self.head_tracker is not None:
+            self.head_tracker.stop()
+            self.head_tracker = None
+        if self.head_tracking is not None:
+            rate, kwargs = self.head_tracking
+            self.head_tracker = HeadTracker(rate, **kwargs)
+            self.head_tracker.start()
+
+    def set_roi_region(self, region, preset=True):
+        """Restricts motion detection to a fixed region of the frame.
+
+        A tracked head takes precedence over the region while it is found.
+
+        Args:
+            region (tuple): The (left, top, width, height) of the region, as fractions of the frame,
+                or None to analyse the whole frame.
+            preset (bool): Whether the region is the preset of the examined body part, which the
+                operator may go back to after drawing another one.
+        """
+        self.roi_region = None if region is None else tuple(region)
+        if preset:
+            self.roi_preset = self.roi_region
+
+    def edit_roi_region(self, region):
+        """Applies a region drawn in the viewfinder, which replaces head tracking.
+
+        Args:
+            region (tuple): The (left, top, width, height) fractions of the frame drawn, or None to go
+                back to the preset of the examined body part, and to head tracking if it was on.
+        """
+        if region is None:
+            self.set_roi_region(self.roi_preset)
+            if self.head_tracker is None:
+                self._start_head_tracker()
+        else:
+            if self.head_tracker is not None:
+                self.head_tracker.stop()
+                self.head_tracker = None
+            self.set_roi_region(region, preset=False)
+        print(f"Analysed region: {self.roi_region}")
+
+    def restart_roi_log(self):
+        """Forgets the regions analysed so far, keeping the current one as the first, e.g. at the start of a test."""
+        self.roi_changes = []
+        self._log_roi(self.roi)
+
+    def _log_roi(self, roi):
+        """Appends the region analysed from now on to roi_changes."""
+        self.roi_changes.append({"timestamp": datetime.now(timezone.utc),
+                                 "roi": None if roi is None else list(roi)})
+
+    def roi_settings(self):
+        """Returns how the analysed region was chosen, as stored with the test.
+
+        Returns:
+            dict: The region as fractions of the frame, or None for the whole frame, whether it was
+                drawn in the viewfinder rather than preset, whether the head was tracked, and the
+                regions in frame pixels motion detection ran on, each with the time it started.
+        """
+        return {
+            "region": None if self.roi_region is None else list(self.roi_region),
+            "edited": self.roi_region != self.roi_preset,
+            "head_tracking": self.head_tracker is not None,
+            "changes": list(self.roi_changes),
+        }
+
+    def apply_quality(self, settings):
+        """Applies the settings of a quality level.
+
+        Engines carrying state from frame to frame start over, their state was built at another
+        scale or frame spacing.
+
+        Args:
+            settings (dict): The analysis scale, Farneback pyramid levels and window size of the level.
+        """
+        self.set_analysis_scale(settings["analysis_scale"])
+        self.workspace.levels = settings["levels"]
+        self.workspace.winsize = settings["winsize"]
+        if self.estimator.stateful:
+            self.estimator.reset()
+
+    def set_smoother(self, name, **kwargs):
+        """Switches the filter the movement value is smoothed with before detection.
+
+        Smoothed values have another spread, so an adaptive threshold calibrates again.
+
+        Args:
+            name (str): The name of the filter, see MovementSignal.SMOOTHERS.
+            **kwargs: Filter specific settings.
+
+        Returns:
+            float: The delay the filter adds to detection, in ms at the capture frame rate.
+        """
+        smoother = create_smoother(name, **kwargs)
+        self.smoother = smoother
+        if self.adaptive_threshold is not None:
+            self.start_calibration(self.adaptive_threshold.k)
+        latency_ms = smoother.latency_ms(self.capture_thread.fps)
+        print(f"Smoothing: {smoother.label}, {latency_ms:.0f} ms added latency")
+        return latency_ms
+
+    def filter_movement(self, movement_value):
+        """Smooths a raw movement value and decides whether it is a movement.
+
+        Args:
+            movement_value (float): The raw movement value of the latest frame.
+
+        Returns:
+            Tuple[bool, float]: Whether movement is detected and the smoothed movement value.
+        """
+        movement_value = self.smoother.update(movement_value)
+        threshold = self.threshold if self.threshold else self.estimator.default_threshold
+        return movement_value > threshold, movement_value
+
+    def update_threshold(self, movement_value):
+        """Feeds a movement value to the adaptive threshold while it calibrates.
+
+        Args:
+            movement_value (float): The movement value of the latest frame.
+        """
+        adaptive_threshold = self.adaptive_threshold
+        if adaptive_threshold is None or adaptive_threshold.calibrated:
+            return
+        adaptive_threshold.update(movement_value)
+        if adaptive_threshold.calibrated:
+            self._apply_threshold(adaptive_threshold.threshold)
+
+    def _apply_threshold(self, threshold):
+        """Makes a threshold the one used for detection by this camera."""
+        self.threshold = threshold
+        if self.show_status:
+            self.parent_widget.threshold = threshold
+        print(f"Threshold: {threshold:.3f}")
+
+    def set_zone_grid(self, rows, cols):
+        """Changes the grid the motion map is broken down into.
+
+        Args:
+            rows (int): The number of zone rows.
+            cols (int): The number of zone columns.
+        """
+        self.zone_grid = ZoneGrid(rows, cols)
+        self.test_data = EpisodeSegmenter(zone_shape=(rows, cols))
+
+    def receive_packet(self, packet):
+        """Keeps the packet of the frame about to be displayed, with its stamps and zone means.
+
+        Args:
+            packet (FramePacket): The packet of the next frame display_frame receives.
+        """
+        self.display_packet = packet
+
+    def set_latency_overlay(self, enabled):
+        """Switches the latency debug overlay of the viewfinder on or off.
+
+        Args:
+            enabled (bool): Whether the latency percentiles are drawn over the viewfinder.
+        """
+        self.latency_overlay = enabled
+        self._latency_text = None
+
+    def latency_stats(self):
+        """Returns the end-to-end latency statistics of the displayed frames.
+
+        Returns:
+            dict: The p50, p95 and p99 latencies in ms of the queue, process, display and total
+                stages, the number of frames displayed, and the number of frames superseded or
+                dropped before being displayed.
+        """
+        stats = self.latency.percentiles()
+        frames = self.frame_stats()
+        stats["displayed"] = self.latency.count
+        stats["superseded"] = frames["superseded"]
+        stats["dropped"] = frames["dropped"] + frames.get("workers", {}).get("dropped", 0)
+        return stats
+
+    def set_flow_overlay(self, enabled):
+        """Switches the flow overlay of the viewfinder on or off.
+
+        When the overlay is off the processing thread does no visualization work at all.
+
+        Args:
+            enabled (bool): Whether the flow magnitude is drawn over the viewfinder.
+        """
+        self.flow_overlay = enabled
+        if not enabled:
+            self.overlay_magnitude = None
+
+    def start_recording(self, path):
+        """Starts recording the captured frames to a video file, at the rate they are captured.
+
+        Args:
+            path (str): The path of the video file.
+
+        Returns:
+            str: The path of the video file.
+        """
+        return self.recorder.start(path, self.capture_thread.fps)
+
+    def stop_recording(self):
+        """Stops recording and closes the video file.
+
+        Returns:
+            str: The path of the recorded file, or None if nothing was being recorded.
+        """
+        return self.recorder.stop()
+
+    def frame_stats(self):
+        """Returns the frame hand-off counters between the capture and processing threads.
+
+        Returns:
+            dict: The number of frames put, superseded by a newer frame and dropped, the worker pool
+                counters when motion detection runs in worker processes, the recorder counters
+                while recording, the frames skipped as static when the pre-filter is on and the
+                tracking counters while the head is tracked.
+        """
+        stats = self.process_thread.mailbox.stats()
+        worker_pool = self.process_thread.worker_pool
+        if worker_pool is not None:
+            stats["workers"] = worker_pool.stats()
+        if self.recorder.recording:
+            stats["recorder"] = self.recorder.stats()
+        if self.static_filter is not None:
+            stats["static"] = self.static_filter.stats()
+        if self.head_tracker is not None:
+            stats["head"] = self.head_tracker.stats()
+        return stats
+
+    def closeEvent(self, event):
+        """Stops the capture and processing threads when the widget is closed."""
+        self.capture_thread.stop()
+        self.process_thread.stop()
+        self.capture_thread.wait()
+        self.process_thread.wait()
+        self.recorder.stop()
+        if self.head_tracker is not None:
+            self.head_tracker.stop()
+        super().closeEvent(event)
+
     def display_frame(self, frame, movement_detected, movement_value):
         """Displays the processed frame in the widget and updates labels based on movement detection.
 
@@ -134,72 +909,140 @@ class OpticalFlowApp(QWidget):
             frame (np.ndarray): The processed frame to display.
             movement_detected (bool): Indicates whether movement is detected in the frame.
             movement_value (float): The calculated movement value.
-        """
-        if movement_detected:
-            self.parent_widget.movement_detected_result_label.setText("Movement Detected!")
-            self.parent_widget.movement_detected_result_label.setStyleSheet("font-size: 12px; color: red;")
 
-            if self.parent_widget.collect_movement_data:
-                movement_data = {
-                    "movement_detected": movement_detected,
-                    "movement_value": movement_value,
-                    "timestamp": datetime.datetime.utcnow(),
-                }
+        Movement data is collected into test_data for every frame, dated by its capture time so the
+        episodes of several cameras line up, while the viewfinder is only repainted at the screen
+        refresh rate and the detection label only restyled when the detection state changes.
+        """
+        state_changed = movement_detected != self._shown_detected
+        self._shown_detected = movement_detected
+        if self.parent_widget.collect_movement_data:
+            packet = self.display_packet
+            if packet is not None:
+                opened = self.test_data.append(movement_value, self.threshold, packet.zones, packet.captured_ns)
+            else:
+                opened = self.test_data.append(movement_value, self.threshold)
+            if opened:
                 self.parent_widget.movement_count += 1
-                self.parent_widget.current_test_data.append(movement_data)
-        else:
-            self.parent_widget.movement_detected_result_label.setText("NO Movement Detected")
-            self.parent_widget.movement_detected_result_label.setStyleSheet("font-size: 12px; color: green;")
-
-        self.parent_widget.movement_value_label.setText(f"Movement Value: {movement_value:.2f}")
-
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = frame.shape
-        bytes_per_line = ch * w
-        # Calculate the appropriate QLabel size based on the video feed's aspect ratio
-        viewfinder_width = 200
-        viewfinder_height = 220
-        self.parent_widget.viewfinder.setFixedSize(viewfinder_width, viewfinder_height)
-        qimage = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qimage)
-        self.parent_widget.viewfinder.setPixmap(pixmap)
+
+        if self.show_status:
+            if movement_detected:
+                if state_changed:
+                    self.parent_widget.movement_detected_result_label.setText("Movement Detected!")
+                    self.parent_widget.movement_detected_result_label.setStyleSheet("font-size: 12px; color: red;")
+            elif state_changed:
+                self.parent_widget.movement_detected_result_label.setText("NO Movement Detected")
+                self.parent_widget.movement_detected_result_label.setStyleSheet("font-size: 12px; color: green;")
+
+            self.parent_widget.movement_value_label.setText(f"Movement Value: {movement_value:.2f}")
+
+        packet, self.display_packet = self.display_packet, None
+        renderer = self.viewfinder_renderer
+        if renderer is None:
+            label = self.viewfinder_label if self.viewfinder_label is not None else self.parent_widget.viewfinder
+            renderer = self.viewfinder_renderer = ViewfinderRenderer(label)
+            self.region_editor = RegionEditor(label)
+            self.region_editor.region_edited.connect(self.edit_roi_region)
+        now = time.perf_counter()
+        if not renderer.due(now):
+            return
+
+        overlay_magnitude = self.overlay_magnitude if self.flow_overlay else None
+        text = None
+        if self.latency_overlay:
+            # The percentiles are refreshed twice a second, not on every frame
+            if self._latency_text is None or now - self._latency_text_time > 0.5:
+                self._latency_text = format_latency(self.latency_stats())
+                self._latency_text_time = now
+            text = self._latency_text
+        # The region being drawn, or the one motion detection runs on
+        dragged = self.region_editor.dragged
+        roi = fraction_roi(dragged, frame.shape) if dragged is not None else self.roi
+        renderer.render(frame, overlay_magnitude, text, roi)
+
+        if packet is not None:
+            self.latency.record(packet)
 
     def process_optical_flow(self, frame, prev_gray):
         """Processes the frame to detect optical flow and movements.
 
         Args:
-            frame (np.ndarray): The frame to process.
-            prev_gray (np.ndarray): The previous grayscale frame.
+            frame (np.ndarray or FramePacket): The frame to process. A FramePacket keeps the
+                preprocessed image cached with the frame.
+            prev_gray (np.ndarray): The preprocessed grayscale image of the previous frame.
+
+        The zone means of the motion map are left in frame_zones, or None when the engine has no map,
+        and whether the static frame pre-filter skipped motion detection in frame_static.
+        While the head is tracked, motion is only measured in the region around it, otherwise in the
+        region set with set_roi_region, if any.
 
         Returns:
-            Tuple[np.ndarray, bool, float]: A tuple containing the updated previous grayscale frame,
-                a boolean indicating whether movement is detected, and the calculated movement value.
+            Tuple[np.ndarray, bool, float]: A tuple containing the preprocessed grayscale image of this
+                frame, a boolean indicating whether movement is detected, and the calculated movement value.
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (5, 5), 0)
-        gray = cv2.convertScaleAbs(gray, alpha=1, beta=-50)
+        packet = frame if isinstance(frame, FramePacket) else FramePacket(frame)
+        gray = packet.preprocessed(self.workspace)
         movement_detected = False
         movement_value = 0.0
+        self.frame_zones = None
+        self.frame_static = False
+        head_tracker = self.head_tracker
+        if head_tracker is not None:
+            head_tracker.submit(packet.image)
 
-        if prev_gray is not None:
-            flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 6, 5, 1.2, 0)
-            magnitude, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-
-            if self.parent_widget.threshold is None:
-                self.threshold = 3
+        # The reference is skipped when the analysis scale changed since the previous frame
+        if prev_gray is not None and prev_gray.shape == gray.shape:
+            estimator = self.estimator
+            # Each camera keeps its own threshold, the parent widget shows the one of its labels
+            if self.show_status and self.parent_widget.threshold is None:
+                self.threshold = estimator.default_threshold
                 self.parent_widget.threshold = self.threshold
                 print(f"Threshold: {self.threshold}")
             if not self.threshold:
-                self.threshold = np.max(np.mean(magnitude[:500])) + 0.05
-            movement_detected = np.mean(magnitude) > self.threshold
-            movement_value = float(np.mean(magnitude))
+                self.threshold = estimator.default_threshold
+
+            static_filter = self.static_filter
+            roi = head_tracker.roi if head_tracker is not None else None
+            if roi is None and self.roi_region is not None:
+                roi = fraction_roi(self.roi_region, packet.image.shape)
+            if roi != self.roi:
+                # The region moved: flow fields, tracked corners and background models no longer line up
+                self.roi = roi
+                self._log_roi(roi)
+                estimator.reset()
+                if static_filter is not None:
+                    static_filter.forget_reference()
+            previous, current = prev_gray, gray
+            if roi is not None:
+                region = roi_slices(roi, self.workspace.effective_scale())
+                previous, current = self.workspace.crop(prev_gray, gray, region)
+
+            if static_filter is not None:
+                calibrating = self.adaptive_threshold is not None and not self.adaptive_threshold.calibrated
+                if calibrating or estimator.stateful:
+                    static_filter.forget_reference()
+                elif static_filter.is_static(previous, current):
+                    # Nothing moved: the flow field to start from is zero again
+                    estimator.reset()
+                    self.frame_static = True
+                    self.overlay_magnitude = None
+                    movement_detected, movement_value = self.filter_movement(0.0)
+                    return gray, movement_detected, movement_value
 
-            # Visualization
-            hsv = np.zeros((frame.shape[0], frame.shape[1], 3), dtype=np.float32)
-            hsv[..., 1] = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)[..., 1]
-            hsv[..., 0] = 0.5 * 180
-            hsv[..., 2] = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX)
-            color = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
+            movement_detected, movement_value = self.filter_movement(estimator.measure(previous, current))
+            self.update_threshold(movement_value)
+
+            # Break the motion map down per zone, e.g. to tell a hand from the head
+            if estimator.motion_map is not None:
+                self.frame_zones = self.zone_grid.reduce(estimator.motion_map, estimator.motion_map_scale)
+
+            # Keep a copy of the motion map for the viewfinder, which renders the overlay at display rate
+            if self.flow_overlay and estimator.motion_map is not None:
+                if roi is None:
+                    self.overlay_magnitude = estimator.motion_map.copy()
+                else:
+                    self.overlay_magnitude = np.zeros(gray.shape, dtype=np.float32)
+                    self.overlay_magnitude[region] = estimator.motion_map
 
         prev_gray = gray
         return prev_gray, movement_detected, movement_value
@@ -227,32 +1070,58 @@ class SoundLoader(QThread):
 
 
 class MicrophoneRecorder:
-    """A class to record audio from the microphone."""
+    """A class to play the microphone back to the participant with low latency.
+
+    A single duplex PyAudio stream runs in callback mode: PortAudio calls back from its own audio
+    thread with each input buffer, which is handed straight back as the output buffer, so no
+    Python thread blocks on reads and writes, and the talk-back latency is about one buffer each
+    way. The buffer size is tuned per station with measure_latency.
+    """
+
+    def __init__(self, rate=SAMPLE_RATE, frames_per_buffer=FRAMES_PER_BUFFER, input_device=None, output_device=None):
+        """Initializes the MicrophoneRecorder class.
 
-    def __init__(self):
-        """Initializes the MicrophoneRecorder class."""
+        Args:
+            rate (int): The sample rate.
+            frames_per_buffer (int): The number of frames of each callback; smaller buffers lower the
+                latency but underrun sooner on a loaded PC.
+            input_device (int): The index of the input device, the default one when None.
+            output_device (int): The index of the output device, the default one when None.
+        """
         self.p = pyaudio.PyAudio()
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.input_device = input_device
+        self.output_device = output_device
         self.stream = None
-        self.outstream = None
+        self.status_count = 0
         self._setup_microphone()
         self.recording = False
 
     def _setup_microphone(self):
-        """Sets up the microphone for recording."""
+        """Opens the duplex stream, stopped until recording starts."""
         try:
             self.stream = self.p.open(format=pyaudio.paInt16,
                                       channels=1,
-                                      rate=44100,
+                                      rate=self.rate,
                                       input=True,
-                                      frames_per_buffer=1024)
-            self.outstream = self.p.open(format=pyaudio.paInt16,
-                                         channels=1,
-                                         rate=44100,
-                                         output=True,
-                                         frames_per_buffer=1024)
+                                      output=True,
+                                      frames_per_buffer=self.frames_per_buffer,
+                                      input_device_index=self.input_device,
+                                      output_device_index=self.output_device,
+                                      stream_callback=self._callback,
+                                      start=False)
         except IOError:
             self.stream = None
-            self.outstream = None
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        """Runs in the PortAudio thread: plays each microphone buffer straight back.
+
+        Input overflows and output underflows are counted in status_count.
+        """
+        if status:
+            self.status_count += 1
+        return in_data, pyaudio.paContinue
 
     def is_microphone_ready(self):
         """Checks if the microphone is ready for recording.
@@ -260,31 +1129,55 @@ class MicrophoneRecorder:
         Returns:
             bool: True if the microphone is ready, False otherwise.
         """
-        return self.stream is not None and self.outstream is not None
+        return self.stream is not None
 
     def start(self):
         """Starts the microphone recording."""
         if self.is_microphone_ready():
             self.recording = True
-            self.thread = threading.Thread(target=self._record)
-            self.thread.start()
+            self.stream.start_stream()
 
     def stop(self):
         """Stops the microphone recording."""
         self.recording = False
-        self.thread.join()
+        if self.is_microphone_ready():
+            self.stream.stop_stream()
+
+    def measure_latency(self, audio=None, frames_per_buffer=None):
+        """Measures the talk-back round trip latency by playing a click through a loopback.
+
+        The talk-back stream is stopped and closed meanwhile, since the devices are busy while it
+        is open, then opened again.
+
+        Args:
+            audio (pyaudio.PyAudio): The interface to measure through, e.g. a LoopbackStandIn, the
+                one of the recorder by default.
+            frames_per_buffer (int): The buffer size to measure, that of the recorder by default.
 
-    def _record(self):
-        """Records audio from the microphone."""
-        while self.recording:
-            data = self.stream.read(1024)
-            self.outstream.write(data)
+        Returns:
+            dict: The measured and reported latencies in ms, see Audio.measure_loopback_latency.
+        """
+        recording = self.recording
+        if self.is_microphone_ready():
+            self.stop()
+            self.stream.close()
+            self.stream = None
+        try:
+            result = measure_loopback_latency(audio if audio is not None else self.p, self.rate,
+                                              frames_per_buffer or self.frames_per_buffer,
+                                              input_device=self.input_device, output_device=self.output_device)
+        finally:
+            self._setup_microphone()
+            if recording:
+                self.start()
+        measured = "not heard" if result["latency_ms"] is None else f"{result['latency_ms']:.1f} ms"
+        print(f"Talk-back latency at {result['frames_per_buffer']} frames per buffer: {measured} "
+              f"(reported {result['reported_ms']:.1f} ms)")
+        return result
 
     def close(self):
         """Closes the microphone stream and terminates the PyAudio instance."""
         if self.is_microphone_ready():
             self.stream.stop_stream()
             self.stream.close()
-            self.outstream.stop_stream()
-            self.outstream.close()
         self.p.terminate()
@@ -0,0 +1,430 @@
+import time
+
+import cv2
+import numpy as np
+
+FRAME_WIDTH = 704
+FRAME_HEIGHT = 576
+
+
+def analysis_scale_for_level(level):
+    """Returns the analysis scale matching a Gaussian pyramid level.
+
+    Args:
+        level (int): The pyramid level, 0 being the full resolution frame.
+
+    Returns:
+        float: The scale factor applied to the frame before motion detection.
+    """
+    if level < 0:
+        raise ValueError("pyramid level must be positive")
+    return 0.5 ** level
+
+
+def check_analysis_scale(analysis_scale):
+    """Validates an analysis scale.
+
+    Args:
+        analysis_scale (float): The scale factor applied to the frame before motion detection.
+
+    Returns:
+        float: The validated scale.
+    """
+    analysis_scale = float(analysis_scale)
+    if not 0.0 < analysis_scale <= 1.0:
+        raise ValueError(f"analysis scale must be in (0, 1], got {analysis_scale}")
+    return analysis_scale
+
+
+def analysis_size(frame_shape, analysis_scale):
+    """Returns the size a frame is downsampled to before motion detection.
+
+    Args:
+        frame_shape (tuple): The shape of the captured frame.
+        analysis_scale (float): The scale factor applied to the frame.
+
+    Returns:
+        Tuple[int, int]: The width and height of the analysed image.
+    """
+    height, width = frame_shape[:2]
+    return max(int(width * analysis_scale + 0.5), 1), max(int(height * analysis_scale + 0.5), 1)
+
+
+class FlowWorkspace:
+    """Preallocated buffers reused by the optical flow hot loop.
+
+    Every step of preprocessing and flow writes into a buffer allocated on the first frame, so
+    the steady state does not allocate any image. Flow may run on a region of the preprocessed
+    images, e.g. around the head, in which case the flow buffers are allocated at the size of the
+    region whenever it changes. The preprocessed images are double buffered:
+    an image returned by preprocess() stays valid until the second next call, which is enough
+    for it to serve as the reference of the next frame.
+
+    Attributes:
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        warm_start (bool): Whether Farneback starts from the previous flow field
+            (OPTFLOW_USE_INITIAL_FLOW) instead of from zero.
+        levels (int): The number of Farneback pyramid levels.
+        winsize (int): The Farneback averaging window size.
+    """
+
+    def __init__(self, analysis_scale=1.0, warm_start=False, levels=3, winsize=15):
+        """Initializes the FlowWorkspace class.
+
+        Args:
+            analysis_scale (float): The scale frames are downsampled to before motion detection.
+            warm_start (bool): Whether each flow computation starts from the previous flow field.
+            levels (int): The number of Farneback pyramid levels.
+            winsize (int): The Farneback averaging window size.
+        """
+        self.analysis_scale = check_analysis_scale(analysis_scale)
+        self.warm_start = warm_start
+        self.levels = levels
+        self.winsize = winsize
+        self.frame_shape = None
+        self.size = None
+        self._gray = None
+        self._small = None
+        self._blurred = None
+        self._references = []
+        self._reference_index = 0
+        self._squared = None
+        self.flow = None
+        self.magnitude = None
+        self._crops = None
+        self._flow_valid = False
+
+    def _allocate(self, frame_shape, size):
+        """Allocates the buffers for a frame shape and an analysis size."""
+        width, height = size
+        self.frame_shape = frame_shape
+        self.size = size
+        self._gray = np.empty(frame_shape[:2], dtype=np.uint8)
+        self._small = np.empty((height, width), dtype=np.uint8)
+        self._blurred = np.empty((height, width), dtype=np.uint8)
+        self._references = [np.empty((height, width), dtype=np.uint8) for _ in range(2)]
+        self._flow_valid = False
+        self.fit_flow((height, width))
+
+    def crop(self, prev_gray, gray, region):
+        """Copies the same region of two preprocessed images into contiguous buffers.
+
+        A region narrower than the image is not contiguous in memory, which some engines, e.g.
+        DIS, refuse.
+
+        Args:
+            prev_gray (np.ndarray): The previous preprocessed image.
+            gray (np.ndarray): The current preprocessed image.
+            region (tuple): The (rows, cols) slices of the region, see ROI.roi_slices.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Workspace buffers holding the region of both images,
+                valid until the next call.
+        """
+        previous, current = prev_gray[region], gray[region]
+        if self._crops is None or self._crops[0].shape != current.shape:
+            self._crops = (np.empty(current.shape, dtype=np.uint8), np.empty(current.shape, dtype=np.uint8))
+        np.copyto(self._crops[0], previous)
+        np.copyto(self._crops[1], current)
+        return self._crops
+
+    def fit_flow(self, shape):
+        """Makes the flow buffers match the size of the images flow runs on.
+
+        Args:
+            shape (tuple): The shape of the images, the analysis size or that of a region of it.
+        """
+        if self.magnitude is not None and self.magnitude.shape == shape[:2]:
+            return
+        height, width = shape[:2]
+        self._squared = np.empty((height, width, 2), dtype=np.float32)
+        self.flow = np.zeros((height, width, 2), dtype=np.float32)
+        self.magnitude = np.empty((height, width), dtype=np.float32)
+        self._flow_valid = False
+
+    def preprocess(self, frame):
+        """Converts a BGR frame to the preprocessed grayscale image used for motion detection.
+
+        Args:
+            frame (np.ndarray): The BGR frame captured by the camera.
+
+        Returns:
+            np.ndarray: A workspace buffer holding the preprocessed image at the analysis resolution.
+        """
+        analysis_scale = self.analysis_scale
+        size = analysis_size(frame.shape, analysis_scale)
+        if frame.shape != self.frame_shape or size != self.size:
+            self._allocate(frame.shape, size)
+
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        gray = self._gray
+        if analysis_scale != 1.0:
+            cv2.resize(gray, size, dst=self._small, interpolation=cv2.INTER_AREA)
+            gray = self._small
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=self._blurred)
+
+        self._reference_index ^= 1
+        output = self._references[self._reference_index]
+        cv2.convertScaleAbs(self._blurred, dst=output, alpha=1, beta=-50)
+        return output
+
+    def flow_magnitude(self, prev_gray, gray):
+        """Computes the Farneback flow magnitude between two preprocessed images.
+
+        Only the magnitude is computed, in full resolution pixels.
+
+        Args:
+            prev_gray (np.ndarray): The previous preprocessed image, or a region of it.
+            gray (np.ndarray): The current preprocessed image, or the same region of it.
+
+        Returns:
+            np.ndarray: A workspace buffer holding the flow magnitude, valid until the next call.
+        """
+        self.fit_flow(gray.shape)
+        flags = cv2.OPTFLOW_USE_INITIAL_FLOW if self.warm_start and self._flow_valid else 0
+        cv2.calcOpticalFlowFarneback(prev_gray, gray, self.flow, 0.5, self.levels, self.winsize, 6, 5, 1.2, flags)
+        self._flow_valid = True
+        return self.magnitude_from_flow()
+
+    def initial_flow(self):
+        """Returns the flow buffer prepared as the starting estimate of the next flow computation.
+
+        The buffer keeps the previous flow field when warm starts are enabled and is zeroed otherwise.
+
+        Returns:
+            np.ndarray: The workspace flow buffer.
+        """
+        if not (self.warm_start and self._flow_valid):
+            self.flow.fill(0)
+        self._flow_valid = True
+        return self.flow
+
+    def magnitude_from_flow(self):
+        """Computes the magnitude of the flow buffer, in full resolution pixels.
+
+        Returns:
+            np.ndarray: A workspace buffer holding the flow magnitude.
+        """
+        np.multiply(self.flow, self.flow, out=self._squared)
+        np.add(self._squared[..., 0], self._squared[..., 1], out=self.magnitude)
+        np.sqrt(self.magnitude, out=self.magnitude)
+        scale = self.effective_scale()
+        if scale != 1.0:
+            np.divide(self.magnitude, scale, out=self.magnitude)
+        return self.magnitude
+
+    def effective_scale(self):
+        """Returns the ratio between the analysed image width and the captured frame width.
+
+        Returns:
+            float: The scale actually applied to the last frame, after rounding to whole pixels.
+        """
+        return self.size[0] / self.frame_shape[1]
+
+    def reset_flow(self):
+        """Forgets the previous flow field, so the next computation starts from zero."""
+        self._flow_valid = False
+
+
+class FramePacket:
+    """A captured frame travelling through the pipeline, with its preprocessed image cached.
+
+    Each frame is preprocessed once; the cached image is then reused as the reference of the
+    next frame. The packet is stamped with time.perf_counter() times along the pipeline.
+
+    Attributes:
+        captured_at (float): The time the frame was captured.
+        captured_ns (int): The time.monotonic_ns() time the frame was captured, which aligns the
+            frames of different cameras.
+        processing_started (float): The time motion detection started on the frame, or None.
+        processing_finished (float): The time motion detection finished, or None.
+        zones (np.ndarray): The zone means of the motion map of the frame, or None.
+    """
+
+    def __init__(self, image, captured_at=None):
+        """Initializes the FramePacket class.
+
+        Args:
+            image (np.ndarray): The BGR frame captured by the camera.
+            captured_at (float): The time the frame was captured, now by default.
+        """
+        self.image = image
+        self.gray = None
+        self.analysis_scale = None
+        self.captured_at = time.perf_counter() if captured_at is None else captured_at
+        self.captured_ns = time.monotonic_ns()
+        self.processing_started = None
+        self.processing_finished = None
+        self.zones = None
+
+    def preprocessed(self, workspace):
+        """Returns the preprocessed grayscale image, computing it on first use.
+
+        Args:
+            workspace (FlowWorkspace): The workspace preprocessing runs in.
+
+        Returns:
+            np.ndarray: The preprocessed grayscale image at the analysis resolution.
+        """
+        if self.gray is None or self.analysis_scale != workspace.analysis_scale:
+            self.analysis_scale = workspace.analysis_scale
+            self.gray = workspace.preprocess(self.image)
+        return self.gray
+
+
+class ZoneGrid:
+    """Breaks a motion map down into the mean motion of each zone of a grid.
+
+    The whole map is reduced in a single cv2.resize with INTER_AREA, which averages every zone
+    exactly, into a small buffer that is reused from frame to frame.
+
+    Attributes:
+        rows (int): The number of zone rows.
+        cols (int): The number of zone columns.
+        values (np.ndarray): The latest (rows, cols) zone means.
+    """
+
+    def __init__(self, rows=3, cols=3):
+        """Initializes the ZoneGrid class.
+
+        Args:
+            rows (int): The number of zone rows.
+            cols (int): The number of zone columns.
+        """
+        if rows < 1 or cols < 1:
+            raise ValueError("the zone grid needs at least one row and one column")
+        self.rows = rows
+        self.cols = cols
+        self.values = np.zeros((rows, cols), dtype=np.float32)
+        self._float_map = None
+
+    def reduce(self, motion_map, scale=1.0):
+        """Computes the mean motion of every zone.
+
+        Args:
+            motion_map (np.ndarray): The per-pixel motion map, at least as large as the grid.
+            scale (float): The factor converting map values to movement values.
+
+        Returns:
+            np.ndarray: The (rows, cols) zone means, overwritten by the next call.
+        """
+        if motion_map.dtype != np.float32:
+            if self._float_map is None or self._float_map.shape != motion_map.shape:
+                self._float_map = np.empty(motion_map.shape, dtype=np.float32)
+            np.copyto(self._float_map, motion_map, casting="unsafe")
+            motion_map = self._float_map
+        cv2.resize(motion_map, (self.cols, self.rows), dst=self.values, interpolation=cv2.INTER_AREA)
+        if scale != 1.0:
+            self.values *= scale
+        return self.values
+
+
+def render_flow_overlay(frame, magnitude, alpha=0.6):
+    """Blends a flow magnitude visualization over a frame.
+
+    The visualization keeps the hue fixed, takes the saturation from the frame and maps the
+    normalized magnitude to the value channel.
+
+    Args:
+        frame (np.ndarray): The BGR frame to draw on.
+        magnitude (np.ndarray): The flow magnitude, at any resolution.
+        alpha (float): The opacity of the visualization.
+
+    Returns:
+        np.ndarray: A new BGR frame with the overlay.
+    """
+    height, width = frame.shape[:2]
+    if magnitude.shape != (height, width):
+        magnitude = cv2.resize(magnitude, (width, height), interpolation=cv2.INTER_LINEAR)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    hsv[..., 0] = 90
+    hsv[..., 2] = cv2.normalize(magnitude, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+    color = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    return cv2.addWeighted(frame, 1 - alpha, color, alpha, 0)
+
+
+class StaticFrameFilter:
+    """Tells frames without any movement apart before paying for motion detection.
+
+    Both preprocessed images are reduced by `block` pixels in each direction with INTER_AREA, which
+    averages sensor noise away, while a moving body part still changes the blocks it covers. When
+    the largest block difference stays below the noise floor, the frame is static. Taking the
+    largest difference rather than the mean keeps a small movement, e.g. of a hand, from being
+    diluted in a still frame. The reduced image of each frame is kept as the reference of the next,
+    so forget_reference() must be called when a frame does not go through the filter.
+
+    Attributes:
+        noise_floor (float): The block difference, in gray levels, below which a frame is static.
+        block (int): The side of the blocks, in analysis pixels.
+        energy (float): The largest block difference of the latest frame.
+        skipped (int): The number of frames found static.
+        analysed (int): The number of frames found moving.
+    """
+
+    def __init__(self, noise_floor=4.0, block=8):
+        """Initializes the StaticFrameFilter class.
+
+        Args:
+            noise_floor (float): The block difference, in gray levels, below which a frame is static.
+            block (int): The side of the blocks, in analysis pixels.
+        """
+        self.noise_floor = noise_floor
+        self.block = block
+        self.energy = 0.0
+        self.skipped = 0
+        self.analysed = 0
+        self._size = None
+        self._reduced = None
+        self._difference = None
+        self._last = None
+
+    def is_static(self, prev_gray, gray):
+        """Compares two consecutive preprocessed images.
+
+        Args:
+            prev_gray (np.ndarray): The previous preprocessed image.
+            gray (np.ndarray): The current preprocessed image, of the same size.
+
+        Returns:
+            bool: Whether the frame is static, i.e. motion detection can be skipped.
+        """
+        height, width = gray.shape[:2]
+        size = (max(width // self.block, 1), max(height // self.block, 1))
+        if size != self._size:
+            self._size = size
+            self._reduced = [np.empty((size[1], size[0]), dtype=np.uint8) for _ in range(2)]
+            self._difference = np.empty((size[1], size[0]), dtype=np.uint8)
+            self._last = None
+
+        previous, current = self._reduced
+        if prev_gray is not self._last:
+            cv2.resize(prev_gray, size, dst=previous, interpolation=cv2.INTER_AREA)
+        cv2.resize(gray, size, dst=current, interpolation=cv2.INTER_AREA)
+        cv2.absdiff(previous, current, dst=self._difference)
+        self.energy = cv2.minMaxLoc(self._difference)[1]
+        # The reduced image of this frame is the reference of the next one
+        self._reduced.reverse()
+        self._last = gray
+
+        if self.energy < self.noise_floor:
+            self.skipped += 1
+            return True
+        self.analysed += 1
+        return False
+
+    def forget_reference(self):
+        """Forgets the reduced image of the last frame, which is no longer the previous frame."""
+        self._last = None
+
+    def stats(self):
+        """Returns the number of frames found static and moving.
+
+        Returns:
+            dict: The skipped and analysed frame counts.
+        """
+        return {"skipped": self.skipped, "analysed": self.analysed}
+
+    def reset_counts(self):
+        """Restarts the frame counts, e.g. at the start of a test."""
+        self.skipped = 0
+        self.analysed = 0
@@ -0,0 +1,293 @@
+import datetime
+import time
+
+import numpy as np
+
+# Flags of an event
+DETECTED = 1
+HAS_ZONES = 2
+
+
+def event_dtype(zone_shape=(3, 3)):
+    """Returns the structured dtype of a movement event.
+
+    Args:
+        zone_shape (tuple): The (rows, cols) of the zone grid stored with each event.
+
+    Returns:
+        np.dtype: The dtype, with the monotonic time in ns, the movement value, the flags and the zones.
+    """
+    return np.dtype([
+        ("time_ns", np.int64),
+        ("value", np.float32),
+        ("flags", np.uint8),
+        ("zones", np.float32, tuple(zone_shape)),
+    ])
+
+
+class MovementEventBuffer:
+    """A growable, array-backed buffer of movement events.
+
+    Events are written into a preallocated NumPy structured array, whose capacity doubles when it is
+    full, so appending costs a few field writes instead of building a dict and a datetime. Events
+    only become movement data documents, in the format saved by MovementData.save_test_data, when
+    the test is saved.
+    """
+
+    def __init__(self, capacity=1024, zone_shape=(3, 3)):
+        """Initializes the MovementEventBuffer class.
+
+        Args:
+            capacity (int): The number of events room is made for up front.
+            zone_shape (tuple): The (rows, cols) of the zone grid stored with each event. Events whose
+                zones have another shape are stored without zones.
+        """
+        self.zone_shape = tuple(zone_shape)
+        self._count = 0
+        self._allocate(np.zeros(max(capacity, 1), dtype=event_dtype(zone_shape)))
+        self._clock_reference()
+
+    def _allocate(self, events):
+        """Adopts a new event array and caches views of its fields, which are much cheaper to write
+        one element at a time than the records of the array."""
+        self._events = events
+        self._time_ns = events["time_ns"]
+        self._values = events["value"]
+        self._flags = events["flags"]
+        self._zones = events["zones"]
+
+    def _clock_reference(self):
+        """Pairs the monotonic clock with the wall clock, to date events when they are converted."""
+        self.start_ns = time.monotonic_ns()
+        self.start_time = datetime.datetime.utcnow()
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def events(self):
+        """The events appended so far, as a view of the structured array."""
+        return self._events[:self._count]
+
+    @property
+    def capacity(self):
+        """The number of events the buffer holds before it grows."""
+        return len(self._events)
+
+    def append(self, movement_value, zones=None, movement_detected=True, time_ns=None):
+        """Appends a movement event.
+
+        Args:
+            movement_value (float): The movement value of the frame.
+            zones (np.ndarray): The zone means of the frame, or None.
+            movement_detected (bool): Whether movement was detected in the frame.
+            time_ns (int): The time.monotonic_ns() time of the event, now by default.
+        """
+        index = self._count
+        if index == len(self._events):
+            grown = np.zeros(2 * index, dtype=self._events.dtype)
+            grown[:index] = self._events
+            self._allocate(grown)
+        self._time_ns[index] = time.monotonic_ns() if time_ns is None else time_ns
+        self._values[index] = movement_value
+        flags = DETECTED if movement_detected else 0
+        if zones is not None and zones.shape == self.zone_shape:
+            self._zones[index] = zones
+            flags |= HAS_ZONES
+        self._flags[index] = flags
+        self._count = index + 1
+
+    def clear(self):
+        """Forgets every event, keeping the allocated capacity."""
+        self._count = 0
+        self._clock_reference()
+
+    def timestamps(self):
+        """Returns the wall clock time of every event.
+
+        Returns:
+            list: The naive UTC datetime of every event.
+        """
+        offsets_us = (self.events["time_ns"] - self.start_ns) // 1000
+        return [self.start_time + datetime.timedelta(microseconds=int(offset)) for offset in offsets_us]
+
+    def to_documents(self):
+        """Converts the events to the movement dicts stored in the test data.
+
+        Returns:
+            list: One dict per event with the detection flag, the movement value, the timestamp and,
+                when available, the zones.
+        """
+        events = self.events
+        documents = []
+        for event, timestamp in zip(events, self.timestamps()):
+            flags = int(event["flags"])
+            document = {
+                "movement_detected": bool(flags & DETECTED),
+                "movement_value": float(event["value"]),
+                "timestamp": timestamp,
+            }
+            if flags & HAS_ZONES:
+                document["zones"] = event["zones"].tolist()
+            documents.append(document)
+        return documents
+
+
+class EpisodeSegmenter:
+    """Segments the per-frame movement signal of a test into movement episodes.
+
+    Every frame is kept in a MovementEventBuffer. An episode opens on a frame over the threshold and
+    is extended by every frame over `off_ratio` times the threshold, so the signal hovering around the
+    threshold is not split into many movements. It closes once no frame has been over that lower
+    level for `min_gap` seconds. Episodes are run-length encoded as the first and last frame over the
+    lower level, so following the signal costs a few comparisons per frame, and the duration, peak,
+    integral and zones of an episode are only computed from the frames when the test is saved.
+    """
+
+    def __init__(self, off_ratio=0.5, min_gap=0.5, capacity=1024, zone_shape=(3, 3)):
+        """Initializes the EpisodeSegmenter class.
+
+        Args:
+            off_ratio (float): The fraction of the threshold the movement value has to stay above for an
+                episode to go on.
+            min_gap (float): The number of seconds below that level that end an episode.
+            capacity (int): The number of frames room is made for up front.
+            zone_shape (tuple): The (rows, cols) of the zone grid stored with each frame.
+        """
+        self.off_ratio = off_ratio
+        self.min_gap_ns = int(min_gap * 1e9)
+        self.frames = MovementEventBuffer(capacity, zone_shape)
+        self.episodes = []
+        self._open = None
+
+    def __len__(self):
+        return self.episode_count
+
+    @property
+    def episode_count(self):
+        """The number of episodes so far, the open one included."""
+        return len(self.episodes) + (self._open is not None)
+
+    def append(self, movement_value, threshold, zones=None, time_ns=None):
+        """Follows the movement signal by one frame.
+
+        Args:
+            movement_value (float): The movement value of the frame.
+            threshold (float): The movement threshold of the frame, or None if there is none yet.
+            zones (np.ndarray): The zone means of the frame, or None.
+            time_ns (int): The time.monotonic_ns() time of the frame, now by default.
+
+        Returns:
+            bool: Whether an episode opened on this frame.
+        """
+        if time_ns is None:
+            time_ns = time.monotonic_ns()
+        movement_detected = threshold is not None and movement_value > threshold
+        index = len(self.frames)
+        self.frames.append(movement_value, zones, movement_detected, time_ns)
+
+        episode = self._open
+        if episode is not None:
+            if threshold is not None and movement_value > self.off_ratio * threshold:
+                episode[1] = index
+                episode[2] = time_ns
+                return False
+            if time_ns - episode[2] < self.min_gap_ns:
+                return False
+            self.episodes.append((episode[0], episode[1]))
+            self._open = None
+        if movement_detected:
+            # First frame, last frame and time of the last frame over the lower level
+            self._open = [index, index, time_ns]
+            return True
+        return False
+
+    def clear(self):
+        """Forgets every frame and episode."""
+        self.frames.clear()
+        self.episodes = []
+        self._open = None
+
+    def to_documents(self):
+        """Converts the episodes, the open one included, to the movement dicts stored in the test data.
+
+        Returns:
+            list: One dict per episode with its start and end timestamps, its duration in seconds, its
+                peak movement value, its integral, the movement value summed over time in value
+                seconds, its number of frames and, when available, the mean zones over its frames.
+        """
+        runs = list(self.episodes)
+        if self._open is not None:
+            runs.append((self._open[0], self._open[1]))
+        if not runs:
+            return []
+        events = self.frames.events
+        times = events["time_ns"]
+        values = events["value"].astype(np.float64)
+        # Each frame stands for the time since the previous one
+        intervals = np.diff(times, prepend=times[0]) / 1e9
+        timestamps = self.frames.timestamps()
+
+        documents = []
+        for first, last in runs:
+            episode = slice(first, last + 1)
+            document = {
+                "start": timestamps[first],
+                "end": timestamps[last],
+                "duration_s": (int(times[last]) - int(times[first])) / 1e9,
+                "peak": float(values[episode].max()),
+                "integral": float(np.dot(values[episode], intervals[episode])),
+                "frames": last - first + 1,
+            }
+            with_zones = (events["flags"][episode] & HAS_ZONES).astype(bool)
+            if with_zones.any():
+                document["zones"] = events["zones"][episode][with_zones].mean(axis=0).tolist()
+            documents.append(document)
+        return documents
+
+
+def merge_camera_episodes(documents_by_camera):
+    """Merges the movement episodes of several cameras into the episodes of one test.
+
+    Episodes of different cameras that overlap in time are one movement seen by several cameras.
+    They become one episode spanning all of them, with the highest peak and the integrals and frame
+    counts of its camera episodes summed, so it has the fields of a single camera episode, plus the
+    name of each camera and its own episode kept under "episodes". With a single camera, its
+    episodes are returned unchanged.
+
+    Args:
+        documents_by_camera (dict): The episodes returned by EpisodeSegmenter.to_documents, by
+            camera name.
+
+    Returns:
+        list: The merged episodes, in order of their start.
+    """
+    if len(documents_by_camera) == 1:
+        return list(next(iter(documents_by_camera.values())))
+    tagged = sorted(({**document, "camera": camera}
+                     for camera, documents in documents_by_camera.items() for document in documents),
+                    key=lambda document: document["start"])
+    merged = []
+    for document in tagged:
+        if merged and document["start"] <= merged[-1]["end"]:
+            episode = merged[-1]
+            episode["end"] = max(episode["end"], document["end"])
+            episode["peak"] = max(episode["peak"], document["peak"])
+            episode["integral"] += document["integral"]
+            episode["frames"] += document["frames"]
+            if document["camera"] not in episode["cameras"]:
+                episode["cameras"].append(document["camera"])
+            episode["episodes"].append(document)
+        else:
+            merged.append({
+                "start": document["start"],
+                "end": document["end"],
+                "peak": document["peak"],
+                "integral": document["integral"],
+                "frames": document["frames"],
+                "cameras": [document["camera"]],
+                "episodes": [document],
+            })
+    for episode in merged:
+        episode["duration_s"] = (episode["end"] - episode["start"]).total_seconds()
+    return merged
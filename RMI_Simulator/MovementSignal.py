@@ -0,0 +1,307 @@
+import bisect
+import math
+
+import numpy as np
+
+
+class AdaptiveThreshold:
+    """An online movement threshold at baseline + k * sigma.
+
+    During a calibration window the movement values of a participant lying still update a running
+    mean and variance with Welford's algorithm, which costs O(1) per frame and keeps no history.
+    Once the window is over, the threshold is frozen at the baseline mean plus `k` standard
+    deviations, so it adapts to the camera, the lighting and the engine without manual tuning.
+
+    Attributes:
+        k (float): The number of standard deviations above the baseline movement is detected at.
+        calibration_frames (int): The number of frames of the calibration window.
+        min_sigma (float): The standard deviation floor, so a perfectly still baseline does not
+            turn every bit of sensor noise into movement.
+        default (float): The threshold used while calibrating.
+        count (int): The number of movement values in the baseline.
+        mean (float): The baseline mean movement value.
+        calibrated (bool): Whether the calibration window is over.
+    """
+
+    def __init__(self, k=3.0, calibration_frames=90, min_sigma=0.05, default=None):
+        """Initializes the AdaptiveThreshold class.
+
+        Args:
+            k (float): The number of standard deviations above the baseline movement is detected at.
+            calibration_frames (int): The number of frames of the calibration window.
+            min_sigma (float): The standard deviation floor.
+            default (float): The threshold used while calibrating.
+        """
+        if calibration_frames < 2:
+            raise ValueError("the calibration window needs at least two frames")
+        self.k = k
+        self.calibration_frames = calibration_frames
+        self.min_sigma = min_sigma
+        self.default = default
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.calibrated = False
+
+    @property
+    def sigma(self):
+        """The standard deviation of the baseline movement values."""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    @property
+    def threshold(self):
+        """The movement threshold, the default one until the calibration window is over."""
+        if not self.calibrated:
+            return self.default
+        return self.mean + self.k * max(self.sigma, self.min_sigma)
+
+    def update(self, movement_value):
+        """Adds a movement value to the baseline while calibrating.
+
+        Args:
+            movement_value (float): The movement value of the latest frame.
+
+        Returns:
+            float: The current threshold.
+        """
+        if not self.calibrated:
+            self.count += 1
+            delta = movement_value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (movement_value - self.mean)
+            if self.count >= self.calibration_frames:
+                self.calibrated = True
+        return self.threshold
+
+    def restart(self):
+        """Forgets the baseline and opens a new calibration window."""
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.calibrated = False
+
+    def to_dict(self):
+        """Returns the baseline in the form it is stored in the database.
+
+        Returns:
+            dict: The baseline mean, standard deviation and number of frames.
+        """
+        return {"mean": self.mean, "sigma": self.sigma, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, baseline, k=3.0, min_sigma=0.05):
+        """Creates a calibrated threshold from a stored baseline.
+
+        Args:
+            baseline (dict): The baseline returned by to_dict.
+            k (float): The number of standard deviations above the baseline movement is detected at.
+            min_sigma (float): The standard deviation floor.
+
+        Returns:
+            AdaptiveThreshold: The calibrated threshold.
+        """
+        count = max(int(baseline["count"]), 2)
+        adaptive = cls(k, count, min_sigma)
+        adaptive.count = count
+        adaptive.mean = float(baseline["mean"])
+        adaptive._m2 = float(baseline["sigma"]) ** 2 * (count - 1)
+        adaptive.calibrated = True
+        return adaptive
+
+
+class Smoother:
+    """Base class of the streaming filters the movement value is smoothed with before detection.
+
+    Smoothing removes the frame to frame noise that makes detection flicker, at the price of
+    reacting later to a movement, a delay reported by `latency_frames`. Every filter takes one
+    movement value per frame and returns the smoothed value at a constant cost per frame. The base
+    class passes values through unchanged.
+
+    Attributes:
+        name (str): The name the filter is registered under.
+        label (str): A human readable name for the filter.
+    """
+
+    name = "none"
+    label = "No smoothing"
+
+    @property
+    def latency_frames(self):
+        """The delay the filter adds to a slowly varying signal, in frames."""
+        return 0.0
+
+    def latency_ms(self, fps):
+        """Returns the delay the filter adds, in ms at a frame rate.
+
+        Args:
+            fps (float): The frame rate of the movement values.
+
+        Returns:
+            float: The delay in ms.
+        """
+        return 1000.0 * self.latency_frames / fps
+
+    def update(self, movement_value):
+        """Smooths the movement value of the latest frame.
+
+        Args:
+            movement_value (float): The raw movement value.
+
+        Returns:
+            float: The smoothed movement value.
+        """
+        return movement_value
+
+    def reset(self):
+        """Forgets the previous movement values."""
+
+
+class EMASmoother(Smoother):
+    """An exponential moving average, the cheapest filter, with a lag of (1 - alpha) / alpha frames."""
+
+    name = "ema"
+    label = "Exponential average"
+
+    def __init__(self, alpha=0.3):
+        """Initializes the EMASmoother class.
+
+        Args:
+            alpha (float): The weight of the latest movement value, in (0, 1].
+        """
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.value = None
+
+    @property
+    def latency_frames(self):
+        return (1.0 - self.alpha) / self.alpha
+
+    def update(self, movement_value):
+        if self.value is None:
+            self.value = movement_value
+        else:
+            self.value += self.alpha * (movement_value - self.value)
+        return self.value
+
+    def reset(self):
+        self.value = None
+
+
+class MedianSmoother(Smoother):
+    """A running median over a ring buffer of the latest values.
+
+    The median ignores single-frame spikes entirely and keeps the edges of real movements sharp,
+    but delays them by half the window. The window is kept sorted alongside the ring buffer, so
+    each frame costs one removal and one insertion into a short list.
+    """
+
+    name = "median"
+    label = "Running median"
+
+    def __init__(self, window=5):
+        """Initializes the MedianSmoother class.
+
+        Args:
+            window (int): The number of latest movement values the median is taken over.
+        """
+        if window < 1:
+            raise ValueError("the window needs at least one frame")
+        self.window = window
+        self.reset()
+
+    @property
+    def latency_frames(self):
+        return (self.window - 1) / 2.0
+
+    def update(self, movement_value):
+        if len(self._sorted) == self.window:
+            oldest = self._ring[self._next]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            self._ring[self._next] = movement_value
+        else:
+            self._ring.append(movement_value)
+        self._next = (self._next + 1) % self.window
+        bisect.insort(self._sorted, movement_value)
+        # The lower median while the window fills, so a spike in the first frames is rejected too
+        return self._sorted[(len(self._sorted) - 1) // 2]
+
+    def reset(self):
+        self._ring = []
+        self._sorted = []
+        self._next = 0
+
+
+class SavitzkyGolaySmoother(Smoother):
+    """A causal Savitzky-Golay filter.
+
+    A polynomial is least-squares fitted to the latest values and evaluated at the latest frame,
+    which follows a movement ramp with no lag, at the price of less noise reduction and some
+    overshoot. The fit reduces to fixed weights computed once, so each frame costs one dot product
+    over the window. Until the window is full, values are passed through unchanged.
+    """
+
+    name = "savgol"
+    label = "Savitzky-Golay"
+
+    def __init__(self, window=7, order=2):
+        """Initializes the SavitzkyGolaySmoother class.
+
+        Args:
+            window (int): The number of latest movement values the polynomial is fitted to.
+            order (int): The order of the polynomial, below the window.
+        """
+        if not 0 <= order < window:
+            raise ValueError("the order of the polynomial must be below the window")
+        self.window = window
+        self.order = order
+        # Rows of the pseudo-inverse give the polynomial coefficients, at x = 0 for the latest frame
+        offsets = np.arange(1 - window, 1, dtype=np.float64)
+        self.weights = np.linalg.pinv(np.vander(offsets, order + 1, increasing=True))[0]
+        self._ring = np.zeros(2 * window)
+        self.reset()
+
+    @property
+    def latency_frames(self):
+        # The group delay at low frequencies, zero for any order of at least one
+        offsets = np.arange(self.window - 1, -1, -1, dtype=np.float64)
+        return max(round(float(np.dot(self.weights, offsets) / self.weights.sum()), 6), 0.0)
+
+    def update(self, movement_value):
+        # The ring is written twice, so the window is always one contiguous slice
+        index = self._next
+        self._ring[index] = self._ring[index + self.window] = movement_value
+        self._next = (index + 1) % self.window
+        self._count += 1
+        if self._count < self.window:
+            return movement_value
+        return float(np.dot(self.weights, self._ring[index + 1:index + 1 + self.window]))
+
+    def reset(self):
+        self._next = 0
+        self._count = 0
+
+
+SMOOTHERS = {
+    smoother.name: smoother
+    for smoother in (Smoother, EMASmoother, MedianSmoother, SavitzkyGolaySmoother)
+}
+
+
+def create_smoother(name, **kwargs):
+    """Creates a movement value filter by name.
+
+    Args:
+        name (str): The name of the filter, one of SMOOTHERS.
+        **kwargs: Filter specific settings.
+
+    Returns:
+        Smoother: The new filter.
+    """
+    try:
+        smoother_class = SMOOTHERS[name]
+    except KeyError:
+        raise ValueError(f"unknown smoother {name!r}, expected one of {sorted(SMOOTHERS)}") from None
+    return smoother_class(**kwargs)
@@ -1,4 +1,5 @@
 import datetime
+import os
 
 import pygame
 from PyQt5.QtCore import *
@@ -11,12 +12,30 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 from RMI_Simulator import database
+from RMI_Simulator.Estimators import ESTIMATORS
+from RMI_Simulator.FrameSources import WebcamSource
 from RMI_Simulator.GUI import TitleBar
 from RMI_Simulator.Menu import FramelessWindow
 from RMI_Simulator.Menu import MenuWindow
+from RMI_Simulator.MovementEvents import merge_camera_episodes
+from RMI_Simulator.MovementSignal import SMOOTHERS
+from RMI_Simulator.ROI import ROI_PRESETS
+from RMI_Simulator.Recorder import session_video_path
+from RMI_Simulator.Scheduling import set_opencv_threads
 from RMI_Simulator.database import MongoDB
 
 db = MongoDB('MRI_PROJECT', ['USERS', 'PARTICIPANTS', 'movement_data'])
+# The cameras of the rig by name, with their device index, e.g. {"head": 0, "body": 1}. The first one
+# is shown in the main viewfinder and drives the movement labels.
+CAMERAS = {"head": 0}
+# The rate each camera's frames should be analysed at, which the quality of motion detection is adapted to
+TARGET_ANALYSIS_FPS = 30
+# The block difference, in gray levels, below which a frame is still and skips motion detection
+STATIC_NOISE_FLOOR = 4.0
+# The number of head detections per second while the head is examined
+HEAD_TRACKING_RATE = 2.0
+# The talk-back buffer size of this station, the lowest that measures clean with python -m RMI_Simulator.Audio
+TALK_BACK_FRAMES_PER_BUFFER = 256
 from PyQt5.QtWidgets import QVBoxLayout, QWidget
 
 
@@ -882,9 +901,11 @@ class MainWindow(FramelessWindow):
     Attributes:
         client: The MongoClient object for database operations.
         db: The MovementData object for interacting with the 'movement_data' collection in the database.
-        current_test_data: A list to store the current test data.
+        cameras: The device index of each camera of the rig, by camera name.
+        optical_flow_apps: The capture and processing pipeline of each camera, the first one also
+            available as optical_flow_app.
         collect_movement_data: A boolean flag indicating whether to collect movement data.
-        movement_count: The count of detected movements.
+        movement_count: The count of movement episodes in the current test.
         sound_loader: The SoundLoader object for loading and playing sounds.
         sound_channel: The Pygame sound channel for controlling sound playback.
         participant_details_window: The instance of the participantDetailsWindow.
@@ -895,29 +916,39 @@ class MainWindow(FramelessWindow):
         on_sound_loaded: Callback method when the sound is loaded.
         init_ui: Initializes the user interface of the main window.
         create_controls: Creates the buttons and other controls.
+        create_viewfinder: Creates a label camera frames are shown in.
         position_controls: Positions the controls in the layout.
         connect_signals: Connects the signals to their respective slot methods.
         show_participant_details: Displays the participant details window.
         handle_participant_id: Handles the received participant ID.
-        start_test: Starts collecting movement data.
-        stop_test: Stops collecting movement data and saves the test data to the database.
+        start_test: Starts collecting movement data and recording the session video, and calibrates the threshold.
+        stop_test: Stops collecting movement data and recording, and saves the test data and baseline to the database.
         show_test_history: Displays the test history window.
         show_microphone_error_message: Shows an error message related to the microphone.
         display_results: Displays the test results.
         toggle_sound: Toggles the sound playback.
         adjust_volume: Adjusts the sound volume.
         toggle_microphone: Toggles the microphone recording.
+        toggle_flow_overlay: Toggles the optical flow overlay on the viewfinder.
+        toggle_latency_overlay: Toggles the latency debug overlay on the viewfinder.
+        update_estimator: Switches the motion detection engine.
         get_current_date: Get the current date.
         get_current_time: Get the current time.
         update_time: Update the time label.
         closeEvent: Overrides the close event of the main window.
     """
 
-    def __init__(self, participant):
-        """Initializes the MainWindow class."""
+    def __init__(self, participant, cameras=None):
+        """Initializes the MainWindow class.
+
+        Args:
+            participant (dict): The participant details.
+            cameras (dict): The device index of each camera by camera name, CAMERAS by default.
+        """
 
         super().__init__(title="Examination of the MRI Simulator")  # Modifier le titre de la fenêtre
         from MRI_Test import SoundLoader, MicrophoneRecorder
+        self.cameras = dict(cameras if cameras is not None else CAMERAS)
         self.body_part_label = None
         self.body_part_combobox = None
         self.init_ui()
@@ -925,7 +956,6 @@ class MainWindow(FramelessWindow):
         db = self.client['MRI_PROJECT']
         movement_data_collection = db['movement_data']
         self.db = database.MovementData(movement_data_collection, db)
-        self.current_test_data = []
         self.collect_movement_data = False
         self.movement_count = 0
         pygame.mixer.init()
@@ -937,7 +967,7 @@ class MainWindow(FramelessWindow):
         self.participant_details_window = None
         self.participant = participant
         self.threshold = None
-        self.microphone = MicrophoneRecorder()
+        self.microphone = MicrophoneRecorder(frames_per_buffer=TALK_BACK_FRAMES_PER_BUFFER)
         self.bodyPart = None
 
     def init_ui(self):
@@ -950,16 +980,24 @@ class MainWindow(FramelessWindow):
         self.setWindowFlags(Qt.FramelessWindowHint)
         main_layout = self.layout
         main_layout.setContentsMargins(10, 0, 10, 10)
-        self.viewfinder = QLabel(self)
-        self.viewfinder.setFrameShape(QFrame.StyledPanel)
-        self.viewfinder.setFrameShadow(QFrame.Raised)
-        self.viewfinder.setScaledContents(True)
-        self.viewfinder.setAlignment(Qt.AlignCenter)
-        self.viewfinder.lower()
+        self.viewfinder = self.create_viewfinder()
         main_layout.addWidget(self.viewfinder)
-
-        self.optical_flow_app = OpticalFlowApp(self, self)
-        main_layout.addWidget(self.optical_flow_app)
+        self.camera_viewfinders = [self.create_viewfinder() for _ in range(len(self.cameras) - 1)]
+
+        # One independent pipeline per camera; the camera name is only kept apart with several cameras
+        self.optical_flow_apps = []
+        for viewfinder, (name, index) in zip([self.viewfinder] + self.camera_viewfinders, self.cameras.items()):
+            optical_flow_app = OpticalFlowApp(self, self, source=WebcamSource(index),
+                                              camera=name if len(self.cameras) > 1 else None,
+                                              viewfinder=viewfinder, show_status=viewfinder is self.viewfinder)
+            optical_flow_app.set_governor(TARGET_ANALYSIS_FPS)
+            optical_flow_app.set_static_filter(STATIC_NOISE_FLOOR)
+            main_layout.addWidget(optical_flow_app)
+            self.optical_flow_apps.append(optical_flow_app)
+        self.optical_flow_app = self.optical_flow_apps[0]
+        if len(self.optical_flow_apps) > 1:
+            # The pipelines already run in parallel, each OpenCV call gets its share of the cores
+            set_opencv_threads(max(1, (os.cpu_count() or 1) // len(self.optical_flow_apps)))
 
         # Create other widgets and components
         self.create_controls()
@@ -973,6 +1011,8 @@ class MainWindow(FramelessWindow):
         # Position controls as required
         self.position_controls(controls_layout)
         self.connect_signals()
+        # The preselected body part is applied like a selection, its region and head tracking included
+        self.update_body_part(self.body_part_combobox.currentIndex())
         self.date_label = QLabel(self)
         self.date_label.setText(self.get_current_date())
         self.time_label = QLabel(self)
@@ -1045,6 +1085,10 @@ class MainWindow(FramelessWindow):
         self.volume_label_value = QLabel("50")
         self.toggle_microphone_checkbox = QCheckBox()
         self.toggle_microphone_label = QLabel("MICROPHONE 🎙️")
+        self.flow_overlay_checkbox = QCheckBox()
+        self.flow_overlay_label = QLabel("FLOW OVERLAY")
+        self.latency_overlay_checkbox = QCheckBox()
+        self.latency_overlay_label = QLabel("LATENCY")
         self.sensitivity_menu = QComboBox()
         self.sensitivity_label = QLabel("Movement Sensitivity:")
         self.movement_detected_result_label = QLabel()
@@ -1067,10 +1111,20 @@ class MainWindow(FramelessWindow):
         self.volume_slider.setTickPosition(QSlider.TicksBelow)
         self.threshold_label = QLabel("ALLOWABLE DEVIATION")
         self.threshold_slider = QSlider(Qt.Horizontal)
-        self.threshold_slider.setMinimum(0)
-        self.threshold_slider.setMaximum(3)
+        # The allowable deviation is the number of standard deviations above the still baseline
+        self.threshold_slider.setMinimum(1)
+        self.threshold_slider.setMaximum(6)
+        self.threshold_slider.setValue(3)
         self.threshold_slider.setTickInterval(1)
         self.threshold_slider.setTickPosition(QSlider.TicksBelow)
+        self.engine_label = QLabel("MOTION ENGINE")
+        self.engine_combobox = QComboBox()
+        for name, estimator in ESTIMATORS.items():
+            self.engine_combobox.addItem(estimator.label, name)
+        self.smoothing_label = QLabel("SMOOTHING")
+        self.smoothing_combobox = QComboBox()
+        for name, smoother in SMOOTHERS.items():
+            self.smoothing_combobox.addItem(smoother.label, name)
         self.body_part_label = QLabel("SELECT EXAMINATED BODY PART:")  # New label for body part selection
         self.body_part_combobox = QComboBox()  # New combo box for body part selection
         self.body_part_combobox.addItems(["Head", "Hand", "Foot", "Stomach", "Legs", "Arms"])  # Add options
@@ -1107,8 +1161,37 @@ class MainWindow(FramelessWindow):
         )
 
     def update_body_part(self, index):
-        """Updates the selected body part based on the combobox index."""
+        """Updates the selected body part based on the combobox index.
+
+        Motion detection only runs on the preset region of the body part, which can be redrawn in the
+        viewfinder. While the head is examined, it follows the head wherever it is found.
+        """
         self.bodyPart = self.body_part_combobox.currentText()
+        rate = HEAD_TRACKING_RATE if self.bodyPart == "Head" else None
+        for optical_flow_app in self.optical_flow_apps:
+            optical_flow_app.set_roi_region(ROI_PRESETS.get(self.bodyPart))
+            optical_flow_app.set_head_tracking(rate)
+
+    def update_estimator(self, index):
+        """Switches the motion detection engine based on the combobox index."""
+        for optical_flow_app in self.optical_flow_apps:
+            optical_flow_app.set_estimator(self.engine_combobox.itemData(index))
+
+    def update_smoother(self, index):
+        """Switches the movement value filter based on the combobox index, showing the latency it adds."""
+        latency_ms = max(optical_flow_app.set_smoother(self.smoothing_combobox.itemData(index))
+                         for optical_flow_app in self.optical_flow_apps)
+        self.smoothing_label.setText(f"SMOOTHING (+{latency_ms:.0f} ms)" if latency_ms else "SMOOTHING")
+
+    def create_viewfinder(self):
+        """Creates a QLabel camera frames are shown in."""
+        viewfinder = QLabel(self)
+        viewfinder.setFrameShape(QFrame.StyledPanel)
+        viewfinder.setFrameShadow(QFrame.Raised)
+        viewfinder.setScaledContents(True)
+        viewfinder.setAlignment(Qt.AlignCenter)
+        viewfinder.lower()
+        return viewfinder
 
     def create_button(self, text):
         """Creates a QPushButton with the specified text."""
@@ -1139,15 +1222,27 @@ class MainWindow(FramelessWindow):
         microphone_layout.addWidget(self.toggle_microphone_label)
         microphone_layout.addWidget(self.toggle_microphone_checkbox)
 
+        # Flow Overlay Label and Checkbox Layout
+        overlay_layout = QVBoxLayout()
+        overlay_layout.addWidget(self.flow_overlay_label)
+        overlay_layout.addWidget(self.flow_overlay_checkbox)
+        overlay_layout.addWidget(self.latency_overlay_label)
+        overlay_layout.addWidget(self.latency_overlay_checkbox)
+
         # Threshold Label and Slider Layout
         threshold_layout = QVBoxLayout()
         threshold_layout.addWidget(self.threshold_label)
         threshold_layout.addWidget(self.threshold_slider)
+        threshold_layout.addWidget(self.engine_label)
+        threshold_layout.addWidget(self.engine_combobox)
+        threshold_layout.addWidget(self.smoothing_label)
+        threshold_layout.addWidget(self.smoothing_combobox)
 
         # Add each group (label-slider) to sound layout
         sound_layout.addWidget(self.volume_label_text)
         sound_layout.addLayout(sound_slider_layout)
         sound_layout.addLayout(microphone_layout)
+        sound_layout.addLayout(overlay_layout)
         sound_layout.addLayout(threshold_layout)  # Add threshold layout
 
         # Buttons Layout
@@ -1160,6 +1255,8 @@ class MainWindow(FramelessWindow):
         # Create a layout for the video widget on the right side
         video_layout = QVBoxLayout()
         video_layout.addWidget(self.viewfinder)  # Add viewfinder to the video layout
+        for viewfinder in self.camera_viewfinders:
+            video_layout.addWidget(viewfinder)
         video_layout.addStretch()  # Add stretch to align viewfinder to the top
 
         # Movement Layout
@@ -1190,20 +1287,45 @@ class MainWindow(FramelessWindow):
         self.stop_test_button.clicked.connect(self.stop_test)
         self.volume_slider.valueChanged.connect(self.adjust_volume)
         self.toggle_microphone_checkbox.stateChanged.connect(self.toggle_microphone)
+        self.flow_overlay_checkbox.stateChanged.connect(self.toggle_flow_overlay)
+        self.latency_overlay_checkbox.stateChanged.connect(self.toggle_latency_overlay)
         self.body_part_combobox.currentIndexChanged.connect(self.update_body_part)
+        self.engine_combobox.currentIndexChanged.connect(self.update_estimator)
+        self.smoothing_combobox.currentIndexChanged.connect(self.update_smoother)
 
     def start_test(self):
-        """Starts collecting movement data."""
+        """Starts collecting movement data and recording the session video.
+
+        The detection threshold is set at the allowable deviation, in standard deviations, above the
+        participant's still baseline, which is calibrated over the first frames if none is stored.
+        """
         if self.participant:
-            self.collect_movement_data = True
             self.movement_count = 0
-            self.threshold = self.threshold_slider.value()  # Update threshold value
+            started = datetime.datetime.now()
+            for optical_flow_app in self.optical_flow_apps:
+                optical_flow_app.test_data.clear()
+                if optical_flow_app.governor is not None:
+                    optical_flow_app.governor.restart_log()
+                if optical_flow_app.static_filter is not None:
+                    optical_flow_app.static_filter.reset_counts()
+                optical_flow_app.restart_roi_log()
+                baseline = self.db.get_movement_baseline(self.participant['id'], optical_flow_app.baseline_key)
+                optical_flow_app.start_calibration(self.threshold_slider.value(), baseline)
+                try:
+                    optical_flow_app.start_recording(
+                        session_video_path(self.participant['id'], when=started, camera=optical_flow_app.camera))
+                except (RuntimeError, ValueError) as e:
+                    print(f"Session video not recorded: {e}")
+            self.collect_movement_data = True
             print("Started collecting movement data")
         else:
             QMessageBox.critical(self, "Error", "No participant ID selected.")
 
     def stop_test(self):
-        """Stops collecting movement data and saves the test data to the database."""
+        """Stops collecting movement data and recording, and saves the test data and baselines to the database.
+
+        The movement episodes of every camera are merged into one test record.
+        """
         self.collect_movement_data = False
         print("Stopped collecting movement data")
 
@@ -1211,7 +1333,32 @@ class MainWindow(FramelessWindow):
         #    for data in self.current_test_data:
         #        data["participant"] = self.participant
 
-        self.db.save_test_data(self.current_test_data, self.participant, self.bodyPart)
+        video_paths = {}
+        episodes = {}
+        quality_adjustments = []
+        regions = {}
+        for optical_flow_app in self.optical_flow_apps:
+            regions[optical_flow_app.camera] = optical_flow_app.roi_settings()
+            video_paths[optical_flow_app.camera] = optical_flow_app.stop_recording()
+            episodes[optical_flow_app.camera] = optical_flow_app.test_data.to_documents()
+            if optical_flow_app.governor is not None:
+                quality_adjustments.extend(optical_flow_app.governor.adjustments)
+            if optical_flow_app.static_filter is not None:
+                counts = optical_flow_app.static_filter.stats()
+                print(f"Static frames skipped: {counts['skipped']} of {counts['skipped'] + counts['analysed']}")
+            adaptive_threshold = optical_flow_app.adaptive_threshold
+            if self.participant and adaptive_threshold is not None and adaptive_threshold.calibrated:
+                self.db.save_movement_baseline(self.participant['id'], optical_flow_app.baseline_key,
+                                               adaptive_threshold.to_dict())
+        if len(video_paths) == 1:
+            video_path = video_paths[None]
+            roi = regions[None]
+        else:
+            video_path = {camera: path for camera, path in video_paths.items() if path is not None} or None
+            roi = regions
+        quality_adjustments.sort(key=lambda adjustment: adjustment["timestamp"])
+        self.db.save_test_data(merge_camera_episodes(episodes), self.participant, self.bodyPart, video_path,
+                               quality_adjustments or None, roi)
 
     def show_microphone_error_message(self, message):
         """Shows an error message related to the microphone."""
@@ -1252,6 +1399,16 @@ class MainWindow(FramelessWindow):
         else:
             self.show_error_message("No Microphone detected, please connect one and click again.")
 
+    def toggle_flow_overlay(self, state):
+        """Toggles the optical flow overlay on the viewfinders."""
+        for optical_flow_app in self.optical_flow_apps:
+            optical_flow_app.set_flow_overlay(bool(state))
+
+    def toggle_latency_overlay(self, state):
+        """Toggles the latency debug overlay on the viewfinders."""
+        for optical_flow_app in self.optical_flow_apps:
+            optical_flow_app.set_latency_overlay(bool(state))
+
     def get_current_date(self):
         today = datetime.date.today()
         return today.strftime("%B %d, %Y")  # Format the date (e.g., March 30, 2024)
@@ -1269,5 +1426,6 @@ class MainWindow(FramelessWindow):
             self.microphone.stop()
             self.microphone.close()
         self.client.close()
-        self.optical_flow_app.close()
+        for optical_flow_app in self.optical_flow_apps:
+            optical_flow_app.close()
         event.accept()
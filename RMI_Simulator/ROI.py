@@ -0,0 +1,294 @@
+import os
+import threading
+
+import cv2
+
+# Tried in order until one finds a head; participants lying in the bore may face the camera or not
+HEAD_CASCADES = ("haarcascade_frontalface_default.xml", "haarcascade_profileface.xml")
+
+# The region analysed for each examined body part, as (left, top, width, height) fractions of the
+# frame. They are starting points for a camera looking along the participant from the head end of
+# the bore, and can be redrawn in the viewfinder.
+ROI_PRESETS = {
+    "Head": (0.25, 0.0, 0.5, 0.5),
+    "Hand": (0.0, 0.45, 1.0, 0.55),
+    "Foot": (0.2, 0.7, 0.6, 0.3),
+    "Stomach": (0.2, 0.35, 0.6, 0.4),
+    "Legs": (0.15, 0.5, 0.7, 0.5),
+    "Arms": (0.0, 0.25, 1.0, 0.55),
+}
+
+
+def load_cascade(name):
+    """Loads one of the Haar cascades bundled with OpenCV.
+
+    Args:
+        name (str): The file name of the cascade, e.g. "haarcascade_frontalface_default.xml".
+
+    Returns:
+        cv2.CascadeClassifier: The loaded classifier.
+    """
+    classifier = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, name))
+    if classifier.empty():
+        raise ValueError(f"cannot load the Haar cascade {name!r}")
+    return classifier
+
+
+def fraction_roi(region, frame_shape):
+    """Converts a region given in fractions of the frame to a region of interest in frame pixels.
+
+    Args:
+        region (tuple): The (left, top, width, height) of the region, as fractions of the frame.
+        frame_shape (tuple): The shape of the frame.
+
+    Returns:
+        tuple: The (x, y, width, height) of the region in frame pixels, at least one pixel wide.
+    """
+    frame_height, frame_width = frame_shape[:2]
+    left, top, width, height = region
+    x = min(int(left * frame_width + 0.5), frame_width - 1)
+    y = min(int(top * frame_height + 0.5), frame_height - 1)
+    return (x, y, max(min(int(width * frame_width + 0.5), frame_width - x), 1),
+            max(min(int(height * frame_height + 0.5), frame_height - y), 1))
+
+
+def roi_slices(roi, scale=1.0):
+    """Returns the slices cropping a region of interest out of an image.
+
+    Args:
+        roi (tuple): The (x, y, width, height) of the region, in captured frame pixels.
+        scale (float): The scale of the image relative to the captured frame, e.g. the effective
+            analysis scale.
+
+    Returns:
+        Tuple[slice, slice]: The row and column slices.
+    """
+    x, y, width, height = roi
+    return (slice(int(y * scale), int((y + height) * scale + 0.5)),
+            slice(int(x * scale), int((x + width) * scale + 0.5)))
+
+
+class HeadDetector:
+    """Finds the head of the participant in a frame with OpenCV's Haar cascades.
+
+    Detection runs on a downsampled, equalized grayscale copy of the frame, which is enough for a
+    head filling a good part of it.
+    """
+
+    def __init__(self, cascades=HEAD_CASCADES, detection_width=320, min_size=0.1):
+        """Initializes the HeadDetector class.
+
+        Args:
+            cascades (tuple): The file names of the cascades, tried in order.
+            detection_width (int): The width frames are downsampled to before detection.
+            min_size (float): The smallest head searched for, as a fraction of the frame width.
+        """
+        self.classifiers = [load_cascade(name) for name in cascades]
+        self.detection_width = detection_width
+        self.min_size = min_size
+
+    def detect(self, frame):
+        """Detects the largest head in a frame.
+
+        Args:
+            frame (np.ndarray): The BGR frame captured by the camera.
+
+        Returns:
+            tuple: The (x, y, width, height) of the head in frame pixels, or None if none is found.
+        """
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.detection_width / width)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if scale != 1.0:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        gray = cv2.equalizeHist(gray)
+        min_side = max(int(self.min_size * gray.shape[1]), 20)
+        for classifier in self.classifiers:
+            heads = classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(min_side, min_side))
+            if len(heads):
+                x, y, w, h = max(heads, key=lambda head: head[2] * head[3])
+                return int(x / scale), int(y / scale), int(w / scale), int(h / scale)
+        return None
+
+
+class RegionSmoother:
+    """Turns noisy head detections into a steady region of interest.
+
+    Each detection is padded, so the head still lies in the region while it moves, and smoothed
+    with an exponential moving average. The region only follows once it is `tolerance` away from
+    the smoothed box and its edges are aligned on a grid, so the crop, and with it the flow buffers
+    and the state of the engines, rarely changes. When the head is lost, the region is held for
+    `hold` detections, e.g. while motion blur defeats the detector, before falling back to the
+    whole frame.
+
+    Attributes:
+        roi (tuple): The (x, y, width, height) of the region in frame pixels, or None for the whole
+            frame.
+    """
+
+    def __init__(self, padding=0.5, alpha=0.5, tolerance=0.15, hold=6, align=16):
+        """Initializes the RegionSmoother class.
+
+        Args:
+            padding (float): The margin added on each side of a detection, as a fraction of its size.
+            alpha (float): The weight of a new detection in the moving average.
+            tolerance (float): How far, as a fraction of the region size, the smoothed box must be
+                for the region to move.
+            hold (int): The number of detections in a row that may miss before the region is dropped.
+            align (int): The grid, in frame pixels, the edges of the region are aligned on.
+        """
+        self.padding = padding
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.hold = hold
+        self.align = align
+        self.roi = None
+        self._box = None
+        self._misses = 0
+
+    def update(self, box, frame_shape):
+        """Follows the head by one detection.
+
+        Args:
+            box (tuple): The (x, y, width, height) of the detected head, or None if it was not found.
+            frame_shape (tuple): The shape of the frame.
+
+        Returns:
+            tuple: The region of interest, see roi.
+        """
+        if box is None:
+            self._misses += 1
+            if self._misses > self.hold:
+                self.reset()
+            return self.roi
+        self._misses = 0
+
+        x, y, width, height = box
+        padded = (x + width / 2.0, y + height / 2.0, width * (1 + 2 * self.padding), height * (1 + 2 * self.padding))
+        if self._box is None:
+            self._box = padded
+        else:
+            self._box = tuple(self.alpha * new + (1 - self.alpha) * old for new, old in zip(padded, self._box))
+
+        candidate = self._aligned(self._box, frame_shape)
+        if self.roi is None or self._moved(candidate):
+            self.roi = candidate
+        return self.roi
+
+    def _aligned(self, box, frame_shape):
+        """Converts a (center x, center y, width, height) box to a region aligned on the grid."""
+        frame_height, frame_width = frame_shape[:2]
+        center_x, center_y, width, height = box
+        align = self.align
+        left = max(int((center_x - width / 2) // align) * align, 0)
+        top = max(int((center_y - height / 2) // align) * align, 0)
+        right = min(-int(-(center_x + width / 2) // align) * align, frame_width)
+        bottom = min(-int(-(center_y + height / 2) // align) * align, frame_height)
+        return left, top, right - left, bottom - top
+
+    def _moved(self, candidate):
+        """Returns whether a candidate region is far enough from the current one to move to it."""
+        x, y, width, height = self.roi
+        limit = self.tolerance * max(width, height)
+        edges = (x, y, x + width, y + height)
+        candidate_edges = (candidate[0], candidate[1], candidate[0] + candidate[2], candidate[1] + candidate[3])
+        return any(abs(edge - candidate_edge) > limit for edge, candidate_edge in zip(edges, candidate_edges))
+
+    def reset(self):
+        """Drops the region, falling back to the whole frame."""
+        self.roi = None
+        self._box = None
+        self._misses = 0
+
+
+class HeadTracker:
+    """Tracks the head of the participant on its own thread, at a low rate.
+
+    The processing thread only hands over the latest frame, which costs a reference, and reads the
+    current region of interest; detection runs a few times per second on the tracking thread, which
+    OpenCV releases the GIL for.
+
+    Attributes:
+        rate (float): The number of detections per second.
+        detector (HeadDetector): The head detector.
+        smoother (RegionSmoother): The filter turning detections into the region of interest.
+        attempts (int): The number of detections run.
+        detections (int): The number of detections that found a head.
+    """
+
+    def __init__(self, rate=2.0, detector=None, smoother=None):
+        """Initializes the HeadTracker class.
+
+        Args:
+            rate (float): The number of detections per second.
+            detector (HeadDetector): The head detector, one with the default cascades when None.
+            smoother (RegionSmoother): The region filter, one with the default settings when None.
+        """
+        self.rate = rate
+        self.detector = detector if detector is not None else HeadDetector()
+        self.smoother = smoother if smoother is not None else RegionSmoother()
+        self.attempts = 0
+        self.detections = 0
+        self._frame = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def roi(self):
+        """The current region of interest, (x, y, width, height) in frame pixels, or None."""
+        return self.smoother.roi
+
+    def submit(self, frame):
+        """Hands over the latest frame, replacing any frame not tracked yet.
+
+        The frame is not copied, the caller must not modify it afterwards.
+
+        Args:
+            frame (np.ndarray): The BGR frame captured by the camera.
+        """
+        self._frame = frame
+
+    def update(self, frame):
+        """Detects the head in a frame and updates the region of interest.
+
+        Args:
+            frame (np.ndarray): The BGR frame captured by the camera.
+
+        Returns:
+            tuple: The region of interest, see roi.
+        """
+        box = self.detector.detect(frame)
+        self.attempts += 1
+        self.detections += box is not None
+        return self.smoother.update(box, frame.shape)
+
+    def start(self):
+        """Starts the tracking thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._track, daemon=True)
+        self._thread.start()
+
+    def _track(self):
+        """Runs in the tracking thread: tracks the latest frame at the tracking rate until stopped."""
+        while not self._stop.wait(1.0 / self.rate):
+            frame, self._frame = self._frame, None
+            if frame is not None:
+                self.update(frame)
+
+    def stop(self):
+        """Stops the tracking thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        """Returns the tracking counters.
+
+        Returns:
+            dict: The current region of interest and the number of detections run and successful.
+        """
+        return {"roi": self.roi, "attempts": self.attempts, "detections": self.detections}
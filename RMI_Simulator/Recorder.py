@@ -0,0 +1,226 @@
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from RMI_Simulator.Motion import FRAME_HEIGHT, FRAME_WIDTH
+
+DEFAULT_RECORDINGS_DIR = "recordings"
+# The session start session_video_path puts in a file name, after the participant ID
+SESSION_START_PATTERN = re.compile(r"_(\d{8}_\d{6})(?:_.+)?$")
+
+
+class SessionRecorder:
+    """Encodes session video to disk on its own thread behind a bounded queue.
+
+    write() only hands a frame reference to the queue and never blocks: when the encoder falls
+    behind and the queue is full, the frame is dropped from the recording and counted. The live
+    capture and detection path therefore never waits for the disk.
+
+    The capture time of every encoded frame is written next to the video, see frame_times_path, so
+    the session can be timed exactly despite dropped frames or a capture rate off the file rate.
+
+    Attributes:
+        path (str): The file being recorded, or the last file recorded once stopped.
+        fps (float): The frame rate written in the file.
+        written_count (int): The number of frames encoded.
+        dropped_count (int): The number of frames dropped because the queue was full.
+    """
+
+    def __init__(self, fps=30.0, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), fourcc="MJPG", max_queue=32):
+        """Initializes the SessionRecorder class.
+
+        Args:
+            fps (float): The frame rate written in the file, unless given when recording starts.
+            frame_size (tuple): The (width, height) of the recorded frames.
+            fourcc (str): The four character code of the codec, MJPG is built into OpenCV.
+            max_queue (int): The maximum number of frames waiting to be encoded.
+        """
+        self.fps = fps
+        self.frame_size = tuple(frame_size)
+        self.fourcc = fourcc
+        self.max_queue = max_queue
+        self.path = None
+        self.written_count = 0
+        self.dropped_count = 0
+        self._queue = None
+        self._thread = None
+
+    @property
+    def recording(self):
+        """Whether a recording is in progress."""
+        return self._thread is not None
+
+    def start(self, path, fps=None):
+        """Opens a video file and starts the encoder thread.
+
+        Args:
+            path (str): The path of the video file.
+            fps (float): The rate frames are captured at, written in the file so that it plays back
+                at the speed of the session. The recorder frame rate when None.
+
+        Returns:
+            str: The path of the video file.
+        """
+        if self.recording:
+            raise RuntimeError("a recording is already in progress")
+        if fps:
+            self.fps = fps
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.frame_size)
+        if not writer.isOpened():
+            raise ValueError(f"cannot open {path!r} for writing")
+        try:
+            times = open(frame_times_path(path), "w")
+        except OSError:
+            writer.release()
+            raise
+        times.write("captured_ns\n")
+        self.path = path
+        self.written_count = 0
+        self.dropped_count = 0
+        self._queue = queue.Queue(self.max_queue)
+        self._thread = threading.Thread(target=self._encode, args=(writer, times, self._queue), daemon=True)
+        self._thread.start()
+        return path
+
+    def write(self, frame, captured_ns=None):
+        """Queues a frame for encoding without blocking.
+
+        The frame is not copied, the caller must not modify it afterwards.
+
+        Args:
+            frame (np.ndarray): The BGR frame, of the recorder frame size.
+            captured_ns (int): The time.monotonic_ns() time the frame was captured, now when None.
+
+        Returns:
+            bool: True if the frame was queued, False if it was dropped.
+        """
+        frames = self._queue
+        if frames is None:
+            return False
+        if captured_ns is None:
+            captured_ns = time.monotonic_ns()
+        try:
+            frames.put_nowait((frame, captured_ns))
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    def _encode(self, writer, times, frames):
+        """Runs in the encoder thread: writes queued frames and their times until the end marker."""
+        try:
+            while True:
+                item = frames.get()
+                if item is None:
+                    break
+                frame, captured_ns = item
+                if frame.shape[1::-1] != self.frame_size:
+                    frame = cv2.resize(frame, self.frame_size)
+                writer.write(frame)
+                times.write(f"{captured_ns}\n")
+                self.written_count += 1
+        finally:
+            writer.release()
+            times.close()
+
+    def stop(self):
+        """Encodes the frames still queued and closes the file.
+
+        Returns:
+            str: The path of the recorded file, or None if nothing was being recorded.
+        """
+        if not self.recording:
+            return None
+        frames, self._queue = self._queue, None
+        # The end marker must get through even when the queue is full
+        frames.put(None)
+        self._thread.join()
+        self._thread = None
+        print(f"Recorded {self.written_count} frames to {self.path}, dropped {self.dropped_count}")
+        return self.path
+
+    def stats(self):
+        """Returns the recording counters.
+
+        Returns:
+            dict: The number of frames written, dropped and waiting to be encoded.
+        """
+        frames = self._queue
+        return {
+            "written": self.written_count,
+            "dropped": self.dropped_count,
+            "pending": frames.qsize() if frames is not None else 0,
+        }
+
+
+def session_video_path(participant_id, directory=DEFAULT_RECORDINGS_DIR, when=None, camera=None):
+    """Builds the path a session video is recorded to.
+
+    Args:
+        participant_id (str): The ID of the participant.
+        directory (str): The directory recordings are kept in.
+        when (datetime): The start of the session, now by default.
+        camera (str): The name of the camera, added to the file name when given.
+
+    Returns:
+        str: The path of the video file.
+    """
+    when = when if when is not None else datetime.now()
+    suffix = f"_{camera}" if camera is not None else ""
+    return os.path.join(directory, f"{participant_id}_{when.strftime('%Y%m%d_%H%M%S')}{suffix}.avi")
+
+
+def frame_times_path(path):
+    """Returns the path the capture times of the frames of a session video are kept in.
+
+    Args:
+        path (str): The path of the video file.
+
+    Returns:
+        str: The path of the CSV file, next to the video.
+    """
+    return f"{os.path.splitext(path)[0]}.frames.csv"
+
+
+def read_frame_times(path):
+    """Reads the capture times the recorder kept for the frames of a session video.
+
+    Args:
+        path (str): The path of the video file.
+
+    Returns:
+        list: The time.monotonic_ns() capture time of every frame in the video, or None if the
+            video has no frame times, e.g. when it was not recorded by SessionRecorder.
+    """
+    try:
+        with open(frame_times_path(path)) as file:
+            next(file, None)
+            return [int(line) for line in file if line.strip()]
+    except (OSError, ValueError):
+        return None
+
+
+def session_video_start(path):
+    """Reads the session start back from the name of a video recorded to session_video_path.
+
+    Args:
+        path (str): The path of the video file.
+
+    Returns:
+        datetime: The start of the session in local time, or None if the name carries none.
+    """
+    match = SESSION_START_PATTERN.search(os.path.splitext(os.path.basename(path))[0])
+    if match is None:
+        return None
+    try:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+    except ValueError:
+        return None
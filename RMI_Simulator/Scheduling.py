@@ -0,0 +1,125 @@
+import os
+
+import cv2
+from PyQt5.QtCore import QThread
+
+# The QThread priorities, by the names used in settings and on the command line
+THREAD_PRIORITIES = {
+    "idle": QThread.IdlePriority,
+    "lowest": QThread.LowestPriority,
+    "low": QThread.LowPriority,
+    "normal": QThread.NormalPriority,
+    "high": QThread.HighPriority,
+    "highest": QThread.HighestPriority,
+    "time_critical": QThread.TimeCriticalPriority,
+}
+
+
+def set_opencv_threads(count):
+    """Sets the size of the thread pool OpenCV runs its parallel loops in.
+
+    The pool is shared by the whole process, so it competes with the capture, processing, GUI and
+    audio threads for the same cores.
+
+    Args:
+        count (int): The number of threads, 1 to run OpenCV in the calling thread only, or a
+            negative number to restore the OpenCV default.
+
+    Returns:
+        int: The previous number of threads.
+    """
+    previous = cv2.getNumThreads()
+    cv2.setNumThreads(count)
+    return previous
+
+
+def set_thread_priority(thread, priority):
+    """Changes the scheduling priority of a running QThread.
+
+    Args:
+        thread (QThread): The thread, which must be running.
+        priority (str): The name of the priority, one of THREAD_PRIORITIES.
+
+    Returns:
+        bool: Whether the priority was applied, which requires the thread to be running.
+    """
+    try:
+        value = THREAD_PRIORITIES[priority]
+    except KeyError:
+        raise ValueError(f"unknown thread priority {priority!r}, expected one of {list(THREAD_PRIORITIES)}") from None
+    if not thread.isRunning():
+        return False
+    thread.setPriority(value)
+    return True
+
+
+def available_cpus():
+    """Returns the CPUs the process may run on.
+
+    Returns:
+        set: The CPU numbers, or None where the platform does not expose CPU affinity.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return None
+    return os.sched_getaffinity(0)
+
+
+def process_threads():
+    """Returns the IDs of the threads of the process, as the kernel knows them.
+
+    Returns:
+        list: The thread IDs, or [0], the calling thread, where the platform does not list them.
+    """
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return [0]
+
+
+def set_cpu_affinity(cpus):
+    """Restricts every thread of the process, and every thread started afterwards, to a set of CPUs.
+
+    On Linux the affinity belongs to each thread and is only inherited by the threads it starts,
+    so it is applied to each running thread: the capture and processing threads, the OpenCV pool
+    and the audio threads alike.
+
+    Args:
+        cpus (iterable): The CPU numbers, e.g. to keep one core free for the GUI and audio of the
+            rest of the system.
+
+    Returns:
+        set: The previous CPUs, or None where the platform does not support CPU affinity, in which
+            case nothing is changed.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        print("CPU affinity is not supported on this platform")
+        return None
+    previous = os.sched_getaffinity(0)
+    cpus = set(cpus)
+    for tid in process_threads():
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except ProcessLookupError:
+            # The thread ended in the meantime
+            pass
+    return previous
+
+
+def describe_scheduling(settings):
+    """Formats scheduling settings as a short label.
+
+    Args:
+        settings (dict): The settings passed to OpticalFlowApp.apply_scheduling.
+
+    Returns:
+        str: The label, e.g. "cv2 threads 2, capture high, process normal, cpus 0,1".
+    """
+    parts = []
+    if settings.get("opencv_threads") is not None:
+        parts.append(f"cv2 threads {settings['opencv_threads']}")
+    for thread in ("capture", "process"):
+        if settings.get(f"{thread}_priority"):
+            parts.append(f"{thread} {settings[f'{thread}_priority']}")
+    if settings.get("cpus"):
+        parts.append("cpus " + ",".join(str(cpu) for cpu in sorted(settings["cpus"])))
+    return ", ".join(parts) or "defaults"
@@ -0,0 +1,257 @@
+import collections
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from RMI_Simulator.Estimators import ESTIMATORS, create_estimator
+from RMI_Simulator.Motion import FRAME_HEIGHT, FRAME_WIDTH, FlowWorkspace
+
+FRAME_SHAPE = (FRAME_HEIGHT, FRAME_WIDTH, 3)
+
+
+class SharedFrameRing:
+    """A ring of fixed-size frame slots in shared memory.
+
+    Frames are copied once into a slot and read in place by the worker processes, so no frame is
+    ever pickled.
+    """
+
+    def __init__(self, slots=8, shape=FRAME_SHAPE, name=None):
+        """Initializes the SharedFrameRing class.
+
+        Args:
+            slots (int): The number of frame slots.
+            shape (tuple): The shape of one BGR frame.
+            name (str): The name of an existing ring to attach to, or None to create a new one.
+        """
+        self.slots = slots
+        self.shape = tuple(shape)
+        size = slots * int(np.prod(self.shape))
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.memory.buf)
+
+    @property
+    def name(self):
+        """The name other processes attach to the ring with."""
+        return self.memory.name
+
+    def frame(self, index):
+        """Returns a view of a frame slot.
+
+        Args:
+            index (int): The slot index.
+
+        Returns:
+            np.ndarray: The slot, viewed as a BGR frame.
+        """
+        return self.frames[index]
+
+    def close(self):
+        """Detaches from the ring and destroys it if this process created it."""
+        self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _worker_main(ring_name, slots, shape, estimator_name, analysis_scale, jobs, results):
+    """Runs in a worker process: measures movement between pairs of ring slots.
+
+    Args:
+        ring_name (str): The name of the shared frame ring.
+        slots (int): The number of slots of the ring.
+        shape (tuple): The shape of one frame.
+        estimator_name (str): The name of the motion detection engine.
+        analysis_scale (float): The scale frames are downsampled to before motion detection.
+        jobs (multiprocessing.Queue): The (seq, prev_slot, slot, threshold) jobs, None to stop.
+        results (multiprocessing.Queue): The (seq, movement_detected, movement_value, seconds) results.
+    """
+    ring = SharedFrameRing(slots, shape, ring_name)
+    estimator = create_estimator(estimator_name, FlowWorkspace(analysis_scale))
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            seq, prev_slot, slot, threshold = job
+            start = time.perf_counter()
+            prev_gray = estimator.workspace.preprocess(ring.frame(prev_slot))
+            gray = estimator.workspace.preprocess(ring.frame(slot))
+            movement_detected, movement_value = estimator.estimate(prev_gray, gray, threshold)
+            results.put((seq, bool(movement_detected), float(movement_value), time.perf_counter() - start))
+    finally:
+        ring.close()
+
+
+class FlowWorkerPool:
+    """Runs motion detection in worker processes fed through a shared memory frame ring.
+
+    Every submitted frame is copied into a free slot of the ring and a job naming the slots of the
+    previous and current frames is queued. Any idle worker takes the job, so consecutive frames are
+    analysed in parallel; each worker preprocesses both images of its pair. Results are returned
+    in submission order. When every slot is still in use by pending jobs, the frame is dropped
+    instead of blocking the caller.
+
+    Only engines without frame-to-frame state can be spread over several workers.
+    """
+
+    def __init__(self, workers=2, estimator="farneback", analysis_scale=1.0, slots=None, shape=FRAME_SHAPE):
+        """Initializes the FlowWorkerPool class and starts the worker processes.
+
+        Args:
+            workers (int): The number of worker processes.
+            estimator (str): The name of the motion detection engine, see Estimators.ESTIMATORS.
+            analysis_scale (float): The scale frames are downsampled to before motion detection.
+            slots (int): The number of ring slots, by default enough for two jobs per worker.
+            shape (tuple): The shape of the frames.
+        """
+        if workers < 1:
+            raise ValueError("at least one worker is needed")
+        if ESTIMATORS[estimator].stateful and workers > 1:
+            raise ValueError(f"the {estimator} engine keeps state between frames and needs a single worker")
+        self.workers = workers
+        self.shape = tuple(shape)
+        self.slots = slots if slots is not None else 2 * workers + 2
+        self.ring = SharedFrameRing(self.slots, self.shape)
+
+        context = multiprocessing.get_context("spawn")
+        self._jobs = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(target=_worker_main, daemon=True,
+                            args=(self.ring.name, self.slots, self.shape, estimator, analysis_scale,
+                                  self._jobs, self._results))
+            for _ in range(workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._lock = threading.Lock()
+        self._free_slots = collections.deque(range(self.slots))
+        self._slot_users = [0] * self.slots
+        self._latest_slot = None
+        self._next_seq = 0
+        self._next_result = 0
+        self._payloads = {}
+        self._job_slots = {}
+        self._finished = {}
+        self.dropped_count = 0
+        self.processed_count = 0
+        self.worker_seconds = 0.0
+
+    def _release(self, slot):
+        """Releases one use of a slot, freeing it when it is no longer needed."""
+        self._slot_users[slot] -= 1
+        if self._slot_users[slot] == 0:
+            self._free_slots.append(slot)
+
+    def submit(self, frame, payload=None, threshold=None):
+        """Copies a frame into the ring and queues its analysis.
+
+        Args:
+            frame (np.ndarray): The BGR frame, of the ring frame shape.
+            payload (object): Returned with the result, e.g. the frame packet to display.
+            threshold (float): The movement threshold, or None for the engine default.
+
+        Returns:
+            bool: True if the frame was accepted, False if it was dropped because the ring is full.
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f"frame shape {frame.shape} does not match the ring shape {self.shape}")
+        with self._lock:
+            if not self._free_slots:
+                self.dropped_count += 1
+                return False
+            slot = self._free_slots.popleft()
+            np.copyto(self.ring.frame(slot), frame)
+
+            seq = self._next_seq
+            self._next_seq += 1
+            self._payloads[seq] = payload
+            # The newest slot stays in use as the reference of the next frame
+            self._slot_users[slot] += 1
+            previous = self._latest_slot
+            self._latest_slot = slot
+            if previous is None:
+                # The first frame has no reference to be compared to
+                self._finished[seq] = (False, 0.0, None)
+                return True
+            # The job holds both slots until its result is collected
+            self._slot_users[previous] += 1
+            self._slot_users[slot] += 1
+            self._job_slots[seq] = (previous, slot)
+            self._release(previous)
+            self._jobs.put((seq, previous, slot, threshold))
+            return True
+
+    def collect(self, timeout=None):
+        """Waits for results and returns those that are ready, in submission order.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait for a result, None to wait forever.
+
+        Returns:
+            list: (payload, movement_detected, movement_value) tuples.
+        """
+        with self._lock:
+            ready_now = self._next_result in self._finished
+        try:
+            results = [self._results.get_nowait() if ready_now else self._results.get(timeout=timeout)]
+        except queue.Empty:
+            results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+
+        ready = []
+        with self._lock:
+            for seq, movement_detected, movement_value, seconds in results:
+                for slot in self._job_slots.pop(seq):
+                    self._release(slot)
+                self._finished[seq] = (movement_detected, movement_value, seconds)
+            while self._next_result in self._finished:
+                seq = self._next_result
+                movement_detected, movement_value, seconds = self._finished.pop(seq)
+                if seconds is not None:
+                    self.processed_count += 1
+                    self.worker_seconds += seconds
+                ready.append((self._payloads.pop(seq), movement_detected, movement_value))
+                self._next_result += 1
+        return ready
+
+    @property
+    def pending(self):
+        """The number of submitted frames whose result has not been collected yet."""
+        with self._lock:
+            return self._next_seq - self._next_result
+
+    def stats(self):
+        """Returns the pool counters.
+
+        Returns:
+            dict: The number of frames processed and dropped and the mean worker time per frame in ms.
+        """
+        with self._lock:
+            mean = self.worker_seconds / self.processed_count * 1000.0 if self.processed_count else 0.0
+            return {"processed": self.processed_count, "dropped": self.dropped_count, "mean_ms": mean}
+
+    def close(self):
+        """Stops the worker processes and destroys the ring."""
+        for _ in self._processes:
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
@@ -208,7 +208,7 @@ class MovementData:
         self.collection = collection
         self._db = db
 
-    def save_test_data(self, test_data, participant, bodypart):
+    def save_test_data(self, test_data, participant, bodypart, video_path=None, quality_adjustments=None, roi=None):
         """
         Saves the test data for a participant to the movement data collection.
 
@@ -216,6 +216,11 @@ class MovementData:
             test_data (list): The test data to save.
             participant (dict): The participant details.
             bodypart (str): The body part related to the test.
+            video_path (str or dict): The video recorded during the test, or the video of each camera
+                by camera name, if any.
+            quality_adjustments (list): The quality levels motion detection ran at during the test, if governed.
+            roi (dict): The region of the frame motion detection ran on, or that of each camera by
+                camera name, if any.
 
         Returns:
             None
@@ -224,7 +229,6 @@ class MovementData:
 
         # Get the next test_id by counting existing documents for the participant
         next_test_id = self.collection.count_documents({'participant.id': participant['id']}) + 1
-        movement_amount = len(test_data)
         participant_id = participant['id']  # Assuming 'participant' is a dictionary and 'id' is the participant's ID
         query = {'id': participant_id}
         participant_document = self._db['PARTICIPANTS'].find_one(query)
@@ -238,32 +242,9 @@ class MovementData:
             print(f"Anxiety Level: {anxiety_level}")
         else:
             print("Participant not found.")
-        if movement_amount == 0:
-            doc = {
-                "participant": participant,
-                "test_id": next_test_id,
-                "test_data": test_data,
-                "test_result": 'Passed',
-                "mri_result": 'Passed',
-                "timestamp": datetime.now(timezone.utc),
-                "bodypart": bodypart,
-                "movement_amount": movement_amount,
-                "note": 'Unset',
-                "anxiety_level": anxiety_level
-            }
-        else:
-            doc = {
-                "participant": participant,
-                "test_id": next_test_id,
-                "test_data": test_data,
-                "test_result": 'Unset',
-                "mri_result": 'Unset',
-                "timestamp": datetime.now(timezone.utc),
-                "bodypart": bodypart,
-                "movement_amount": movement_amount,
-                "note": 'Unset',
-                "anxiety_level": anxiety_level
-            }
+
+        doc = build_test_document(test_data, participant, next_test_id, bodypart, anxiety_level,
+                                  video_path=video_path, quality_adjustments=quality_adjustments, roi=roi)
 
         # Insert document into the collection
         result = self.collection.insert_one(doc)
@@ -301,6 +282,39 @@ class MovementData:
         self.collection.update_one({'participant_id': participant_id, 'test_id': test_id},
                                    {'$set': {'test_result': test_result, 'mri_result': mri_result}})
 
+    def get_movement_baseline(self, participant_id, estimator):
+        """
+        Retrieves the still movement baseline calibrated for a participant.
+
+        Args:
+            participant_id (str): The ID of the participant.
+            estimator (str): The name of the motion detection engine the baseline was measured with,
+                followed by the camera name on a rig with several cameras.
+
+        Returns:
+            dict: The baseline mean, standard deviation and number of frames, or None if there is none.
+        """
+        participant_document = self._db['PARTICIPANTS'].find_one({'id': participant_id})
+        if not participant_document:
+            return None
+        return participant_document.get('movement_baseline', {}).get(estimator)
+
+    def save_movement_baseline(self, participant_id, estimator, baseline):
+        """
+        Stores the still movement baseline calibrated for a participant.
+
+        Args:
+            participant_id (str): The ID of the participant.
+            estimator (str): The name of the motion detection engine the baseline was measured with,
+                followed by the camera name on a rig with several cameras.
+            baseline (dict): The baseline mean, standard deviation and number of frames.
+
+        Returns:
+            None
+        """
+        self._db['PARTICIPANTS'].update_one({'id': participant_id},
+                                            {'$set': {f'movement_baseline.{estimator}': baseline}})
+
     def update_note(self, participant_id, test_id, new_note):
         """
         Updates the note for a specific test of a participant.
@@ -317,6 +331,51 @@ class MovementData:
                                    {'$set': {'note': new_note}})
 
 
+def build_test_document(test_data, participant, test_id, bodypart, anxiety_level='Not Available', timestamp=None,
+                        video_path=None, quality_adjustments=None, roi=None):
+    """
+    Builds a movement data document in the format stored in the movement data collection.
+
+    Args:
+        test_data (list): The movements recorded during the test.
+        participant (dict): The participant details.
+        test_id (int): The ID of the test for this participant.
+        bodypart (str): The body part related to the test.
+        anxiety_level (str): The anxiety level of the participant.
+        timestamp (datetime): The time of the test, now by default.
+        video_path (str or dict): The video recorded during the test, or the video of each camera by
+            camera name, linked from the document if given.
+        quality_adjustments (list): The quality levels motion detection ran at during the test, stored
+            if given.
+        roi (dict): The region of the frame motion detection ran on, see OpticalFlowApp.roi_settings,
+            or the region of each camera by camera name, stored if given.
+
+    Returns:
+        dict: The movement data document.
+    """
+    movement_amount = len(test_data)
+    result = 'Passed' if movement_amount == 0 else 'Unset'
+    doc = {
+        "participant": participant,
+        "test_id": test_id,
+        "test_data": test_data,
+        "test_result": result,
+        "mri_result": result,
+        "timestamp": timestamp if timestamp is not None else datetime.now(timezone.utc),
+        "bodypart": bodypart,
+        "movement_amount": movement_amount,
+        "note": 'Unset',
+        "anxiety_level": anxiety_level
+    }
+    if video_path is not None:
+        doc["video_path"] = video_path
+    if quality_adjustments is not None:
+        doc["quality_adjustments"] = quality_adjustments
+    if roi is not None:
+        doc["roi"] = roi
+    return doc
+
+
 def get_client():
     """
     Retrieves and returns a MongoDB client object.
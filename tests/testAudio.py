@@ -0,0 +1,26 @@
+import unittest
+
+from RMI_Simulator.Audio import LoopbackStandIn, measure_loopback_latency
+
+
+class TestLoopbackLatency(unittest.TestCase):
+
+    def test_buffering_is_measured(self):
+        for frames_per_buffer in (128, 512):
+            with self.subTest(frames_per_buffer=frames_per_buffer):
+                result = measure_loopback_latency(LoopbackStandIn(), frames_per_buffer=frames_per_buffer)
+                self.assertAlmostEqual(result["latency_ms"], 1000.0 * 2 * frames_per_buffer / 44100, places=3)
+                self.assertEqual(result["frames_per_buffer"], frames_per_buffer)
+
+    def test_click_not_heard(self):
+        # The recording ends before the click comes back
+        result = measure_loopback_latency(LoopbackStandIn(delay=0.5), duration=0.3)
+        self.assertIsNone(result["latency_ms"])
+
+    def test_stand_in_only_opens_duplex_callback_streams(self):
+        with self.assertRaises(IOError):
+            LoopbackStandIn().open(input=True, frames_per_buffer=256)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import cv2
+
+from RMI_Simulator.BatchAnalysis import analyse_video, run_batch
+from RMI_Simulator.Recorder import frame_times_path
+from testMotion import textured_frames
+
+
+def write_video(path, shifts, width=176, height=144):
+    """Writes a small MJPG video whose frames are shifted by the given number of pixels."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (width, height))
+    for shift in shifts:
+        writer.write(textured_frames(shift, width, height)[1])
+    writer.release()
+
+
+class TestBatchAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.still = os.path.join(self.directory.name, "still.avi")
+        self.moving = os.path.join(self.directory.name, "moving.avi")
+        write_video(self.still, [0] * 5)
+        write_video(self.moving, [0, 0, 8, 8, 0])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_still_session_passes(self):
+        trace, summary = analyse_video(self.still, analysis_scale=0.5)
+
+        self.assertEqual(len(trace), 5)
+        self.assertEqual(summary["movement_amount"], 0)
+        self.assertEqual(summary["test_result"], "Passed")
+        self.assertEqual(summary["frames"], 5)
+
+    def test_moving_session_reports_movements(self):
+        trace, summary = analyse_video(self.moving, analysis_scale=0.5)
+
+        self.assertEqual([frame["movement_detected"] for frame in trace], [False, False, True, False, True])
+        # Both moving frames fall within one episode
+        self.assertEqual(summary["movement_amount"], 1)
+        self.assertEqual(summary["test_result"], "Unset")
+        episode = summary["test_data"][0]
+        self.assertEqual(set(episode), {"start", "end", "duration_s", "peak", "integral", "frames", "zones"})
+        self.assertAlmostEqual(episode["duration_s"], 2 / 25)
+        self.assertEqual(len(episode["zones"]), 3)
+
+    def test_episodes_split_on_gap(self):
+        _, summary = analyse_video(self.moving, analysis_scale=0.5, min_gap=0.01)
+        self.assertEqual(summary["movement_amount"], 2)
+
+    def test_threshold_rescoring(self):
+        _, summary = analyse_video(self.moving, analysis_scale=0.5, threshold=1000)
+        self.assertEqual(summary["movement_amount"], 0)
+
+    def test_batch_writes_traces_and_summaries(self):
+        output = os.path.join(self.directory.name, "out")
+        summaries = run_batch([self.still, self.moving], output, workers=2, estimator="absdiff")
+
+        self.assertEqual([summary["estimator"] for summary in summaries], ["absdiff", "absdiff"])
+        with open(os.path.join(output, "moving.trace.csv")) as file:
+            self.assertEqual(len(list(csv.DictReader(file))), 5)
+        with open(os.path.join(output, "moving.movement_data.json")) as file:
+            self.assertEqual(json.load(file)["movement_amount"], summaries[1]["movement_amount"])
+
+    def test_session_start_from_file_name(self):
+        started = datetime(2024, 8, 19, 11, 12, 48)
+        path = os.path.join(self.directory.name, "P01_20240819_111248_body.avi")
+        write_video(path, [0] * 5)
+
+        _, summary = analyse_video(path, analysis_scale=0.5)
+        self.assertEqual(summary["timestamp"], started.astimezone(timezone.utc))
+
+    def test_session_start_from_file_time(self):
+        # Without a start in the name, the recording ended when the file was last written
+        os.utime(self.still, (1_700_000_000, 1_700_000_000))
+
+        _, summary = analyse_video(self.still, analysis_scale=0.5)
+        self.assertEqual(summary["timestamp"].timestamp(), 1_700_000_000 - 5 / 25)
+
+    def test_frames_dated_by_capture_times(self):
+        # Captured at 10 fps, although the file says 25
+        with open(frame_times_path(self.moving), "w") as file:
+            file.write("captured_ns\n")
+            file.writelines(f"{5_000_000_000 + index * 100_000_000}\n" for index in range(5))
+
+        trace, summary = analyse_video(self.moving, analysis_scale=0.5)
+        self.assertEqual([frame["time_s"] for frame in trace], [0.0, 0.1, 0.2, 0.3, 0.4])
+        self.assertAlmostEqual(summary["test_data"][0]["duration_s"], 0.2)
+
+    def test_missing_video(self):
+        with self.assertRaises(ValueError):
+            analyse_video(os.path.join(self.directory.name, "missing.avi"))
+
+
+if __name__ == '__main__':
+    unittest.main()
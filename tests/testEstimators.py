@@ -0,0 +1,57 @@
+import unittest
+
+from RMI_Simulator.Estimators import ESTIMATORS, FarnebackEstimator, MotionEstimator, create_estimator
+from RMI_Simulator.Motion import FlowWorkspace
+from testMotion import textured_frames
+
+
+class TestMotionEstimators(unittest.TestCase):
+
+    def run_estimator(self, name, shift):
+        """Runs an estimator over a still frame pair and a moving frame pair."""
+        estimator = create_estimator(name, FlowWorkspace(0.5))
+        still, moved = textured_frames(shift, 352, 288)
+        prev_gray = estimator.workspace.preprocess(still).copy()
+        for _ in range(3):
+            estimator.estimate(prev_gray, estimator.workspace.preprocess(still).copy())
+        return estimator.estimate(prev_gray, estimator.workspace.preprocess(moved))
+
+    def test_every_engine_shares_the_contract(self):
+        for name in ESTIMATORS:
+            with self.subTest(engine=name):
+                movement_detected, movement_value = self.run_estimator(name, 0)
+                self.assertFalse(movement_detected)
+                self.assertIsInstance(movement_value, float)
+
+                movement_detected, movement_value = self.run_estimator(name, 6)
+                self.assertTrue(movement_detected)
+                self.assertGreater(movement_value, 0.0)
+
+    def test_flow_engines_report_full_resolution_pixels(self):
+        for name in ("farneback", "dis", "lk"):
+            with self.subTest(engine=name):
+                _, movement_value = self.run_estimator(name, 6)
+                self.assertAlmostEqual(movement_value, 6, delta=1.5)
+
+    def test_explicit_threshold(self):
+        estimator = FarnebackEstimator()
+        still, moved = textured_frames(2, 176, 144)
+        prev_gray = estimator.workspace.preprocess(still)
+        gray = estimator.workspace.preprocess(moved)
+
+        movement_detected, movement_value = estimator.estimate(prev_gray, gray, threshold=100)
+
+        self.assertFalse(movement_detected)
+        self.assertIs(estimator.motion_map, estimator.workspace.magnitude)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            create_estimator("unknown")
+
+    def test_base_class_is_abstract(self):
+        with self.assertRaises(NotImplementedError):
+            MotionEstimator().measure(None, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
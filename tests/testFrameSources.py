@@ -0,0 +1,181 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from RMI_Simulator.Benchmark import benchmark_pipeline
+from RMI_Simulator.Estimators import create_estimator
+from RMI_Simulator.FrameSources import SyntheticSource, VideoFileSource, WebcamSource, tiling_texture
+from RMI_Simulator.MRI_Test import CaptureThread, FrameMailbox
+from RMI_Simulator.Motion import FlowWorkspace
+
+
+class TestSyntheticSource(unittest.TestCase):
+
+    def read_all(self, source):
+        source.open()
+        frames = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                return frames
+            frames.append(frame)
+
+    def test_deterministic(self):
+        first = self.read_all(SyntheticSource(64, 48, bursts=[(2, 3, 2, 1)], frames=5, realtime=False))
+        second = self.read_all(SyntheticSource(64, 48, bursts=[(2, 3, 2, 1)], frames=5, realtime=False))
+
+        self.assertEqual(len(first), 5)
+        for a, b in zip(first, second):
+            np.testing.assert_array_equal(a, b)
+
+    def test_scripted_bursts(self):
+        source = SyntheticSource(176, 144, bursts=[(3, 4, 4, 0)], frames=7, realtime=False)
+        frames = self.read_all(source)
+        estimator = create_estimator("farneback", FlowWorkspace())
+
+        detected = []
+        prev_gray = estimator.workspace.preprocess(frames[0]).copy()
+        for frame in frames[1:]:
+            gray = estimator.workspace.preprocess(frame)
+            detected.append(bool(estimator.estimate(prev_gray, gray)[0]))
+            prev_gray = gray.copy()
+
+        self.assertEqual(detected, [source.is_moving(index) for index in range(1, 7)])
+        self.assertEqual(detected, [False, False, True, True, False, False])
+
+    def test_texture_tiles(self):
+        texture = tiling_texture(32, 24)
+        self.assertEqual(texture.shape, (48, 64, 3))
+        np.testing.assert_array_equal(texture[:24, :32], texture[24:, 32:])
+
+    def test_released_source_runs_dry(self):
+        source = SyntheticSource(32, 24, realtime=False)
+        source.open()
+        self.assertTrue(source.read()[0])
+        source.release()
+        self.assertFalse(source.read()[0])
+
+
+class FakeCamera:
+    """Emulates a camera that only grants some of the resolutions it is asked for."""
+
+    def __init__(self, modes):
+        self.modes = modes
+        self.properties = {cv2.CAP_PROP_FRAME_WIDTH: 1920, cv2.CAP_PROP_FRAME_HEIGHT: 1080,
+                           cv2.CAP_PROP_FPS: 30, cv2.CAP_PROP_FOURCC: cv2.VideoWriter_fourcc(*"YUYV")}
+        self.requested = {}
+
+    def set(self, prop, value):
+        self.requested[prop] = value
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            size = (self.requested.get(cv2.CAP_PROP_FRAME_WIDTH), self.requested.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            if size in self.modes:
+                self.properties[cv2.CAP_PROP_FRAME_WIDTH], self.properties[cv2.CAP_PROP_FRAME_HEIGHT] = size
+        else:
+            self.properties[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.properties.get(prop, 0)
+
+
+class TestWebcamSource(unittest.TestCase):
+
+    @patch('cv2.VideoCapture')
+    def test_native_capture_size(self, mock_video_capture):
+        mock_video_capture.return_value = FakeCamera([(704, 576), (640, 480)])
+        source = WebcamSource(fps=60)
+        source.open()
+
+        self.assertEqual(source.mode, {"width": 704, "height": 576, "fourcc": "MJPG", "fps": 60})
+
+    @patch('cv2.VideoCapture')
+    def test_closest_profile(self, mock_video_capture):
+        mock_video_capture.return_value = FakeCamera([(800, 600), (640, 480)])
+        source = WebcamSource()
+        source.open()
+
+        self.assertEqual((source.mode["width"], source.mode["height"]), (800, 600))
+
+    @patch('cv2.VideoCapture')
+    def test_no_profile_granted(self, mock_video_capture):
+        mock_video_capture.return_value = FakeCamera([])
+        source = WebcamSource(fourcc=None)
+        source.open()
+
+        self.assertEqual((source.mode["width"], source.mode["height"]), (1920, 1080))
+        self.assertEqual(source.mode["fourcc"], "YUYV")
+        # The camera is left asking for the preferred profile, not the last one tried
+        camera = mock_video_capture.return_value
+        self.assertEqual((camera.requested[cv2.CAP_PROP_FRAME_WIDTH], camera.requested[cv2.CAP_PROP_FRAME_HEIGHT]),
+                         source.profiles[0])
+
+
+class TestVideoFileSource(unittest.TestCase):
+
+    def test_reads_and_loops(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "video.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+            for _ in range(3):
+                writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+            writer.release()
+
+            source = VideoFileSource(path, realtime=False, loop=True)
+            source.open()
+            reads = [source.read()[0] for _ in range(5)]
+            source.release()
+
+        self.assertEqual(source.fps, 25)
+        self.assertEqual(reads, [True] * 5)
+
+    def test_missing_file(self):
+        with self.assertRaises(ValueError):
+            VideoFileSource("missing.avi").open()
+
+
+class TestCapturePipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_capture_from_synthetic_source(self):
+        """The capture thread runs without a camera and resizes frames to the capture size."""
+        mailbox = FrameMailbox(capacity=100)
+        capture_thread = CaptureThread(mailbox, source=SyntheticSource(352, 288, frames=4, realtime=False))
+        capture_thread.start()
+        frames = [mailbox.get(timeout=2) for _ in range(4)]
+        capture_thread.stop()
+        capture_thread.wait()
+
+        self.assertEqual([packet.image.shape for packet in frames], [(576, 704, 3)] * 4)
+
+    def test_measures_delivered_fps(self):
+        mailbox = FrameMailbox(capacity=100)
+        capture_thread = CaptureThread(mailbox, source=SyntheticSource(64, 48, fps=100, frames=70))
+        capture_thread.start()
+        for _ in range(70):
+            mailbox.get(timeout=2)
+        capture_thread.stop()
+        capture_thread.wait()
+
+        self.assertAlmostEqual(capture_thread.measured_fps, 100, delta=25)
+
+    def test_benchmark(self):
+        source = SyntheticSource(bursts=[(5, 10, 3, 0)], frames=20, realtime=False)
+        result = benchmark_pipeline(source, estimator="absdiff", analysis_scale=0.5, timeout=20)
+
+        self.assertEqual(result["captured"], 20)
+        self.assertGreater(result["displayed"], 0)
+        self.assertEqual(result["displayed"] + result["throttled"] + result["superseded"] + result["dropped"], 20)
+        self.assertGreaterEqual(result["latency_max_ms"], result["latency_p50_ms"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from RMI_Simulator.Governor import QualityGovernor
+from RMI_Simulator.database import build_test_document
+
+LEVELS = (
+    {"analysis_scale": 1.0, "levels": 3, "winsize": 15, "decimation": 1},
+    {"analysis_scale": 0.5, "levels": 3, "winsize": 9, "decimation": 1},
+    {"analysis_scale": 0.5, "levels": 3, "winsize": 9, "decimation": 2},
+)
+
+
+class TestQualityGovernor(unittest.TestCase):
+
+    def feed(self, governor, seconds, frames):
+        """Records the same processing time for a number of frames, returning the number of changes."""
+        return sum(governor.record(seconds) for _ in range(frames))
+
+    def test_steps_down_over_budget(self):
+        governor = QualityGovernor(target_fps=10, levels=LEVELS, window=5)
+
+        self.assertEqual(self.feed(governor, 0.08, 5), 0)
+        self.assertEqual(self.feed(governor, 0.15, 5), 1)
+        self.assertEqual(governor.level, 1)
+        self.assertEqual(governor.adjustments[-1]["reason"], "over budget")
+        self.assertEqual(governor.adjustments[-1]["analysis_scale"], 0.5)
+        self.assertAlmostEqual(governor.adjustments[-1]["processing_ms"], 150.0)
+
+    def test_slow_frames_cut_the_window_short(self):
+        governor = QualityGovernor(target_fps=10, levels=LEVELS, window=30)
+        # A window lasts 3 s at 10 fps, which 6 frames of 0.5 s already took
+        self.assertEqual(self.feed(governor, 0.5, 6), 1)
+
+    def test_steps_up_with_headroom_without_oscillating(self):
+        governor = QualityGovernor(target_fps=10, levels=LEVELS, window=5, retry_windows=3)
+        self.feed(governor, 0.2, 5)
+        self.assertEqual(governor.level, 1)
+
+        # Level 0 was measured over budget, so headroom at level 1 is not enough to go back
+        self.assertEqual(self.feed(governor, 0.02, 10), 0)
+        self.assertEqual(self.feed(governor, 0.02, 5), 1)
+        self.assertEqual(governor.level, 0)
+
+        governor.level = 1
+        governor._costs[0] = None
+        self.assertEqual(self.feed(governor, 0.02, 5), 1)
+        self.assertEqual(governor.adjustments[-1]["reason"], "headroom")
+
+    def test_decimation(self):
+        governor = QualityGovernor(target_fps=10, levels=LEVELS)
+        governor.level = 2
+
+        self.assertEqual([governor.should_process() for _ in range(4)], [False, True, False, True])
+        self.assertAlmostEqual(governor.budget, 0.2)
+
+    def test_log_is_stored_with_the_test(self):
+        governor = QualityGovernor(levels=LEVELS, camera="head")
+        governor.restart_log()
+
+        adjustment, = governor.adjustments
+        self.assertEqual((adjustment["reason"], adjustment["level"], adjustment["camera"]), ("test start", 0, "head"))
+        document = build_test_document([], {}, 1, "arm", quality_adjustments=governor.adjustments)
+        self.assertEqual(document["quality_adjustments"], governor.adjustments)
+        self.assertNotIn("quality_adjustments", build_test_document([], {}, 1, "arm"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from RMI_Simulator.Instrumentation import STAGES, LatencyTracker, format_latency
+from RMI_Simulator.Motion import FramePacket
+
+
+def stamped_packet(captured_at, started, finished):
+    packet = FramePacket(np.zeros((2, 2, 3), dtype=np.uint8), captured_at)
+    packet.processing_started = started
+    packet.processing_finished = finished
+    return packet
+
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_stage_latencies(self):
+        tracker = LatencyTracker()
+        tracker.record(stamped_packet(0.0, 0.010, 0.030), displayed_at=0.035)
+
+        stats = tracker.percentiles()
+
+        self.assertAlmostEqual(stats["queue"]["p50"], 10.0)
+        self.assertAlmostEqual(stats["process"]["p50"], 20.0)
+        self.assertAlmostEqual(stats["display"]["p99"], 5.0)
+        self.assertAlmostEqual(stats["total"]["p95"], 35.0)
+
+    def test_rolling_window(self):
+        tracker = LatencyTracker(window=100)
+        for i in range(300):
+            total = 1.0 if i < 200 else 0.010
+            tracker.record(stamped_packet(0.0, 0.0, 0.0), displayed_at=total)
+
+        stats = tracker.percentiles()
+
+        self.assertEqual(tracker.count, 300)
+        self.assertAlmostEqual(stats["total"]["p99"], 10.0)
+
+    def test_percentiles(self):
+        tracker = LatencyTracker()
+        for ms in range(1, 101):
+            tracker.record(stamped_packet(0.0, 0.0, 0.0), displayed_at=ms / 1000.0)
+
+        total = tracker.percentiles()["total"]
+
+        self.assertAlmostEqual(total["p50"], 50.5)
+        self.assertAlmostEqual(total["p95"], 95.05)
+        self.assertAlmostEqual(total["p99"], 99.01)
+
+    def test_unprocessed_packet_is_ignored(self):
+        tracker = LatencyTracker()
+        tracker.record(FramePacket(np.zeros((2, 2, 3), dtype=np.uint8)))
+
+        self.assertEqual(tracker.count, 0)
+        self.assertEqual(set(tracker.percentiles()), set(STAGES))
+
+    def test_format(self):
+        stats = LatencyTracker().percentiles()
+        stats.update({"superseded": 2, "dropped": 1})
+        self.assertIn("drop 3", format_latency(stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 import unittest
 from unittest.mock import patch, MagicMock
+
+import pyaudio
+
+from RMI_Simulator.Audio import LoopbackStandIn
 from RMI_Simulator.MRI_Test import MicrophoneRecorder
 
 class TestMicrophoneRecorder(unittest.TestCase):
@@ -17,5 +21,29 @@ class TestMicrophoneRecorder(unittest.TestCase):
         recorder.close()
         mock_audio.terminate.assert_called_once()
 
+    @patch('pyaudio.PyAudio')
+    def test_callback_plays_input_back(self, MockPyAudio):
+        recorder = MicrophoneRecorder(frames_per_buffer=128)
+        self.assertEqual(MockPyAudio.return_value.open.call_args.kwargs["frames_per_buffer"], 128)
+        recorder.start()
+        recorder.stream.start_stream.assert_called_once()
+
+        self.assertEqual(recorder._callback(b"\1\0" * 128, 128, {}, 0), (b"\1\0" * 128, pyaudio.paContinue))
+        recorder._callback(b"\0\0" * 128, 128, {}, 2)
+        self.assertEqual(recorder.status_count, 1)
+
+    @patch('pyaudio.PyAudio')
+    def test_latency_self_test(self, MockPyAudio):
+        recorder = MicrophoneRecorder(frames_per_buffer=256)
+        recorder.start()
+
+        result = recorder.measure_latency(LoopbackStandIn(delay=0.01))
+
+        self.assertAlmostEqual(result["latency_ms"], 1000.0 * (441 + 2 * 256) / 44100, places=3)
+        self.assertAlmostEqual(result["latency_ms"], result["reported_ms"], places=3)
+        # The talk-back stream is opened again and restarted
+        self.assertEqual(MockPyAudio.return_value.open.call_count, 2)
+        self.assertTrue(recorder.recording)
+
 if __name__ == '__main__':
     unittest.main()
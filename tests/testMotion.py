@@ -0,0 +1,244 @@
+import tracemalloc
+import unittest
+
+import cv2
+import numpy as np
+
+from RMI_Simulator.Calibration import calibrate_analysis_scales
+from RMI_Simulator.Motion import (FlowWorkspace, FramePacket, StaticFrameFilter, ZoneGrid, analysis_scale_for_level,
+                                  analysis_size, render_flow_overlay)
+
+
+def preprocess_frame(frame, analysis_scale=1.0):
+    """The straightforward preprocessing FlowWorkspace.preprocess is checked against.
+
+    Args:
+        frame (np.ndarray): The BGR frame captured by the camera.
+        analysis_scale (float): The scale factor applied before blurring, e.g. 0.5 for half resolution.
+
+    Returns:
+        np.ndarray: The preprocessed grayscale image at the analysis resolution.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if analysis_scale != 1.0:
+        gray = cv2.resize(gray, analysis_size(frame.shape, analysis_scale), interpolation=cv2.INTER_AREA)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.convertScaleAbs(gray, alpha=1, beta=-50)
+
+
+def flow_magnitude(prev_gray, gray, analysis_scale=1.0):
+    """The straightforward Farneback flow magnitude FlowWorkspace.flow_magnitude is checked against.
+
+    The magnitude is expressed in full resolution pixels whatever the analysis scale.
+
+    Args:
+        prev_gray (np.ndarray): The previous preprocessed grayscale image.
+        gray (np.ndarray): The current preprocessed grayscale image.
+        analysis_scale (float): The scale both images were preprocessed at.
+
+    Returns:
+        np.ndarray: The per-pixel flow magnitude at the analysis resolution.
+    """
+    flow = cv2.calcOpticalFlowFarneback(prev_gray, gray, None, 0.5, 3, 15, 6, 5, 1.2, 0)
+    magnitude, _ = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+    if analysis_scale != 1.0:
+        magnitude /= analysis_scale
+    return magnitude
+
+
+def textured_frames(shift, width=704, height=576):
+    """Builds two textured frames, the second one shifted horizontally by `shift` pixels."""
+    rng = np.random.default_rng(0)
+    margin = 20
+    texture = rng.integers(0, 256, (height + 2 * margin, width + 2 * margin, 3), dtype=np.uint8)
+    texture = cv2.GaussianBlur(texture, (7, 7), 0)
+    first = texture[margin:margin + height, margin:margin + width]
+    second = texture[margin:margin + height, margin - shift:margin - shift + width]
+    return np.ascontiguousarray(first), np.ascontiguousarray(second)
+
+
+class TestAnalysisScale(unittest.TestCase):
+
+    def test_pyramid_level(self):
+        self.assertEqual(analysis_scale_for_level(0), 1.0)
+        self.assertEqual(analysis_scale_for_level(2), 0.25)
+
+    def test_preprocess_downsamples(self):
+        frame, _ = textured_frames(0)
+        gray = preprocess_frame(frame, 0.5)
+        self.assertEqual(gray.shape, (288, 352))
+        self.assertEqual(gray.dtype, np.uint8)
+
+    def test_magnitude_in_full_resolution_pixels(self):
+        """The movement value stays comparable whatever the analysis scale."""
+        first, second = textured_frames(4)
+        full = flow_magnitude(preprocess_frame(first), preprocess_frame(second)).mean()
+        half = flow_magnitude(preprocess_frame(first, 0.5), preprocess_frame(second, 0.5), 0.5).mean()
+        self.assertAlmostEqual(full, 4, delta=0.5)
+        self.assertAlmostEqual(half, full, delta=0.5)
+
+    def test_calibration_reports_each_scale(self):
+        first, second = textured_frames(4)
+        results = calibrate_analysis_scales([first, second, first], scales=(1.0, 0.5))
+
+        self.assertEqual([result["analysis_scale"] for result in results], [1.0, 0.5])
+        self.assertEqual(results[0]["mean_abs_error"], 0.0)
+        self.assertEqual(results[0]["speedup"], 1.0)
+        self.assertGreater(results[1]["speedup"], 1.0)
+
+    def test_invalid_scale(self):
+        frame, _ = textured_frames(0)
+        with self.assertRaises(ValueError):
+            calibrate_analysis_scales([frame, frame], scales=(1.5,))
+
+
+class TestFramePacket(unittest.TestCase):
+
+    def test_preprocessed_once(self):
+        frame, _ = textured_frames(0)
+        packet = FramePacket(frame)
+        workspace = FlowWorkspace(0.5)
+
+        gray = packet.preprocessed(workspace)
+
+        self.assertIs(packet.preprocessed(workspace), gray)
+        np.testing.assert_array_equal(gray, preprocess_frame(frame, 0.5))
+        workspace.analysis_scale = 1.0
+        self.assertEqual(packet.preprocessed(workspace).shape, (576, 704))
+
+
+class TestFlowWorkspace(unittest.TestCase):
+
+    def test_matches_reference_implementation(self):
+        first, second = textured_frames(4, 352, 288)
+        workspace = FlowWorkspace(0.5)
+
+        prev_gray = workspace.preprocess(first)
+        gray = workspace.preprocess(second)
+        np.testing.assert_array_equal(prev_gray, preprocess_frame(first, 0.5))
+        np.testing.assert_array_equal(gray, preprocess_frame(second, 0.5))
+
+        expected = flow_magnitude(preprocess_frame(first, 0.5), preprocess_frame(second, 0.5), 0.5)
+        np.testing.assert_allclose(workspace.flow_magnitude(prev_gray, gray), expected, atol=1e-4)
+
+    def test_warm_start(self):
+        first, second = textured_frames(2, 176, 144)
+        workspace = FlowWorkspace(warm_start=True)
+        prev_gray = workspace.preprocess(first)
+        gray = workspace.preprocess(second)
+
+        cold = workspace.flow_magnitude(prev_gray, gray).mean()
+        warm = workspace.flow_magnitude(prev_gray, gray).mean()
+
+        self.assertAlmostEqual(warm, cold, delta=0.2)
+
+    def test_steady_state_does_not_allocate(self):
+        """After the first frames, the hot loop reuses its buffers instead of allocating new arrays."""
+        frames = [textured_frames(shift, 352, 288)[1] for shift in range(0, 20, 2)]
+        workspace = FlowWorkspace(warm_start=True)
+        prev_gray = None
+        for frame in frames[:3]:
+            gray = workspace.preprocess(frame)
+            if prev_gray is not None:
+                workspace.flow_magnitude(prev_gray, gray)
+            prev_gray = gray
+
+        tracemalloc.start()
+        try:
+            start, _ = tracemalloc.get_traced_memory()
+            for frame in frames[3:]:
+                gray = workspace.preprocess(frame)
+                workspace.flow_magnitude(prev_gray, gray)
+                prev_gray = gray
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        per_frame = (peak - start) / len(frames[3:])
+        # A single preprocessed 352x288 image alone is about 100 KB
+        self.assertLess(per_frame, 1024)
+
+
+class TestZoneGrid(unittest.TestCase):
+
+    def test_zone_means(self):
+        motion_map = np.random.default_rng(0).random((288, 352), dtype=np.float32)
+        zones = ZoneGrid(3, 4).reduce(motion_map)
+
+        expected = motion_map.reshape(3, 96, 4, 88).mean(axis=(1, 3))
+        np.testing.assert_allclose(zones, expected, rtol=1e-5)
+
+    def test_localised_motion(self):
+        """Motion in one corner only shows up in that zone."""
+        motion_map = np.zeros((90, 120), dtype=np.uint8)
+        motion_map[:30, 80:] = 255
+
+        zones = ZoneGrid(3, 3).reduce(motion_map, 100.0 / 255.0)
+
+        self.assertAlmostEqual(zones[0, 2], 100.0, places=3)
+        self.assertEqual(np.count_nonzero(zones), 1)
+
+    def test_reuses_buffers(self):
+        grid = ZoneGrid(2, 2)
+        motion_map = np.ones((48, 64), dtype=np.uint8)
+        first = grid.reduce(motion_map)
+        self.assertIs(grid.reduce(motion_map), first)
+
+    def test_invalid_grid(self):
+        with self.assertRaises(ValueError):
+            ZoneGrid(0, 3)
+
+
+class TestStaticFrameFilter(unittest.TestCase):
+
+    def gray_frames(self, shift, noise=0.0):
+        """Preprocesses two textured frames, adding Gaussian noise to the second one."""
+        first, second = textured_frames(shift)
+        if noise:
+            second = cv2.add(second, np.random.default_rng(1).normal(0, noise, second.shape), dtype=cv2.CV_8U)
+        return preprocess_frame(first), preprocess_frame(second)
+
+    def test_static_and_moving(self):
+        static_filter = StaticFrameFilter()
+        self.assertTrue(static_filter.is_static(*self.gray_frames(0, noise=2.0)))
+        self.assertFalse(static_filter.is_static(*self.gray_frames(3)))
+        self.assertEqual(static_filter.stats(), {"skipped": 1, "analysed": 1})
+
+        static_filter.reset_counts()
+        self.assertEqual(static_filter.stats(), {"skipped": 0, "analysed": 0})
+
+    def test_small_movement_is_not_diluted(self):
+        prev_gray, gray = self.gray_frames(0)
+        gray = gray.copy()
+        # A movement covering a few blocks of the frame
+        gray[100:130, 200:230] = prev_gray[100:130, 210:240]
+
+        self.assertFalse(StaticFrameFilter().is_static(prev_gray, gray))
+
+    def test_reference_is_reused_until_forgotten(self):
+        prev_gray, gray = self.gray_frames(3)
+        static_filter = StaticFrameFilter()
+        static_filter.is_static(prev_gray, gray)
+        # The buffer of the last frame is overwritten, e.g. by frames that did not go through the filter
+        gray[:] = prev_gray
+        static_filter.forget_reference()
+
+        self.assertTrue(static_filter.is_static(gray, prev_gray))
+
+
+class TestFlowOverlay(unittest.TestCase):
+
+    def test_overlay_matches_frame(self):
+        """The overlay is rendered at the frame size whatever the magnitude resolution."""
+        frame, _ = textured_frames(0, 64, 48)
+        magnitude = np.zeros((24, 32), dtype=np.float32)
+        magnitude[:, 16:] = 5.0
+
+        overlay = render_flow_overlay(frame, magnitude)
+
+        self.assertEqual(overlay.shape, frame.shape)
+        self.assertEqual(overlay.dtype, np.uint8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import datetime
+import sys
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from RMI_Simulator.MovementEvents import EpisodeSegmenter, MovementEventBuffer, merge_camera_episodes
+
+
+class TestMovementEventBuffer(unittest.TestCase):
+
+    def test_grows_and_keeps_events(self):
+        buffer = MovementEventBuffer(capacity=2)
+        for value in range(5):
+            buffer.append(float(value))
+
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.capacity, 8)
+        np.testing.assert_array_equal(buffer.events["value"], np.arange(5, dtype=np.float32))
+
+    def test_documents(self):
+        buffer = MovementEventBuffer(zone_shape=(2, 2))
+        zones = np.array([[0.0, 1.0], [2.0, 3.5]], dtype=np.float32)
+        buffer.append(4.5, zones, time_ns=buffer.start_ns + 1_500_000_000)
+        buffer.append(3.25, np.zeros((3, 3), dtype=np.float32), time_ns=buffer.start_ns + 2_000_000_000)
+
+        first, second = buffer.to_documents()
+
+        self.assertEqual(first, {
+            "movement_detected": True,
+            "movement_value": 4.5,
+            "timestamp": buffer.start_time + datetime.timedelta(seconds=1.5),
+            "zones": [[0.0, 1.0], [2.0, 3.5]],
+        })
+        # Zones of another grid are not stored
+        self.assertNotIn("zones", second)
+        self.assertEqual(second["timestamp"] - first["timestamp"], datetime.timedelta(seconds=0.5))
+
+    def test_clear(self):
+        buffer = MovementEventBuffer(capacity=4)
+        buffer.append(1.0)
+        buffer.clear()
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.to_documents(), [])
+        self.assertEqual(buffer.capacity, 4)
+
+    def test_memory_per_event(self):
+        """An event takes an order of magnitude less memory than a movement dict with a datetime."""
+        zones = np.ones((3, 3), dtype=np.float32)
+        document = {"movement_detected": True, "movement_value": 1.0,
+                    "timestamp": datetime.datetime.utcnow(), "zones": zones.tolist()}
+        document_size = (sys.getsizeof(document) + sys.getsizeof(document["timestamp"])
+                         + sys.getsizeof(document["movement_value"]) + sys.getsizeof(document["zones"])
+                         + sum(sys.getsizeof(row) + 3 * sys.getsizeof(1.0) for row in document["zones"]))
+
+        buffer = MovementEventBuffer(capacity=10000)
+        tracemalloc.start()
+        try:
+            start, _ = tracemalloc.get_traced_memory()
+            for _ in range(10000):
+                buffer.append(1.0, zones)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertLessEqual(buffer.events.dtype.itemsize * 10, document_size)
+        self.assertLess((peak - start) / 10000, 100)
+
+
+def feed(segmenter, values, threshold=1.0, fps=10):
+    """Feeds a movement signal to a segmenter, one frame every 1 / fps seconds."""
+    start_ns = segmenter.frames.start_ns
+    return [segmenter.append(value, threshold, time_ns=start_ns + index * 1_000_000_000 // fps)
+            for index, value in enumerate(values)]
+
+
+class TestEpisodeSegmenter(unittest.TestCase):
+
+    def test_hysteresis_keeps_one_episode(self):
+        segmenter = EpisodeSegmenter(off_ratio=0.5, min_gap=0.25)
+        # Hovers around the threshold, then stays still for longer than the gap
+        opened = feed(segmenter, [0.0, 1.5, 0.8, 1.2, 0.6, 2.0, 0.1, 0.1, 0.1, 0.1])
+
+        self.assertEqual(opened.count(True), 1)
+        self.assertEqual(segmenter.episodes, [(1, 5)])
+
+        episode, = segmenter.to_documents()
+        self.assertEqual(episode["frames"], 5)
+        self.assertAlmostEqual(episode["duration_s"], 0.4)
+        self.assertAlmostEqual(episode["peak"], 2.0)
+        self.assertAlmostEqual(episode["integral"], (1.5 + 0.8 + 1.2 + 0.6 + 2.0) * 0.1, places=5)
+        self.assertEqual(episode["end"] - episode["start"], datetime.timedelta(seconds=0.4))
+
+    def test_gap_splits_episodes(self):
+        segmenter = EpisodeSegmenter(off_ratio=0.5, min_gap=0.25)
+        feed(segmenter, [2.0, 0.0, 0.0, 0.0, 2.0, 0.0, 2.0])
+
+        # The last two movements are closer than the gap, and the last episode is still open
+        self.assertEqual(len(segmenter), 2)
+        self.assertEqual([document["frames"] for document in segmenter.to_documents()], [1, 3])
+
+    def test_no_threshold_and_clear(self):
+        segmenter = EpisodeSegmenter()
+        feed(segmenter, [5.0, 5.0], threshold=None)
+        self.assertEqual(segmenter.to_documents(), [])
+
+        feed(segmenter, [5.0])
+        segmenter.clear()
+        self.assertEqual(len(segmenter), 0)
+        self.assertEqual(len(segmenter.frames), 0)
+
+    def test_zones_are_averaged(self):
+        segmenter = EpisodeSegmenter(zone_shape=(1, 2))
+        segmenter.append(2.0, 1.0, np.array([[1.0, 0.0]], dtype=np.float32))
+        segmenter.append(2.0, 1.0, np.array([[3.0, 2.0]], dtype=np.float32))
+
+        self.assertEqual(segmenter.to_documents()[0]["zones"], [[2.0, 1.0]])
+
+
+class TestMergeCameraEpisodes(unittest.TestCase):
+
+    def episode(self, start, end, peak):
+        origin = datetime.datetime(2024, 8, 19, 11, 0, 0)
+        return {"start": origin + datetime.timedelta(seconds=start), "end": origin + datetime.timedelta(seconds=end),
+                "duration_s": float(end - start), "peak": peak, "integral": 1.0, "frames": 3}
+
+    def test_single_camera_unchanged(self):
+        episodes = [self.episode(0, 1, 2.0)]
+        self.assertEqual(merge_camera_episodes({None: episodes}), episodes)
+
+    def test_overlapping_episodes_are_one_movement(self):
+        merged = merge_camera_episodes({
+            "head": [self.episode(0, 2, 1.0), self.episode(10, 11, 1.5)],
+            "body": [self.episode(1, 3, 4.0)],
+        })
+
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(merged[0]["cameras"], ["head", "body"])
+        self.assertEqual(merged[0]["duration_s"], 3.0)
+        self.assertEqual(merged[0]["peak"], 4.0)
+        self.assertEqual(merged[0]["integral"], 2.0)
+        self.assertEqual(merged[0]["frames"], 6)
+        # Merged episodes have every field of a single camera episode
+        self.assertLessEqual(set(self.episode(0, 1, 2.0)), set(merged[1]))
+        self.assertEqual([episode["camera"] for episode in merged[0]["episodes"]], ["head", "body"])
+        self.assertEqual(merged[1]["cameras"], ["head"])
+
+
+if __name__ == '__main__':
+    unittest.main()
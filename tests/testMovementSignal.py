@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from RMI_Simulator.MovementSignal import (AdaptiveThreshold, EMASmoother, MedianSmoother, SavitzkyGolaySmoother,
+                                          create_smoother)
+from RMI_Simulator.database import MovementData
+
+
+class TestAdaptiveThreshold(unittest.TestCase):
+
+    def test_welford_matches_batch_statistics(self):
+        values = np.random.default_rng(0).normal(0.4, 0.1, 200)
+        adaptive = AdaptiveThreshold(k=3, calibration_frames=200, default=3.0)
+
+        for value in values[:-1]:
+            self.assertEqual(adaptive.update(value), 3.0)
+        threshold = adaptive.update(values[-1])
+
+        self.assertTrue(adaptive.calibrated)
+        self.assertAlmostEqual(adaptive.mean, values.mean())
+        self.assertAlmostEqual(adaptive.sigma, values.std(ddof=1))
+        self.assertAlmostEqual(threshold, values.mean() + 3 * values.std(ddof=1))
+
+    def test_frozen_after_calibration(self):
+        adaptive = AdaptiveThreshold(k=2, calibration_frames=3)
+        for value in (1.0, 1.2, 0.8):
+            adaptive.update(value)
+
+        self.assertAlmostEqual(adaptive.update(50.0), 1.4)
+        self.assertEqual(adaptive.count, 3)
+
+    def test_sigma_floor(self):
+        adaptive = AdaptiveThreshold(k=3, calibration_frames=5, min_sigma=0.1)
+        for _ in range(5):
+            adaptive.update(0.5)
+        self.assertAlmostEqual(adaptive.threshold, 0.8)
+
+    def test_round_trip(self):
+        adaptive = AdaptiveThreshold(k=3, calibration_frames=4)
+        for value in (0.1, 0.3, 0.2, 0.4):
+            adaptive.update(value)
+
+        restored = AdaptiveThreshold.from_dict(adaptive.to_dict(), k=3)
+
+        self.assertTrue(restored.calibrated)
+        self.assertAlmostEqual(restored.threshold, adaptive.threshold)
+
+    def test_restart(self):
+        adaptive = AdaptiveThreshold(calibration_frames=2, default=1.0)
+        adaptive.update(0.1)
+        adaptive.update(0.2)
+        adaptive.restart()
+        self.assertFalse(adaptive.calibrated)
+        self.assertEqual(adaptive.threshold, 1.0)
+
+
+class TestMovementBaseline(unittest.TestCase):
+
+    def setUp(self):
+        self.participants = MagicMock()
+        self.movement_data = MovementData(MagicMock(), {'PARTICIPANTS': self.participants})
+
+    def test_save_baseline(self):
+        baseline = {"mean": 0.2, "sigma": 0.05, "count": 90}
+        self.movement_data.save_movement_baseline('participant1', 'dis', baseline)
+
+        self.participants.update_one.assert_called_once_with(
+            {'id': 'participant1'}, {'$set': {'movement_baseline.dis': baseline}})
+
+    def test_get_baseline(self):
+        self.participants.find_one.return_value = {'id': 'participant1', 'movement_baseline': {'dis': {"mean": 1}}}
+
+        self.assertEqual(self.movement_data.get_movement_baseline('participant1', 'dis'), {"mean": 1})
+        self.assertIsNone(self.movement_data.get_movement_baseline('participant1', 'farneback'))
+
+        self.participants.find_one.return_value = None
+        self.assertIsNone(self.movement_data.get_movement_baseline('participant2', 'dis'))
+
+
+class TestSmoothers(unittest.TestCase):
+
+    def test_median_rejects_spikes(self):
+        smoother = MedianSmoother(window=3)
+        smoothed = [smoother.update(value) for value in (0.0, 0.0, 9.0, 0.0, 0.0, 5.0, 5.0, 5.0)]
+
+        self.assertEqual(smoothed, [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 5.0, 5.0])
+        self.assertEqual(smoother.latency_frames, 1.0)
+
+    def test_ema(self):
+        smoother = EMASmoother(alpha=0.5)
+        self.assertEqual([smoother.update(value) for value in (4.0, 0.0, 0.0)], [4.0, 2.0, 1.0])
+        self.assertAlmostEqual(smoother.latency_ms(30), 1000 / 30)
+
+        smoother.reset()
+        self.assertEqual(smoother.update(3.0), 3.0)
+
+    def test_savitzky_golay_follows_ramps_without_lag(self):
+        smoother = SavitzkyGolaySmoother(window=7, order=2)
+        ramp = [smoother.update(0.5 * frame) for frame in range(20)]
+
+        np.testing.assert_allclose(ramp, 0.5 * np.arange(20), atol=1e-9)
+        self.assertEqual(smoother.latency_frames, 0.0)
+
+        # Noise is reduced once the window is full
+        noise = np.random.default_rng(0).normal(0.0, 1.0, 500)
+        smoothed = [smoother.update(value) for value in noise][50:]
+        self.assertLess(np.std(smoothed), np.std(noise))
+
+    def test_create_smoother(self):
+        self.assertEqual(create_smoother("none").update(2.5), 2.5)
+        self.assertEqual(create_smoother("median", window=9).latency_frames, 4.0)
+        with self.assertRaises(ValueError):
+            create_smoother("kalman")
+
+
+if __name__ == '__main__':
+    unittest.main()
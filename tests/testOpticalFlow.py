@@ -1,10 +1,17 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
 import numpy as np
-from PyQt5.QtWidgets import QWidget, QApplication
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QMouseEvent
+from PyQt5.QtWidgets import QLabel, QWidget, QApplication
 
-from RMI_Simulator.MRI_Test import OpticalFlowApp
+from RMI_Simulator.Estimators import ESTIMATORS
+from RMI_Simulator.MRI_Test import OpticalFlowApp, RegionEditor, ViewfinderRenderer
+from RMI_Simulator.Motion import FramePacket
+from RMI_Simulator.ROI import HeadTracker
 
 # Ensure that a QApplication exists
 app = QApplication([])
@@ -21,6 +28,9 @@ class TestOpticalFlowApp(unittest.TestCase):
         parent_widget = QWidget()  # or an instance of a QWidget subclass
         self.optical_flow_app = OpticalFlowApp(parent, parent_widget)
 
+    def tearDown(self):
+        self.optical_flow_app.close()
+
     def test_init(self):
         self.assertIsNotNone(self.optical_flow_app.parent_widget)
 
@@ -58,6 +68,349 @@ class TestOpticalFlowApp(unittest.TestCase):
 
         mock_process_optical_flow.assert_called_once_with(frame, None)
 
+    def test_process_frame_reuses_preprocessed_reference(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        packet = FramePacket(np.zeros((576, 704, 3), dtype=np.uint8))
+        self.optical_flow_app.process_thread.processed_frame_signal.disconnect()
+
+        self.optical_flow_app.process_thread.process_frame(packet)
+
+        self.assertIs(self.optical_flow_app.prev_gray, packet.gray)
+
+    def test_flow_overlay_is_opt_in(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+        self.optical_flow_app.process_optical_flow(frame, prev_gray)
+        self.assertIsNone(self.optical_flow_app.overlay_magnitude)
+
+        self.optical_flow_app.set_flow_overlay(True)
+        self.optical_flow_app.process_optical_flow(frame, prev_gray)
+        self.assertEqual(self.optical_flow_app.overlay_magnitude.shape, (576, 704))
+
+        self.optical_flow_app.set_flow_overlay(False)
+        self.assertIsNone(self.optical_flow_app.overlay_magnitude)
+
+    def test_zone_breakdown(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_zone_grid(2, 3)
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+        self.assertIsNone(self.optical_flow_app.frame_zones)
+
+        self.optical_flow_app.process_optical_flow(frame, prev_gray)
+
+        self.assertEqual(self.optical_flow_app.frame_zones.shape, (2, 3))
+
+    def test_latency_stamps(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        packet = FramePacket(np.zeros((576, 704, 3), dtype=np.uint8))
+        packets = []
+        self.optical_flow_app.process_thread.processed_frame_signal.disconnect()
+        self.optical_flow_app.process_thread.packet_signal.connect(packets.append)
+
+        self.optical_flow_app.process_thread.process_frame(packet)
+
+        self.assertEqual(packets, [packet])
+        self.assertLessEqual(packet.captured_at, packet.processing_started)
+        self.assertLessEqual(packet.processing_started, packet.processing_finished)
+        self.optical_flow_app.latency.record(packet)
+        stats = self.optical_flow_app.latency_stats()
+        self.assertEqual(stats["displayed"], 1)
+        self.assertGreaterEqual(stats["total"]["p50"], stats["process"]["p50"])
+
+    def test_viewfinder_renders_at_label_size(self):
+        host = QWidget()
+        host.viewfinder = QLabel(host)
+        renderer = ViewfinderRenderer(host.viewfinder, refresh_rate=50)
+        frame = np.full((576, 704, 3), (255, 0, 0), dtype=np.uint8)
+
+        self.assertTrue(renderer.due(0.0))
+        renderer.render(frame, text="p50 1 ms")
+        buffer = renderer.buffer
+
+        self.assertFalse(renderer.due(0.01))
+        self.assertTrue(renderer.due(0.03))
+        renderer.render(frame)
+        self.assertIs(renderer.buffer, buffer)
+        self.assertEqual(renderer.buffer.shape, (220, 200, 3))
+        self.assertEqual(renderer.throttled_count, 1)
+        self.assertEqual(host.viewfinder.pixmap().size().width(), 200)
+        # The QImage is in BGR order, so blue stays blue without a channel swap
+        self.assertEqual(renderer.image.pixelColor(100, 110).blue(), 255)
+
+    def test_set_estimator(self):
+        self.optical_flow_app.set_estimator("absdiff")
+
+        self.assertEqual(self.optical_flow_app.estimator.name, "absdiff")
+        self.assertIs(self.optical_flow_app.estimator.workspace, self.optical_flow_app.workspace)
+        self.assertEqual(self.optical_flow_app.threshold, self.optical_flow_app.estimator.default_threshold)
+
+    def test_adaptive_threshold(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.start_calibration(2, calibration_frames=3)
+        for value in (0.2, 0.4, 0.3):
+            self.optical_flow_app.update_threshold(value)
+
+        self.assertAlmostEqual(self.optical_flow_app.threshold, 0.5)
+        self.assertAlmostEqual(self.optical_flow_app.parent_widget.threshold, 0.5)
+
+        self.optical_flow_app.start_calibration(3, {"mean": 1.0, "sigma": 0.5, "count": 90})
+        self.assertAlmostEqual(self.optical_flow_app.threshold, 2.5)
+
+        self.optical_flow_app.set_estimator("absdiff")
+        self.assertIsNone(self.optical_flow_app.adaptive_threshold)
+
+    def test_smoothing_before_detection(self):
+        self.optical_flow_app.threshold = 1.0
+        self.optical_flow_app.set_smoother("median", window=3)
+
+        detected = [self.optical_flow_app.filter_movement(value)[0] for value in (0.0, 4.0, 0.0, 4.0, 4.0)]
+
+        self.assertEqual(detected, [False, False, False, True, True])
+
+    def test_smoothing_has_its_own_baseline(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.start_calibration(3.0, {"mean": 0.5, "sigma": 0.1, "count": 90})
+        self.assertTrue(self.optical_flow_app.adaptive_threshold.calibrated)
+
+        self.optical_flow_app.set_smoother("ema")
+
+        self.assertEqual(self.optical_flow_app.baseline_key, "farneback_ema")
+        # The baseline of the raw values does not hold for smoothed ones
+        self.assertFalse(self.optical_flow_app.adaptive_threshold.calibrated)
+        self.assertEqual(self.optical_flow_app.adaptive_threshold.k, 3.0)
+
+    def test_camera_pipeline(self):
+        parent_widget = QWidget()
+        parent_widget.collect_movement_data = True
+        parent_widget.movement_count = 0
+        parent_widget.threshold = None
+        viewfinder = QLabel()
+        body_app = OpticalFlowApp(None, parent_widget, camera="body", viewfinder=viewfinder, show_status=False)
+        try:
+            body_app.threshold = 1.0
+            packet = FramePacket(np.zeros((576, 704, 3), dtype=np.uint8))
+            body_app.receive_packet(packet)
+            body_app.display_frame(packet.image, True, 2.0)
+
+            self.assertEqual(parent_widget.movement_count, 1)
+            self.assertEqual(body_app.test_data.frames.events["time_ns"][0], packet.captured_ns)
+            self.assertIs(body_app.viewfinder_renderer.label, viewfinder)
+            self.assertEqual(body_app.baseline_key, "farneback_body")
+            self.assertEqual(self.optical_flow_app.baseline_key, "farneback")
+
+            # Each camera adapts its own threshold, only the one the labels follow is shown
+            self.optical_flow_app.parent_widget = parent_widget
+            self.optical_flow_app.start_calibration(3.0, {"mean": 1.0, "sigma": 0.5, "count": 90})
+            body_app.start_calibration(3.0, {"mean": 4.0, "sigma": 1.0, "count": 90})
+            self.assertEqual(body_app.threshold, 7.0)
+            self.assertEqual(self.optical_flow_app.threshold, 2.5)
+            self.assertEqual(parent_widget.threshold, 2.5)
+        finally:
+            body_app.close()
+
+    def test_records_at_capture_rate(self):
+        capture_thread = self.optical_flow_app.capture_thread
+        self.assertEqual(capture_thread.fps, capture_thread.source.fps)
+        capture_thread.measured_fps = 45.0
+        with tempfile.TemporaryDirectory() as directory:
+            self.optical_flow_app.start_recording(os.path.join(directory, "session.avi"))
+            self.optical_flow_app.stop_recording()
+
+        self.assertEqual(self.optical_flow_app.recorder.fps, 45.0)
+
+    def test_governor_decimates_frames(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_governor(30)
+        self.assertEqual(self.optical_flow_app.workspace.analysis_scale, 1.0)
+        governor = self.optical_flow_app.governor
+        governor.level = len(governor.levels) - 1
+        self.optical_flow_app.apply_quality(governor.settings)
+        packets = []
+        self.optical_flow_app.process_thread.processed_frame_signal.disconnect()
+        self.optical_flow_app.process_thread.packet_signal.connect(packets.append)
+
+        for _ in range(6):
+            self.optical_flow_app.process_thread.process_frame(FramePacket(np.zeros((576, 704, 3), dtype=np.uint8)))
+
+        # Every frame is still shown, only every third one is analysed
+        self.assertEqual(len(packets), 6)
+        self.assertEqual(governor._measured, 6 // governor.settings["decimation"])
+        self.assertEqual(self.optical_flow_app.workspace.analysis_scale, governor.settings["analysis_scale"])
+        self.assertEqual(self.optical_flow_app.workspace.levels, governor.settings["levels"])
+
+    def test_decimated_frames_show_the_last_result(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_governor(30)
+        governor = self.optical_flow_app.governor
+        governor.level = len(governor.levels) - 1
+        self.optical_flow_app.apply_quality(governor.settings)
+        process_thread = self.optical_flow_app.process_thread
+        process_thread.processed_frame_signal.disconnect()
+        results = []
+        process_thread.processed_frame_signal.connect(lambda image, detected, value: results.append((detected, value)))
+        still = np.zeros((576, 704, 3), dtype=np.uint8)
+        still[200:300, 100:200] = 255
+        moved = np.roll(still, 200, axis=1)
+
+        # The third and sixth frames are analysed, the sixth one against the moved square
+        for image in (still, still, still, still, still, moved, moved):
+            process_thread.process_frame(FramePacket(image.copy()))
+
+        self.assertEqual(len(results), 7)
+        self.assertEqual(results[:2], [(False, 0.0)] * 2)
+        self.assertEqual(results[3:5], [results[2]] * 2)
+        self.assertTrue(results[5][0])
+        self.assertEqual(results[6], results[5])
+
+    def test_stateful_engine_under_decimation(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_estimator("lk")
+        self.optical_flow_app.set_governor(30)
+        governor = self.optical_flow_app.governor
+        governor.level = len(governor.levels) - 2
+        self.optical_flow_app.apply_quality(governor.settings)
+        process_thread = self.optical_flow_app.process_thread
+        process_thread.processed_frame_signal.disconnect()
+        frame = np.random.default_rng(0).integers(0, 256, (576, 704, 3), dtype=np.uint8)
+
+        # Every second frame is analysed
+        for shift in (0, 8):
+            process_thread.process_frame(FramePacket(np.roll(frame, shift, axis=1)))
+        reference = self.optical_flow_app.prev_gray.copy()
+        process_thread.process_frame(FramePacket(np.roll(frame, 16, axis=1)))
+        # The reference stays the analysed frame the tracked corners were found in
+        self.assertTrue(np.array_equal(self.optical_flow_app.prev_gray, reference))
+
+        with patch.object(self.optical_flow_app.estimator, "reset") as reset:
+            governor.level = len(governor.levels) - 1
+            self.optical_flow_app.apply_quality(governor.settings)
+        reset.assert_called_once_with()
+
+    def test_static_filter_under_decimation(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_static_filter(4.0)
+        self.optical_flow_app.set_governor(30)
+        governor = self.optical_flow_app.governor
+        governor.level = len(governor.levels) - 1
+        self.optical_flow_app.apply_quality(governor.settings)
+        self.assertEqual(governor.settings["decimation"], 3)
+        self.optical_flow_app.process_thread.processed_frame_signal.disconnect()
+        still = np.zeros((576, 704, 3), dtype=np.uint8)
+        still[200:300, 100:200] = 255
+        moved = np.roll(still, 200, axis=1)
+
+        # Every third frame is analysed, each against the identical frame just before it
+        for image in (still, still, still, moved, moved, moved):
+            self.optical_flow_app.process_thread.process_frame(FramePacket(image.copy()))
+
+        self.assertEqual(self.optical_flow_app.static_filter.stats(), {"skipped": 2, "analysed": 0})
+        # Static frames are not measured by the governor
+        self.assertEqual(governor._measured, 0)
+
+    def test_static_frames_skip_motion_detection(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_static_filter(4.0)
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        frame[200:300, 300:400] = 255
+        prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+
+        _, movement_detected, movement_value = self.optical_flow_app.process_optical_flow(frame.copy(), prev_gray)
+
+        self.assertFalse(movement_detected)
+        self.assertEqual(movement_value, 0.0)
+        self.assertEqual(self.optical_flow_app.frame_stats()["static"], {"skipped": 1, "analysed": 0})
+
+    def test_head_region_restricts_motion_detection(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_head_tracking(None)
+        tracker = HeadTracker(detector=object())
+        tracker.smoother.roi = (320, 0, 384, 576)
+        self.optical_flow_app.head_tracker = tracker
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        frame[200:300, 50:150] = 255
+        moved = np.roll(frame, 20, axis=1)
+        prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+
+        gray, _, movement_value = self.optical_flow_app.process_optical_flow(moved, prev_gray)
+
+        # The square moves outside the head region
+        self.assertEqual(movement_value, 0.0)
+        self.assertEqual(gray.shape, (576, 704))
+        self.assertEqual(self.optical_flow_app.roi, tracker.roi)
+        self.assertEqual(self.optical_flow_app.estimator.motion_map.shape, (576, 384))
+
+    def test_preset_region_restricts_motion_detection(self):
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_roi_region((0.5, 0.0, 0.5, 1.0))
+        self.optical_flow_app.restart_roi_log()
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        frame[200:300, 50:150] = 255
+        prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+
+        _, _, movement_value = self.optical_flow_app.process_optical_flow(np.roll(frame, 20, axis=1), prev_gray)
+
+        self.assertEqual(movement_value, 0.0)
+        settings = self.optical_flow_app.roi_settings()
+        self.assertEqual((settings["region"], settings["edited"]), ([0.5, 0.0, 0.5, 1.0], False))
+        self.assertEqual([change["roi"] for change in settings["changes"]], [None, [352, 0, 352, 576]])
+
+    def test_every_engine_runs_on_a_region(self):
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        frame[200:300, 300:400] = 255
+        moved = np.roll(frame, 5, axis=1)
+        self.optical_flow_app.parent_widget.threshold = None
+        self.optical_flow_app.set_roi_region((0.25, 0.0, 0.5, 0.5))
+        for name in ESTIMATORS:
+            with self.subTest(engine=name):
+                self.optical_flow_app.set_estimator(name)
+                prev_gray, _, _ = self.optical_flow_app.process_optical_flow(frame, None)
+                self.optical_flow_app.process_optical_flow(moved, prev_gray)
+                _, _, movement_value = self.optical_flow_app.process_optical_flow(frame, prev_gray)
+
+                self.assertGreaterEqual(movement_value, 0.0)
+                if self.optical_flow_app.estimator.motion_map is not None:
+                    self.assertEqual(self.optical_flow_app.estimator.motion_map.shape, (288, 352))
+
+    def test_edited_region_replaces_head_tracking(self):
+        self.optical_flow_app.set_roi_region((0.5, 0.0, 0.5, 1.0))
+        self.optical_flow_app.set_head_tracking(50.0)
+
+        self.optical_flow_app.edit_roi_region((0.1, 0.1, 0.3, 0.3))
+        self.assertIsNone(self.optical_flow_app.head_tracker)
+        self.assertTrue(self.optical_flow_app.roi_settings()["edited"])
+
+        self.optical_flow_app.edit_roi_region(None)
+        self.assertEqual(self.optical_flow_app.roi_region, (0.5, 0.0, 0.5, 1.0))
+        self.assertFalse(self.optical_flow_app.roi_settings()["edited"])
+        # Going back to the preset follows the head again
+        self.assertEqual(self.optical_flow_app.head_tracker.rate, 50.0)
+        self.assertTrue(self.optical_flow_app.roi_settings()["head_tracking"])
+
+        self.optical_flow_app.set_head_tracking(None)
+        self.optical_flow_app.edit_roi_region(None)
+        self.assertIsNone(self.optical_flow_app.head_tracker)
+
+    def test_region_drawn_in_viewfinder(self):
+        label = QLabel()
+        label.setFixedSize(200, 100)
+        editor = RegionEditor(label)
+        regions = []
+        editor.region_edited.connect(regions.append)
+
+        for kind, position, buttons in ((QEvent.MouseButtonPress, QPoint(20, 10), Qt.LeftButton),
+                                        (QEvent.MouseMove, QPoint(80, 40), Qt.LeftButton),
+                                        (QEvent.MouseButtonRelease, QPoint(120, 60), Qt.NoButton)):
+            QApplication.sendEvent(label, QMouseEvent(kind, QPointF(position), Qt.LeftButton, buttons, Qt.NoModifier))
+            if kind == QEvent.MouseMove:
+                self.assertEqual(len(editor.dragged), 4)
+
+        self.assertEqual(len(regions), 1)
+        for value, expected in zip(regions[0], (0.1, 0.1, 0.5, 0.5)):
+            self.assertAlmostEqual(value, expected)
+        self.assertIsNone(editor.dragged)
+
     @patch('RMI_Simulator.RMI_Test.CaptureThread')
     def test_mapping(self, mock_capture_thread):
         parent = None
@@ -0,0 +1,95 @@
+import time
+import unittest
+
+import numpy as np
+
+from RMI_Simulator.ROI import ROI_PRESETS, HeadDetector, HeadTracker, RegionSmoother, fraction_roi, roi_slices
+
+
+class FixedDetector:
+    """A detector finding the same head in every frame, or none."""
+
+    def __init__(self, box):
+        self.box = box
+        self.frames = []
+
+    def detect(self, frame):
+        self.frames.append(frame)
+        return self.box
+
+
+class TestRegionSmoother(unittest.TestCase):
+
+    def test_padding_and_alignment(self):
+        smoother = RegionSmoother(padding=0.5, align=16)
+        roi = smoother.update((200, 100, 100, 100), (576, 704, 3))
+
+        self.assertEqual(roi, (144, 48, 208, 208))
+        self.assertTrue(all(value % 16 == 0 for value in roi))
+        # Clipped to the frame
+        smoother.reset()
+        self.assertEqual(smoother.update((0, 0, 100, 100), (576, 704, 3)), (0, 0, 160, 160))
+
+    def test_jitter_does_not_move_the_region(self):
+        smoother = RegionSmoother()
+        roi = smoother.update((200, 100, 100, 100), (576, 704, 3))
+        for dx in (6, -4, 5, -6):
+            self.assertEqual(smoother.update((200 + dx, 100, 100, 100), (576, 704, 3)), roi)
+
+        for _ in range(4):
+            moved = smoother.update((350, 250, 100, 100), (576, 704, 3))
+        self.assertNotEqual(moved, roi)
+
+    def test_lost_head_is_held_then_dropped(self):
+        smoother = RegionSmoother(hold=2)
+        roi = smoother.update((200, 100, 100, 100), (576, 704, 3))
+
+        self.assertEqual(smoother.update(None, (576, 704, 3)), roi)
+        self.assertEqual(smoother.update(None, (576, 704, 3)), roi)
+        self.assertIsNone(smoother.update(None, (576, 704, 3)))
+
+    def test_slices(self):
+        rows, cols = roi_slices((160, 48, 192, 208), 0.5)
+        self.assertEqual((rows, cols), (slice(24, 128), slice(80, 176)))
+
+
+class TestPresets(unittest.TestCase):
+
+    def test_fraction_roi(self):
+        self.assertEqual(fraction_roi((0.25, 0.0, 0.5, 0.5), (576, 704, 3)), (176, 0, 352, 288))
+        # Clipped to the frame
+        self.assertEqual(fraction_roi((0.5, 0.5, 1.0, 1.0), (576, 704, 3)), (352, 288, 352, 288))
+
+    def test_presets_lie_in_the_frame(self):
+        for body_part, (left, top, width, height) in ROI_PRESETS.items():
+            with self.subTest(body_part=body_part):
+                self.assertTrue(0.0 <= left and left + width <= 1.0 and 0.0 <= top and top + height <= 1.0)
+
+
+class TestHeadTracker(unittest.TestCase):
+
+    def test_no_head_in_texture(self):
+        frame = np.random.default_rng(0).integers(0, 256, (576, 704, 3), dtype=np.uint8)
+        self.assertIsNone(HeadDetector().detect(frame))
+
+    def test_tracks_latest_frame_on_its_thread(self):
+        detector = FixedDetector((200, 100, 100, 100))
+        tracker = HeadTracker(rate=50, detector=detector)
+        frame = np.zeros((576, 704, 3), dtype=np.uint8)
+        tracker.start()
+        try:
+            tracker.submit(frame)
+            deadline = time.perf_counter() + 2.0
+            while tracker.roi is None and time.perf_counter() < deadline:
+                time.sleep(0.01)
+        finally:
+            tracker.stop()
+
+        self.assertEqual(tracker.roi, (144, 48, 208, 208))
+        # Each frame is only tracked once
+        self.assertEqual(detector.frames, [frame])
+        self.assertEqual(tracker.stats(), {"roi": tracker.roi, "attempts": 1, "detections": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
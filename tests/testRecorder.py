@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from RMI_Simulator.Recorder import (SessionRecorder, frame_times_path, read_frame_times, session_video_path,
+                                    session_video_start)
+from RMI_Simulator.database import build_test_document
+
+
+class TestSessionRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session", "test.avi")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_records_frames(self):
+        recorder = SessionRecorder(frame_size=(64, 48))
+        recorder.start(self.path)
+        for value in range(5):
+            self.assertTrue(recorder.write(np.full((48, 64, 3), value * 40, dtype=np.uint8)))
+
+        self.assertEqual(recorder.stop(), self.path)
+
+        cap = cv2.VideoCapture(self.path)
+        self.assertEqual(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 5)
+        cap.release()
+        self.assertEqual(recorder.stats()["written"], 5)
+        self.assertFalse(recorder.recording)
+
+    def test_drops_frames_instead_of_blocking(self):
+        recorder = SessionRecorder(frame_size=(64, 48), max_queue=2)
+        recorder.start(self.path)
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        release = threading.Event()
+        original_get = recorder._queue.get
+
+        def slow_get(*args, **kwargs):
+            release.wait()
+            return original_get(*args, **kwargs)
+
+        recorder._queue.get = slow_get
+        results = [recorder.write(frame) for _ in range(5)]
+        release.set()
+        recorder.stop()
+
+        self.assertEqual(results.count(False), recorder.dropped_count)
+        self.assertGreaterEqual(recorder.dropped_count, 2)
+        # Only the frames in the video have a time
+        self.assertEqual(len(read_frame_times(self.path)), recorder.written_count)
+
+    def test_records_at_capture_rate_with_frame_times(self):
+        recorder = SessionRecorder(frame_size=(64, 48))
+        recorder.start(self.path, fps=60)
+        captured = [1_000_000_000 + index * 16_666_667 for index in range(4)]
+        for captured_ns in captured:
+            recorder.write(np.zeros((48, 64, 3), dtype=np.uint8), captured_ns)
+        recorder.stop()
+
+        cap = cv2.VideoCapture(self.path)
+        self.assertAlmostEqual(cap.get(cv2.CAP_PROP_FPS), 60)
+        cap.release()
+        self.assertEqual(read_frame_times(self.path), captured)
+        self.assertEqual(frame_times_path(self.path), os.path.join(self.directory.name, "session", "test.frames.csv"))
+        self.assertIsNone(read_frame_times(os.path.join(self.directory.name, "other.avi")))
+
+    def test_write_when_not_recording(self):
+        recorder = SessionRecorder()
+        self.assertFalse(recorder.write(np.zeros((576, 704, 3), dtype=np.uint8)))
+        self.assertIsNone(recorder.stop())
+
+    def test_session_video_path(self):
+        path = session_video_path("P01", "videos", datetime(2024, 8, 19, 11, 12, 48))
+        self.assertEqual(path, os.path.join("videos", "P01_20240819_111248.avi"))
+        path = session_video_path("P01", "videos", datetime(2024, 8, 19, 11, 12, 48), camera="body")
+        self.assertEqual(path, os.path.join("videos", "P01_20240819_111248_body.avi"))
+
+    def test_session_video_start(self):
+        started = datetime(2024, 8, 19, 11, 12, 48)
+        self.assertEqual(session_video_start(session_video_path("P_01", "videos", started)), started)
+        self.assertEqual(session_video_start(session_video_path("P01", "videos", started, camera="body")), started)
+        self.assertIsNone(session_video_start("still.avi"))
+        self.assertIsNone(session_video_start("P01_20241399_111248.avi"))
+
+    def test_document_links_video(self):
+        self.assertEqual(build_test_document([], {}, 1, "arm", video_path="a.avi")["video_path"], "a.avi")
+        self.assertNotIn("video_path", build_test_document([], {}, 1, "arm"))
+        roi = {"region": [0.25, 0.0, 0.5, 0.5], "edited": False, "head_tracking": False, "changes": []}
+        self.assertEqual(build_test_document([], {}, 1, "arm", roi=roi)["roi"], roi)
+        self.assertNotIn("roi", build_test_document([], {}, 1, "arm"))
+
+
+if __name__ == '__main__':
+    unittest.main()
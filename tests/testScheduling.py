@@ -0,0 +1,82 @@
+import os
+import threading
+import unittest
+
+import cv2
+from PyQt5.QtCore import QThread
+
+from RMI_Simulator.Scheduling import (available_cpus, describe_scheduling, set_cpu_affinity, set_opencv_threads,
+                                      set_thread_priority)
+
+
+class WaitingThread(QThread):
+    """A thread that runs until it is released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+        self.cpus = None
+
+    def run(self):
+        self.release.wait()
+        if hasattr(os, "sched_getaffinity"):
+            self.cpus = os.sched_getaffinity(0)
+
+
+class TestScheduling(unittest.TestCase):
+
+    def test_opencv_threads(self):
+        original = cv2.getNumThreads()
+        try:
+            self.assertEqual(set_opencv_threads(1), original)
+            self.assertEqual(cv2.getNumThreads(), 1)
+        finally:
+            cv2.setNumThreads(original)
+
+    def test_thread_priority(self):
+        thread = WaitingThread()
+        self.assertFalse(set_thread_priority(thread, "high"))
+        with self.assertRaises(ValueError):
+            set_thread_priority(thread, "urgent")
+
+        thread.start()
+        try:
+            self.assertTrue(set_thread_priority(thread, "high"))
+            self.assertEqual(thread.priority(), QThread.HighPriority)
+        finally:
+            thread.release.set()
+            thread.wait()
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU affinity is not supported")
+    def test_cpu_affinity(self):
+        cpus = available_cpus()
+        previous = set_cpu_affinity({min(cpus)})
+        try:
+            self.assertEqual(previous, cpus)
+            self.assertEqual(available_cpus(), {min(cpus)})
+        finally:
+            set_cpu_affinity(cpus)
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU affinity is not supported")
+    def test_cpu_affinity_of_running_threads(self):
+        cpus = available_cpus()
+        thread = WaitingThread()
+        thread.start()
+        try:
+            set_cpu_affinity({min(cpus)})
+        finally:
+            thread.release.set()
+            thread.wait()
+            set_cpu_affinity(cpus)
+
+        self.assertEqual(thread.cpus, {min(cpus)})
+
+    def test_describe(self):
+        self.assertEqual(describe_scheduling({}), "defaults")
+        self.assertEqual(describe_scheduling({"opencv_threads": 2, "capture_priority": "high", "cpus": {1, 0}}),
+                         "cv2 threads 2, capture high, cpus 0,1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,10 @@ from unittest.mock import patch, MagicMock
 import numpy as np
 import cv2
 from PyQt5.QtTest import QTest
+import threading
+import time
 from queue import Queue
-from RMI_Simulator.MRI_Test import CaptureThread
+from RMI_Simulator.MRI_Test import CaptureThread, FrameMailbox
 class CaptureThreadWithQueue(CaptureThread):
     """Une version modifiée de CaptureThread pour utiliser une queue."""
 
@@ -69,5 +71,47 @@ class TestCaptureThread(unittest.TestCase):
         # Ensure the thread stopped running
         self.assertFalse(capture_thread.running)
 
+
+class TestFrameMailbox(unittest.TestCase):
+
+    def test_latest_frame_wins(self):
+        """A full mailbox replaces the pending frame and counts it as superseded."""
+        mailbox = FrameMailbox()
+        mailbox.put(np.zeros((2, 2, 3), dtype=np.uint8))
+        mailbox.put(np.ones((2, 2, 3), dtype=np.uint8))
+
+        frame = mailbox.get(timeout=0)
+        self.assertEqual(frame[0, 0, 0], 1)
+        self.assertEqual(mailbox.stats(), {"put": 2, "superseded": 1, "dropped": 0, "pending": 0})
+
+    def test_get_times_out_when_empty(self):
+        mailbox = FrameMailbox()
+        self.assertIsNone(mailbox.get(timeout=0.01))
+
+    def test_close_wakes_blocked_consumer(self):
+        """Closing the mailbox releases a consumer blocked without a timeout."""
+        mailbox = FrameMailbox()
+        results = []
+        consumer = threading.Thread(target=lambda: results.append(mailbox.get()))
+        consumer.start()
+        time.sleep(0.05)
+        mailbox.close()
+        consumer.join(timeout=1)
+
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(results, [None])
+        self.assertFalse(mailbox.put(np.zeros((2, 2, 3), dtype=np.uint8)))
+        self.assertEqual(mailbox.stats()["dropped"], 1)
+
+    def test_bounded_capacity(self):
+        mailbox = FrameMailbox(capacity=2)
+        for value in range(5):
+            mailbox.put(np.full((1, 1, 3), value, dtype=np.uint8))
+
+        self.assertEqual(mailbox.get(timeout=0)[0, 0, 0], 3)
+        self.assertEqual(mailbox.get(timeout=0)[0, 0, 0], 4)
+        self.assertEqual(mailbox.stats()["superseded"], 3)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from RMI_Simulator.Workers import FlowWorkerPool, SharedFrameRing
+from testMotion import textured_frames
+
+
+class TestSharedFrameRing(unittest.TestCase):
+
+    def test_attach_by_name(self):
+        ring = SharedFrameRing(slots=2, shape=(4, 4, 3))
+        attached = SharedFrameRing(slots=2, shape=(4, 4, 3), name=ring.name)
+        try:
+            ring.frame(1)[:] = 7
+            self.assertEqual(attached.frame(1)[0, 0, 0], 7)
+            self.assertEqual(attached.frame(0)[0, 0, 0], ring.frame(0)[0, 0, 0])
+        finally:
+            attached.close()
+            ring.close()
+
+
+class TestFlowWorkerPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.frames = [textured_frames(shift, 352, 288)[1] for shift in (0, 4, 8, 12, 12, 12)]
+
+    def run_pool(self, pool):
+        results = []
+        for index, frame in enumerate(self.frames):
+            while not pool.submit(frame, index):
+                results += pool.collect(timeout=5)
+        while pool.pending:
+            results += pool.collect(timeout=5)
+        return results
+
+    def test_results_in_submission_order(self):
+        pool = FlowWorkerPool(workers=2, shape=self.frames[0].shape)
+        try:
+            results = self.run_pool(pool)
+        finally:
+            pool.close()
+
+        self.assertEqual([payload for payload, _, _ in results], list(range(len(self.frames))))
+        self.assertEqual(results[0][1:], (False, 0.0))
+        values = [movement_value for _, _, movement_value in results]
+        np.testing.assert_allclose(values[1:4], 4, atol=0.5)
+        np.testing.assert_allclose(values[4:], 0, atol=0.5)
+        self.assertTrue(results[1][1])
+        self.assertEqual(pool.stats()["processed"], len(self.frames) - 1)
+
+    def test_full_ring_drops_frames(self):
+        pool = FlowWorkerPool(workers=1, slots=2, shape=self.frames[0].shape)
+        try:
+            accepted = [pool.submit(frame) for frame in self.frames[:4]]
+            while pool.pending:
+                pool.collect(timeout=5)
+        finally:
+            pool.close()
+
+        self.assertEqual(accepted[:2], [True, True])
+        self.assertIn(False, accepted[2:])
+        self.assertEqual(pool.stats()["dropped"], accepted.count(False))
+
+    def test_stateful_engine_needs_single_worker(self):
+        with self.assertRaises(ValueError):
+            FlowWorkerPool(workers=2, estimator="mog2")
+
+    def test_frame_shape_is_checked(self):
+        pool = FlowWorkerPool(workers=1, shape=self.frames[0].shape)
+        try:
+            with self.assertRaises(ValueError):
+                pool.submit(np.zeros((10, 10, 3), dtype=np.uint8))
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()